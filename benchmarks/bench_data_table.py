@@ -0,0 +1,54 @@
+'''
+    Times flattening an index tree into the table written to the PDF, write_pdf_fpf2.build_data_table, on a
+    generated tree. The default tree has 100k nodes, five levels deep with every heading having ten children, which
+    stands in for a large, deep index file.
+
+    Run from the repository root with:
+        python -m benchmarks.bench_data_table --nodes 100000 --branching 10
+'''
+from qrImageIndexer import write_pdf_fpf2
+from typing import Dict, Tuple
+import argparse
+import time
+
+def build_tree(nodes : int, branching : int, string_header : str = '{bench}') -> Dict[str, Tuple[Dict, str]]:
+    '''
+        Builds a tree in the format returned by qr_generator.unpack_data, filled breadth first so every heading has
+        branching children until there are nodes entries. Every entry has a QR code string.
+    '''
+    tree = {}
+    level = [(tree, '')]
+    count = 0
+    while count < nodes:
+        next_level = []
+        for children, prefix in level:
+            for i in range(branching):
+                if count == nodes:
+                    break
+                key = f'Entry {count}'
+                qr = f'{string_header}{prefix}{key}/'
+                children[key] = ({}, qr)
+                next_level.append((children[key][0], prefix + key + '/'))
+                count += 1
+        level = next_level
+    return tree
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark flattening an index tree into the PDF table')
+    parser.add_argument('--nodes', type=int, default=100000)
+    parser.add_argument('--branching', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    tree = build_tree(args.nodes, args.branching)
+    for repeat_headings in (False, True):
+        times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            table = write_pdf_fpf2.build_data_table(tree, repeat_headings)
+            times.append(time.perf_counter() - start)
+        print(f'repeat_headings={repeat_headings}: {len(table)} rows of {len(table[0])} columns, '
+              f'best {min(times):.3f} s, {len(table) / min(times):,.0f} rows/s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+'''
+    Compares detecting image files with the header sniffing classifier, in process and on a thread pool, against
+    the previous approach of calling imghdr on a process pool.
+
+    Run from the repository root with:
+        python -m benchmarks.bench_image_types
+'''
+from qrImageIndexer import image_types
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from typing import Callable, Dict, List
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import imghdr
+except ImportError: # Removed from the standard library in Python 3.13
+    imghdr = None
+
+SAMPLE_FILES = [
+    ('.jpg', b'\xff\xd8\xff\xe1\x00\x10Exif\x00\x00'),
+    ('.png', b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR'),
+    ('.cr2', b'II*\x00\x10\x00\x00\x00CR\x02\x00'),
+    ('.heic', b'\x00\x00\x00\x18ftypheic\x00\x00\x00\x00mif1heic'),
+    ('.xmp', b'<x:xmpmeta xmlns:x="adobe:ns:meta/">'),
+    ('.mov', b'\x00\x00\x00\x14ftypqt  \x00\x00\x00\x00qt  '),
+]
+
+def build_corpus(directory : str, count : int) -> List[str]:
+    '''
+        Writes a set of small files to a directory, cycling through image and non-image types found on camera
+        cards. Only the header of each file is realistic, which is all the classifiers read.
+
+        Arguments:
+            directory: directory to write files to
+            count: number of files to write
+
+        Returns:
+            List of file paths
+    '''
+    paths = []
+    for i in range(count):
+        extension, header = SAMPLE_FILES[i % len(SAMPLE_FILES)]
+        path = os.path.join(directory, f'{i:06d}{extension}')
+        with open(path, 'wb') as f:
+            f.write(header + bytes(256))
+        paths.append(path)
+    return paths
+
+def imghdr_what(file_path : str):
+    return imghdr.what(file_path)
+
+def time_method(method : Callable[[List[str]], List], files : List[str], repeats : int) -> float:
+    '''
+        Times a classification method over a list of files, taking the best of several runs.
+
+        Returns:
+            Best wall time in seconds
+    '''
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        method(files)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(count : int, workers : int, repeats : int) -> Dict[str, float]:
+    methods = {
+        'sniff in process' : lambda files: [image_types.get_image_type(path) for path in files],
+    }
+    with ThreadPool(workers) as thread_pool, Pool(workers) as process_pool:
+        methods['sniff thread pool'] = lambda files: thread_pool.map(image_types.get_image_type, files)
+        if imghdr is not None:
+            methods['imghdr process pool'] = lambda files: process_pool.map(imghdr_what, files)
+        with tempfile.TemporaryDirectory() as directory:
+            files = build_corpus(directory, count)
+            return {name : time_method(method, files, repeats) for name, method in methods.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark image file detection')
+    parser.add_argument('--files', type=int, default=50000)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    timings = run(args.files, args.workers, args.repeats)
+
+    print(f'{"method":>20} {"time (s)":>10} {"files/s":>10}')
+    for name, seconds in timings.items():
+        print(f'{name:>20} {seconds:>10.3f} {args.files / seconds:>10.0f}')
+    if imghdr is None:
+        print('imghdr is not available in this Python version, previous approach not timed')
+
+if __name__ == '__main__':
+    main()
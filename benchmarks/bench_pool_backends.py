@@ -0,0 +1,93 @@
+'''
+    Compares the process and thread pool backends for scanning images at a range of batch sizes and reports
+    the batch size at which the process pool starts to win.
+
+    Run from the repository root with:
+        python -m benchmarks.bench_pool_backends
+'''
+from qrImageIndexer import photo_sorter, qr_generator
+from PIL import Image
+from typing import Dict, List
+import argparse
+import numpy
+import os
+import tempfile
+import time
+
+def build_corpus(directory : str, count : int, size : int = 2000, qr_every : int = 10) -> List[str]:
+    '''
+        Writes a set of JPEG images to a directory. Every qr_every image contains a QR code, the rest are noise.
+
+        Arguments:
+            directory: directory to write images to
+            count: number of images to write
+            size: long edge of the images in pixels
+            qr_every: interval between images containing QR codes
+
+        Returns:
+            List of image paths
+    '''
+    rng = numpy.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        noise = rng.integers(0, 255, (size * 3 // 4, size), dtype=numpy.uint8)
+        image = Image.fromarray(noise)
+        if i % qr_every == 0:
+            qr = qr_generator.build_qr(f'Folder {i}').resize((size // 2, size // 2))
+            image.paste(qr, (size // 4, size // 8))
+        path = os.path.join(directory, f'{i:05d}.jpg')
+        image.save(path, quality=90)
+        paths.append(path)
+    return paths
+
+def time_backend(files : List[str], backend : str, workers : int, repeats : int) -> float:
+    '''
+        Times scanning a list of files with a backend, taking the best of several runs.
+
+        Returns:
+            Best wall time in seconds
+    '''
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        photo_sorter.scan_files(files, backend=backend, workers=workers)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(batch_sizes : List[int], image_size : int, workers : int, repeats : int) -> Dict[int, Dict[str, float]]:
+    timings = {}
+    with tempfile.TemporaryDirectory() as directory:
+        files = build_corpus(directory, max(batch_sizes), image_size)
+        for batch_size in batch_sizes:
+            timings[batch_size] = {backend : time_backend(files[:batch_size], backend, workers, repeats)
+                                   for backend in photo_sorter.BACKENDS}
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark process and thread pool backends for scanning')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4, 16, 64, 256])
+    parser.add_argument('--image-size', type=int, default=2000)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    timings = run(args.batch_sizes, args.image_size, args.workers, args.repeats)
+
+    print(f'{"images":>8} {"process (s)":>12} {"thread (s)":>12} {"faster":>8}')
+    crossover = None
+    for batch_size, result in timings.items():
+        process_time = result[photo_sorter.BACKEND_PROCESS]
+        thread_time = result[photo_sorter.BACKEND_THREAD]
+        faster = photo_sorter.BACKEND_PROCESS if process_time < thread_time else photo_sorter.BACKEND_THREAD
+        if faster == photo_sorter.BACKEND_PROCESS and crossover is None:
+            crossover = batch_size
+        print(f'{batch_size:>8} {process_time:>12.3f} {thread_time:>12.3f} {faster:>8}')
+
+    if crossover is None:
+        print('Thread pool was faster at every batch size')
+    else:
+        print(f'Process pool faster from {crossover} images')
+
+if __name__ == '__main__':
+    main()
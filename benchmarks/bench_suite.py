@@ -0,0 +1,269 @@
+'''
+    Times the main entry points, photo_sorter.get_qr_for_files, photo_sorter.sort_directory and
+    write_pdf_fpf2.build_pdf_report, on synthetic corpora at several sizes and reports items per second and
+    peak memory. Each case runs in a fresh process so its peak memory is measured on its own, and the peak of
+    the largest worker process it starts is reported separately.
+
+    The corpus is deterministic, so results saved with --output on different commits can be compared. Keeping the
+    corpus with --corpus-dir saves generating it again on every run.
+
+    Run from the repository root with:
+        python -m benchmarks.bench_suite --sizes 20 100 --output results.json
+'''
+from qrImageIndexer import photo_sorter, qr_generator, write_pdf_fpf2
+from benchmarks.synthetic_corpus import CorpusSettings, build_corpus
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+try:
+    import resource
+except ImportError: # Not available on Windows, peak memory is not reported
+    resource = None
+
+CASE_SCAN = 'get_qr_for_files'
+CASE_SORT = 'sort_directory'
+CASE_PDF = 'build_pdf_report'
+CASES = (CASE_SCAN, CASE_SORT, CASE_PDF)
+
+PDF_ITEMS_PER_HEADING = 10
+POLL_SECONDS = 1.0 # How often to check a case process is still running while waiting for its result
+
+def reset_peak_memory():
+    '''
+        Resets the peak resident memory of this process to its current memory where supported (Linux 4.0 and
+        later). Linux carries the peak of the parent process over into a new process, which would otherwise hide
+        the peak of the case itself.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def max_rss_mb(who) -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3 # Bytes on macOS, kilobytes elsewhere
+
+def peak_memory_mb() -> Optional[float]:
+    '''
+        Gets the peak resident memory of this process since reset_peak_memory.
+
+        Returns:
+            peak memory in MB, None if it can not be measured on this platform
+    '''
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        pass
+    return max_rss_mb(resource.RUSAGE_SELF) if resource is not None else None
+
+def peak_worker_memory_mb() -> Optional[float]:
+    '''
+        Gets the peak resident memory of the largest finished worker process started by this process.
+
+        Returns:
+            peak memory in MB, None if there were no workers or it can not be measured on this platform
+    '''
+    peak = max_rss_mb(resource.RUSAGE_CHILDREN) if resource is not None else None
+    return peak or None
+
+def link_photos(paths : List[str], directory : str):
+    '''
+        Fills a directory with the given photos, as hard links where possible so large corpora are not copied.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    for path in paths:
+        destination = os.path.join(directory, os.path.basename(path))
+        try:
+            os.link(path, destination)
+        except OSError:
+            shutil.copyfile(path, destination)
+
+def pdf_lines(count : int) -> List[str]:
+    '''
+        Builds the lines of an indented text file with count entries, grouped under headings.
+    '''
+    lines = []
+    for i in range(count):
+        if i % PDF_ITEMS_PER_HEADING == 0:
+            lines.append(f'Room {i // PDF_ITEMS_PER_HEADING}')
+        lines.append(f'\tItem {i}')
+    return lines
+
+def time_case(case : str, photos : List[Tuple[str, Optional[str]]], size : int, settings : CorpusSettings,
+              backend : str, workers : Optional[int]) -> Dict:
+    '''
+        Runs a single benchmark case in this process.
+
+        Returns:
+            Dictionary of the timing, peak memory and, for scanning cases, the number of codes found
+    '''
+    reset_peak_memory()
+    result = {'case' : case, 'size' : size}
+    scan_settings = photo_sorter.ScanSettings(binarization=True)
+    with tempfile.TemporaryDirectory() as directory:
+        if case == CASE_SCAN:
+            paths = [path for path, _ in photos[:size]]
+            start = time.perf_counter()
+            found = photo_sorter.get_qr_for_files(paths, settings.string_header, settings=scan_settings,
+                                                  backend=backend, workers=workers)
+            result['seconds'] = time.perf_counter() - start
+            result['codes_expected'] = sum(1 for _, qr in photos[:size] if qr)
+            result['codes_found'] = sum(1 for path, qr in photos[:size] if qr and found[path] == qr[len(settings.string_header):])
+        elif case == CASE_SORT:
+            input_dir = os.path.join(directory, 'inputs')
+            link_photos([path for path, _ in photos[:size]], input_dir)
+            start = time.perf_counter()
+            found_dirs = photo_sorter.sort_directory(input_dir, os.path.join(directory, 'outputs'), settings.string_header,
+                                                     settings=scan_settings, backend=backend, workers=workers)
+            result['seconds'] = time.perf_counter() - start
+            result['codes_expected'] = sum(1 for _, qr in photos[:size] if qr)
+            result['codes_found'] = len(found_dirs)
+        elif case == CASE_PDF:
+            data = qr_generator.load_lines(pdf_lines(size))
+            data_struct = qr_generator.generate_qr_code_structure(qr_generator.unpack_data(data, False, settings.string_header))
+            start = time.perf_counter()
+            pdf = write_pdf_fpf2.build_pdf_report(data_struct, True, True)
+            pdf.output(os.path.join(directory, 'codes.pdf'))
+            result['seconds'] = time.perf_counter() - start
+        else:
+            raise ValueError(f'Unknown case: {case}. Expected one of {CASES}')
+    result['items_per_second'] = size / result['seconds'] if result['seconds'] else None
+    result['peak_memory_mb'] = peak_memory_mb()
+    result['peak_worker_memory_mb'] = peak_worker_memory_mb()
+    return result
+
+def run_case_process(results, case : str, *args):
+    try:
+        results.put(time_case(case, *args))
+    except BaseException:
+        results.put({'case' : case, 'size' : args[1], 'error' : traceback.format_exc()})
+
+def run_case(case : str, photos : List[Tuple[str, Optional[str]]], size : int, settings : CorpusSettings, backend : str,
+             workers : Optional[int], timeout : Optional[float] = None) -> Dict:
+    '''
+        Runs a benchmark case in a fresh process so its peak memory is not affected by earlier cases. Takes the
+        arguments of time_case, and a timeout in seconds after which the case is stopped.
+
+        Returns:
+            Dictionary of the results as returned by time_case. If the case raised, was killed (e.g. out of memory)
+            or timed out, a dictionary of the case, size and an error message instead
+    '''
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=run_case_process, args=(results, case, photos, size, settings, backend, workers))
+    process.start()
+    start = time.monotonic()
+    result = None
+    while result is None:
+        try:
+            result = results.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            if not process.is_alive():
+                try: # The result may have been put just before the process exited
+                    result = results.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    result = {'case' : case, 'size' : size,
+                              'error' : f'Case process exited with code {process.exitcode} without a result'}
+            elif timeout is not None and time.monotonic() - start > timeout:
+                process.terminate()
+                result = {'case' : case, 'size' : size, 'error' : f'Timed out after {timeout} seconds'}
+    process.join()
+    return result
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(cases : List[str], sizes : List[int], settings : CorpusSettings, corpus_dir : Optional[str], backend : str,
+        workers : Optional[int], repeats : int, timeout : Optional[float] = None) -> Dict:
+    '''
+        Runs every case at every size, keeping the fastest of the repeats and the largest peak memories. A case
+        where every repeat failed is kept as its error, see run_case.
+
+        Returns:
+            Dictionary of the environment, corpus settings and results, as saved with --output
+    '''
+    settings = settings._replace(count=max(sizes))
+    with tempfile.TemporaryDirectory() as directory:
+        photos = build_corpus(corpus_dir or directory, settings) if set(cases) - {CASE_PDF} else []
+        results = []
+        for case in cases:
+            for size in sizes:
+                runs = [run_case(case, photos, size, settings, backend, workers, timeout) for _ in range(repeats)]
+                completed = [item for item in runs if 'error' not in item]
+                if not completed:
+                    results.append(runs[-1])
+                    continue
+                best = min(completed, key=lambda item: item['seconds'])
+                for key in ('peak_memory_mb', 'peak_worker_memory_mb'):
+                    peaks = [item[key] for item in completed if item[key] is not None]
+                    best[key] = max(peaks) if peaks else None
+                results.append(best)
+    return {
+        'commit' : git_commit(),
+        'python' : platform.python_version(),
+        'platform' : platform.platform(),
+        'cpu_count' : os.cpu_count(),
+        'backend' : backend,
+        'workers' : workers,
+        'corpus' : settings._asdict(),
+        'results' : results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark scanning, sorting and PDF generation on a synthetic corpus')
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=list(CASES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[20, 100])
+    parser.add_argument('--width', type=int, default=CorpusSettings().width)
+    parser.add_argument('--qr-fraction', type=float, default=CorpusSettings().qr_fraction)
+    parser.add_argument('--seed', type=int, default=CorpusSettings().seed)
+    parser.add_argument('--corpus-dir', help='Directory to keep the corpus in between runs')
+    parser.add_argument('--backend', choices=photo_sorter.BACKENDS, default=photo_sorter.BACKEND_PROCESS)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--timeout', type=float, help='Seconds after which a single run of a case is stopped and reported as failed')
+    parser.add_argument('--output', help='Save the results as JSON to compare with other commits')
+    args = parser.parse_args()
+
+    settings = CorpusSettings(width=args.width, qr_fraction=args.qr_fraction, seed=args.seed)
+    report = run(args.cases, args.sizes, settings, args.corpus_dir, args.backend, args.workers, args.repeats, args.timeout)
+
+    print(f'commit {report["commit"]}, {report["cpu_count"]} CPUs, {args.backend} backend')
+    print(f'{"case":>18} {"size":>6} {"time (s)":>10} {"items/s":>10} {"peak (MB)":>10} {"worker (MB)":>12} {"codes":>9}')
+    for result in report['results']:
+        if 'error' in result:
+            print(f'{result["case"]:>18} {result["size"]:>6} failed: {result["error"].strip().splitlines()[-1]}')
+            continue
+        peak, worker_peak = [f'{result[key]:.0f}' if result[key] is not None else '-'
+                             for key in ('peak_memory_mb', 'peak_worker_memory_mb')]
+        codes = f'{result["codes_found"]}/{result["codes_expected"]}' if 'codes_found' in result else '-'
+        print(f'{result["case"]:>18} {result["size"]:>6} {result["seconds"]:>10.3f} {result["items_per_second"]:>10.1f} '
+              f'{peak:>10} {worker_peak:>12} {codes:>9}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if any('error' in result for result in report['results']):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+'''
+    Generates synthetic photo corpora for the benchmarks. Photos containing codes have a QR code from
+    qr_generator.build_qr pasted at a random scale and rotation, then blurred and given sensor noise, the rest
+    are smooth random scenes with the same noise. Corpora are deterministic for a given seed, so timings from
+    different commits are measured on the same photos.
+
+    A corpus can be generated on its own, e.g. to keep one between runs, with:
+        python -m benchmarks.synthetic_corpus OUTPUT_DIR --count 200
+'''
+from qrImageIndexer import qr_generator
+from PIL import Image, ImageFilter
+from typing import List, NamedTuple, Optional, Tuple
+import argparse
+import json
+import numpy
+import os
+
+MANIFEST_FILE_NAME = 'corpus.json'
+
+class CorpusSettings(NamedTuple):
+    '''
+        Settings used to generate a corpus. Stored with the corpus so it is only reused with the same settings.
+
+        Attributes:
+            count: number of photos
+            width: width of each photo in pixels, the height is 3/4 of this
+            qr_fraction: fraction of photos containing a code
+            min_scale: smallest size of a code as a fraction of the photo height
+            max_scale: largest size of a code as a fraction of the photo height
+            max_rotation: largest rotation of a code in degrees, either way
+            max_blur: largest Gaussian blur radius in pixels
+            max_noise: largest standard deviation of the noise added to each pixel
+            string_header: prefix of the content of each code
+            seed: random seed
+    '''
+    count : int = 100
+    width : int = 4000
+    qr_fraction : float = 0.1
+    min_scale : float = 0.1
+    max_scale : float = 0.6
+    max_rotation : float = 30.0
+    max_blur : float = 2.0
+    max_noise : float = 12.0
+    string_header : str = '{bench}'
+    seed : int = 0
+
+def background(rng : numpy.random.Generator, width : int, height : int) -> Image.Image:
+    '''
+        Makes a smooth random colour scene by upscaling a few random pixels, so code-free photos compress and
+        decode like real photos rather than pure noise.
+    '''
+    cells = rng.integers(0, 256, (6, 8, 3), dtype=numpy.uint8)
+    return Image.fromarray(cells).resize((width, height), Image.BICUBIC)
+
+def add_noise(rng : numpy.random.Generator, image : Image.Image, sigma : float) -> Image.Image:
+    '''
+        Adds Gaussian noise with the given standard deviation to every pixel of an RGB image.
+    '''
+    if sigma <= 0:
+        return image
+    pixels = numpy.asarray(image, dtype=numpy.int16)
+    noise = rng.normal(0, sigma, pixels.shape[:2] + (1,)).astype(numpy.int16)
+    return Image.fromarray(numpy.clip(pixels + noise, 0, 255).astype(numpy.uint8))
+
+def synthesize_photo(rng : numpy.random.Generator, settings : CorpusSettings, qr_data : Optional[str] = None) -> Image.Image:
+    '''
+        Builds a single photo, with a code of the given content if passed.
+
+        Arguments:
+            rng: random generator
+            settings: corpus settings
+            qr_data: content of the code, None for a photo without a code
+
+        Returns:
+            RGB photo
+    '''
+    width, height = settings.width, settings.width * 3 // 4
+    image = background(rng, width, height)
+    if qr_data is not None:
+        code_size = int(height * rng.uniform(settings.min_scale, settings.max_scale))
+        code = qr_generator.build_qr(qr_data).convert('RGB').resize((code_size, code_size), Image.NEAREST)
+        code = code.rotate(rng.uniform(-settings.max_rotation, settings.max_rotation), Image.BILINEAR, expand=True,
+                           fillcolor=(255, 255, 255))
+        code_width, code_height = code.size
+        x = int(rng.integers(0, max(1, width - code_width)))
+        y = int(rng.integers(0, max(1, height - code_height)))
+        image.paste(code, (x, y))
+    blur = rng.uniform(0, settings.max_blur)
+    if blur > 0:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+    return add_noise(rng, image, rng.uniform(0, settings.max_noise))
+
+def build_corpus(directory : str, settings : CorpusSettings = CorpusSettings()) -> List[Tuple[str, Optional[str]]]:
+    '''
+        Writes a corpus of JPEG photos to a directory. If the directory already holds a corpus generated with the
+        same settings it is reused.
+
+        Arguments:
+            directory: directory to write photos to, created if it does not exist
+            settings: corpus settings
+
+        Returns:
+            List of tuples of photo path and the content of its code (None if the photo has no code), in file name
+            order
+    '''
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILE_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['settings'] == settings._asdict():
+            return [(os.path.join(directory, name), qr) for name, qr in manifest['photos']]
+        for name, _ in manifest['photos']: # Generated with other settings, remove so no stale photos are left
+            if os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+
+    rng = numpy.random.default_rng(settings.seed)
+    qr_every = max(1, round(1 / settings.qr_fraction)) if settings.qr_fraction > 0 else None
+    photos = []
+    for i in range(settings.count):
+        qr = f'{settings.string_header}Folder {i:05d}' if qr_every and i % qr_every == 0 else None
+        name = f'IMG_{i:05d}.jpg'
+        synthesize_photo(rng, settings, qr).save(os.path.join(directory, name), quality=90)
+        photos.append((name, qr))
+
+    with open(manifest_path, 'w') as f:
+        json.dump({'settings' : settings._asdict(), 'photos' : photos}, f)
+    return [(os.path.join(directory, name), qr) for name, qr in photos]
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic photo corpus')
+    parser.add_argument('directory')
+    for field, default in CorpusSettings._field_defaults.items():
+        parser.add_argument('--' + field.replace('_', '-'), type=type(default), default=default)
+    args = parser.parse_args()
+
+    settings = CorpusSettings(**{field : getattr(args, field) for field in CorpusSettings._fields})
+    photos = build_corpus(args.directory, settings)
+    print(f'{len(photos)} photos, {sum(1 for _, qr in photos if qr)} with codes, in {args.directory}')
+
+if __name__ == '__main__':
+    main()
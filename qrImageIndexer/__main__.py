@@ -1,9 +1,26 @@
-from qrImageIndexer.qr_generator import load_text_file, print_struct_outline, unpack_data, generate_qr_code_structure
-from qrImageIndexer.generate_qr_wrapper import generate_qr_pdf
-from qrImageIndexer.photo_sorter import sort_directory
-from qrImageIndexer.write_pdf_fpf2 import build_pdf_report
+from qrImageIndexer.qr_generator import iter_rows
+from qrImageIndexer.generate_qr_wrapper import generate_qr_pdf, write_qr_pdfs
+from qrImageIndexer.photo_sorter import sort_directory, ScanSettings, BACKENDS, BACKEND_PROCESS
+from qrImageIndexer.file_placement import PLACEMENTS, PLACEMENT_COPY
+from qrImageIndexer.sort_plan import read_plan, apply_plan
+from qrImageIndexer.qr_decoders import DECODERS, CALIBRATION_SAMPLE_SIZE, calibrate_decoders
+from qrImageIndexer.file_inventory import build_inventory
+from qrImageIndexer.run_report import timed, build_run_report, write_run_report, STAGE_PARSE, STAGE_PDF_WRITE
 
 import argparse
+import time
+
+def pyramid_scale(value : str) -> float:
+    scale = float(value)
+    if not 0 < scale <= 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a scale between 0 (exclusive) and 1')
+    return scale
+
+def positive_int(value : str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a whole number of at least 1')
+    return number
 
 def main():
     parser = argparse.ArgumentParser()
@@ -12,6 +29,10 @@ def main():
             nargs=2, metavar=('INPUT_TEXT_FILE','OUTPUT_PDF'))
     mutual_exclusive.add_argument('-s', '--sort-photos', help='Sort photos based on QR codes found in photos. Once a QR code is found all photos will be sorted into the directory indicated by the code until subsequent codes found',
             nargs=2, metavar=('INPUT_DIR', 'OUTPUT_DIR'))
+    mutual_exclusive.add_argument('--apply-plan', help='Place photos as listed in a plan written by --plan, without scanning them again',
+            nargs=2, metavar=('PLAN_FILE', 'OUTPUT_DIR'))
+    mutual_exclusive.add_argument('--calibrate-decoders', help='Measure the speed and recall of each QR decoder on a sample of photos and suggest the decoders to use with --decoders.',
+            metavar='INPUT_DIR')
     parser.add_argument('--pdf-type', help='Type of PDF to generate. Either linearly sorted or sorted to enable easy slicing of the printed pages. Accepts "linear" or "sliceable". Linear will sort down page, sliceable will sort "through" the page.',
             nargs=1, metavar=('SORT_TYPE'), choices=['linear', 'sliceable'])
 
@@ -30,6 +51,64 @@ def main():
     
     parser.add_argument('-d', '--datestamp', help='Use file modified time to sort the incoming images instead of file name',
             action='store_true')
+    parser.add_argument('--capture-time', help='Use the time each photo was taken, read from its EXIF data, to sort the incoming images. Unlike the file modified time this is not changed by copying photos. Photos taken at the same time on several cameras are ordered by the number in the file name.',
+            action='store_true')
+
+    parser.add_argument('--recursive', help='Also sort photos in every sub directory of the input directory, e.g. each DCIM folder copied from a memory card. Photos in sub directories are renamed with the sub directory so photos with the same name do not overwrite each other.',
+            action='store_true')
+    parser.add_argument('--include', help='Only sort files matching one of these glob patterns, e.g. "*.jpg". Patterns containing "/" match the path within the input directory, others match the file name. Case is ignored.',
+            nargs='+', metavar='GLOB')
+    parser.add_argument('--exclude', help='Skip files and directories matching any of these glob patterns, e.g. ".*" to skip hidden files.',
+            nargs='+', metavar='GLOB')
+
+    parser.add_argument('--pooled-listing', help='Read the header of each file on the worker pool when checking which files are photos. Only helps on network storage, where each read has a high latency.',
+            action='store_true')
+    parser.add_argument('--pyramid-scales', help='Scan downscaled grayscale copies of each image at these scales (fractions of full resolution) in order before moving up. E.g. "0.25 0.5 1". Much faster for large photos where the QR code fills a large part of the frame.',
+            nargs='+', type=pyramid_scale, metavar='SCALE')
+    parser.add_argument('--reduced-load', help='Load images as grayscale at a reduced size, chosen from the image dimensions, before falling back to the full image. Greatly reduces JPEG decoding time and memory.',
+            action='store_true')
+    parser.add_argument('--use-preview', help='Scan the preview image embedded in each photo (EXIF thumbnail or RAW preview) first and only load the full photo if no code is found in it.',
+            action='store_true')
+    parser.add_argument('--prefilter', help='Check a small thumbnail of each photo for QR code finder patterns and skip the full scan of photos without any. Much faster when few photos contain codes.',
+            action='store_true')
+    parser.add_argument('--report', help='Save a JSON report of the time spent in each stage of the run, with the scan time percentiles and slowest photos when sorting.',
+            metavar='REPORT_FILE')
+    parser.add_argument('--qr-cache', help='Keep generated QR code images in this directory and reuse them when generating a PDF again, so only new or changed codes are generated.',
+            metavar='CACHE_DIR')
+    parser.add_argument('--vector-qr', help='Draw QR codes in the PDF as vector shapes instead of images. Faster to generate, gives a smaller PDF and prints sharp at any size. --qr-cache is not used.',
+            action='store_true')
+    parser.add_argument('--stream-pdf', help='Build each QR code just before it is written to the PDF instead of building every code first, so memory does not grow with the size of the text file. --qr-cache is not used.',
+            action='store_true')
+    parser.add_argument('--pages-per-file', help='Split the PDF into numbered files of this many pages each, built in parallel (see --workers). Implies --stream-pdf. With --pdf-type sliceable each file is ordered for slicing on its own.',
+            type=int, metavar='PAGES')
+    parser.add_argument('--decoders', help='QR decoders to try on each photo in order, stopping at the first which finds a code. Use --calibrate-decoders to choose them for a set of photos. Defaults to zbar, retrying with a binarized photo.',
+            nargs='+', choices=list(DECODERS), metavar='DECODER')
+    parser.add_argument('--calibration-sample', help='Number of photos to measure with --calibrate-decoders.',
+            type=int, default=CALIBRATION_SAMPLE_SIZE)
+    parser.add_argument('--memory-budget', help='Memory in MB to allow for decoding photos across all workers. Photos too large to decode within the budget are loaded at a reduced size.',
+            type=int, metavar='MB')
+    parser.add_argument('--backend', help='Type of worker pool used to process photos. "process" uses a process per core, "thread" uses threads which start faster and suit smaller batches.',
+            choices=BACKENDS, default=BACKEND_PROCESS)
+    parser.add_argument('--workers', help='Number of workers used to process photos or generate QR codes. Defaults to the number of CPU cores.',
+            type=int)
+    parser.add_argument('--cache', help='Keep QR scan results in a cache file in the output directory and reuse them for unchanged photos when sorting again with the same settings.',
+            action='store_true')
+    parser.add_argument('--cache-hash', help='With --cache, also check a hash of the content of each photo before reusing its cached result.',
+            action='store_true')
+    parser.add_argument('--streaming', help='Start copying photos as soon as their scan results arrive instead of waiting for all photos to be scanned.',
+            action='store_true')
+    parser.add_argument('--copy-workers', help='Number of photos to copy at the same time. Higher values help when copying to network storage.',
+            type=positive_int, default=1)
+    parser.add_argument('--placement', help='How sorted photos are placed in the output directory. "copy" leaves the originals untouched, "hardlink", "reflink" and "symlink" avoid duplicating data on the same volume and "move" moves the originals. Falls back to copying where not possible.',
+            choices=PLACEMENTS, default=PLACEMENT_COPY)
+    parser.add_argument('--plan', help='Write the sort plan (the folder each photo is placed in, with the QR code, scan stage and scan time) to a manifest file. JSON Lines, or CSV if the file name ends in .csv.',
+            metavar='PLAN_FILE')
+    parser.add_argument('--dry-run', help='Only plan the sort, without placing any files in the output directory. Use with --plan to review the plan before applying it with --apply-plan.',
+            action='store_true')
+    parser.add_argument('--checkpoint', help='Record scan results in a checkpoint file in the output directory as photos are scanned, so an interrupted sort can be continued with --resume. The checkpoint is removed once sorting finishes.',
+            action='store_true')
+    parser.add_argument('--resume', help='Continue an interrupted sort run with --checkpoint, without scanning photos in the checkpoint again or placing photos already in the output directory.',
+            action='store_true')
 
     args = parser.parse_args()
 
@@ -39,7 +118,7 @@ def main():
 
     verbose = args.verbose
     
-    if not args.generate_pdf and not args.sort_photos:
+    if not args.generate_pdf and not args.sort_photos and not args.apply_plan and not args.calibrate_decoders:
         print("Neither sort photos or generate PDF was selected. No action performed.")
     if args.generate_pdf:
         input = args.generate_pdf[0]
@@ -49,18 +128,33 @@ def main():
         if args.pdf_type:
             sliceable = args.pdf_type[0] == 'sliceable'
 
-        text_data = load_text_file(input)
-        
-        if verbose:
-            print('Loaded text file: ' + input)
-            print('')
-            print('Read lines: ')
-            print(text_data)
-
-        pdf = generate_qr_pdf(text_data, args.qr_for_headings, args.repeat_table_headings, sliceable, string_header)
-        pdf.output(output)
+        start = time.perf_counter()
+        timings = {}
+        with open(input, 'r') as f:
+            # Rows are read from the file as they are unpacked. Verbose output prints every row, so reads them all first
+            text_data = iter_rows(f)
+            if verbose:
+                with timed(timings, STAGE_PARSE):
+                    text_data = list(text_data)
+                print('Loaded text file: ' + input)
+                print('')
+                print('Read lines: ')
+                print(text_data)
+
+            if args.stream_pdf or args.pages_per_file:
+                paths = write_qr_pdfs(text_data, args.qr_for_headings, args.repeat_table_headings, sliceable, output, string_header,
+                                      args.pages_per_file, args.workers, args.vector_qr, timings)
+            else:
+                pdf = generate_qr_pdf(text_data, args.qr_for_headings, args.repeat_table_headings, sliceable, string_header, timings,
+                                      args.workers, args.qr_cache, args.vector_qr)
+                with timed(timings, STAGE_PDF_WRITE):
+                    pdf.output(output)
+                paths = [output]
         if verbose:
-            print('Saved pdf: ' + output)
+            for path in paths:
+                print('Saved pdf: ' + path)
+        if args.report:
+            write_run_report(build_run_report(timings, time.perf_counter() - start), args.report)
     if args.sort_photos:
         input = args.sort_photos[0]
         output = args.sort_photos[1]
@@ -68,13 +162,50 @@ def main():
         if verbose:
             print('Sorting from: ' + input + ', to : ' + output)
 
-        found_dirs = sort_directory(input, output, string_header, args.verbose, True, order_by_date=args.datestamp)
+        settings = ScanSettings(binarization=True,
+                                scales=tuple(args.pyramid_scales) if args.pyramid_scales else None,
+                                reduced_load=args.reduced_load,
+                                use_preview=args.use_preview,
+                                prefilter=args.prefilter,
+                                decoders=tuple(args.decoders) if args.decoders else None)
+
+        found_dirs = sort_directory(input, output, string_header, args.verbose, order_by_date=args.datestamp, settings=settings,
+                                    backend=args.backend, workers=args.workers,
+                                    use_cache=args.cache, cache_hash=args.cache_hash, streaming=args.streaming,
+                                    copy_workers=args.copy_workers, placement=args.placement,
+                                    plan_path=args.plan, dry_run=args.dry_run, checkpoint=args.checkpoint,
+                                    resume=args.resume, recursive=args.recursive, include=args.include,
+                                    exclude=args.exclude, pooled_listing=args.pooled_listing,
+                                    order_by_capture_time=args.capture_time,
+                                    memory_budget=args.memory_budget * 1000000 if args.memory_budget else None,
+                                    report_path=args.report)
 
         if verbose:
             print('Found directories from images:')
             [print(x) for x in found_dirs]
-        
-        
+    if args.apply_plan:
+        plan_file = args.apply_plan[0]
+        output = args.apply_plan[1]
+
+        if verbose:
+            print('Applying plan: ' + plan_file + ', to : ' + output)
+
+        found_dirs = apply_plan(read_plan(plan_file), output, args.verbose, copy_workers=args.copy_workers,
+                                placement=args.placement)
+
+        if verbose:
+            print('Found directories from plan:')
+            [print(x) for x in found_dirs]
+    if args.calibrate_decoders:
+        image_paths = build_inventory(args.calibrate_decoders, verbose=verbose).image_paths()
+        cascade, measurements = calibrate_decoders(image_paths, string_header, args.calibration_sample,
+                                                   tuple(args.decoders) if args.decoders else None, verbose)
+
+        print(f'{"decoder":>12} {"ms/photo":>10} {"found":>6} {"recall":>7}')
+        for measurement in measurements:
+            recall = f'{measurement.recall:.0%}' if measurement.recall is not None else '-'
+            print(f'{measurement.decoder:>12} {measurement.seconds * 1000:>10.1f} {measurement.found:>6} {recall:>7}')
+        print('Suggested decoders: --decoders ' + ' '.join(cascade))
 
 
 if __name__ == '__main__':
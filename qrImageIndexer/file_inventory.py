@@ -0,0 +1,206 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import fnmatch
+import os
+import shutil
+import stat
+import tqdm
+from qrImageIndexer.image_types import get_image_type
+from qrImageIndexer.run_report import timed, STAGE_LISTING, STAGE_TYPE_CHECK
+
+class InventoryEntry(NamedTuple):
+    """
+        Details of a single file found in an input directory.
+
+        Attributes:
+            path: path of the file
+            size: size of the file in bytes
+            mtime: modified time of the file
+            image_type: type of image detected from the file header, None if not an image
+    """
+    path : str
+    size : int
+    mtime : float
+    image_type : Optional[str]
+
+# On Windows the directory listing already holds each file's size and modified time, so DirEntry.stat() costs nothing
+STAT_FROM_LISTING = os.name == 'nt'
+
+class FileInventory:
+    """
+        Files found in an input directory, with the size, modified time and image type of each. Built once
+        so that the directory is only listed and each file header only read once per sort.
+    """
+    def __init__(self, input_dir : str, entries : List[InventoryEntry]):
+        self.input_dir = input_dir
+        self.entries : Dict[str, InventoryEntry] = {entry.path : entry for entry in entries}
+
+    def image_paths(self) -> List[str]:
+        """
+            Returns list of paths of all files detected as images
+        """
+        return [path for path, entry in self.entries.items() if entry.image_type]
+
+    def non_image_paths(self) -> List[str]:
+        """
+            Returns list of paths of all files not detected as images
+        """
+        return [path for path, entry in self.entries.items() if not entry.image_type]
+
+    def mtime(self, path : str) -> float:
+        """
+            Returns the modified time of a file recorded when the inventory was built
+        """
+        return self.entries[path].mtime
+
+def inspect_file(file_path : str, file_stat : Tuple[int, float] = None) -> Optional[InventoryEntry]:
+    '''
+        Reads the size, modified time and image type of a file. May be called in a worker pool so that the stat
+        and header read for each file run concurrently.
+
+        Arguments:
+            file_path: path to file
+            file_stat: size and modified time of the file if already known from the directory listing
+
+        Returns:
+            InventoryEntry for the file, None if the path is a directory or could not be read
+    '''
+    if file_stat is None:
+        try:
+            stat_result = os.stat(file_path)
+        except OSError:
+            return None
+        if stat.S_ISDIR(stat_result.st_mode):
+            return None
+        file_stat = stat_result.st_size, stat_result.st_mtime
+    return InventoryEntry(file_path, *file_stat, get_image_type(file_path))
+
+def inspect_listed_file(listed_file : Tuple[str, Optional[Tuple[int, float]]]) -> Optional[InventoryEntry]:
+    '''
+        Calls inspect_file with a (path, stat) tuple from list_files, to allow mapping over a worker pool
+    '''
+    return inspect_file(*listed_file)
+
+def matches_any(relative_path : str, patterns : Iterable[str]) -> bool:
+    '''
+        Checks a path against glob patterns, ignoring case. Patterns containing a "/" are matched against the
+        path relative to the input directory, other patterns against the file or directory name only.
+
+        Arguments:
+            relative_path: path relative to the input directory, using "/" as separator
+            patterns: glob patterns, e.g. "*.jpg" or "DCIM/1*"
+
+        Returns:
+            True if any pattern matches
+    '''
+    name = relative_path.rsplit('/', 1)[-1].lower()
+    for pattern in patterns:
+        pattern = pattern.lower()
+        if fnmatch.fnmatchcase(relative_path.lower() if '/' in pattern else name, pattern):
+            return True
+    return False
+
+def list_files(input_dir : str, recursive : bool = False, include : List[str] = None, exclude : List[str] = None,
+               skip_dirs : Iterable[str] = ()) -> List[Tuple[str, Optional[Tuple[int, float]]]]:
+    '''
+        Lists the files in an input directory with os.scandir, which reports whether each entry is a directory
+        without a separate stat. Symbolic links to directories are not followed.
+
+        Arguments:
+            input_dir: directory to list
+            recursive: also list files in every sub directory, e.g. each DCIM folder of a memory card
+            include: if passed, only list files matching at least one of these glob patterns, see matches_any
+            exclude: skip files and directories matching any of these glob patterns, see matches_any
+            skip_dirs: directories not to list, e.g. an output directory inside the input directory
+
+        Returns:
+            List of (path, stat) tuples in listing order. stat is a tuple of size and modified time where the
+            listing provides it for free, otherwise None
+    '''
+    skip_dirs = {os.path.normcase(os.path.abspath(directory)) for directory in skip_dirs}
+    listed = []
+    to_list = [(input_dir, '')]
+    while to_list:
+        directory, relative_dir = to_list.pop(0)
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                relative_path = relative_dir + entry.name
+                if exclude and matches_any(relative_path, exclude):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and os.path.normcase(os.path.abspath(entry.path)) not in skip_dirs:
+                        to_list.append((entry.path, relative_path + '/'))
+                    continue
+                if include and not matches_any(relative_path, include):
+                    continue
+                file_stat = None
+                if STAT_FROM_LISTING and not entry.is_symlink():
+                    entry_stat = entry.stat()
+                    file_stat = entry_stat.st_size, entry_stat.st_mtime
+                listed.append((entry.path, file_stat))
+    return listed
+
+def build_inventory(input_dir : str, pool = None, verbose : bool = False, recursive : bool = False, include : List[str] = None,
+                    exclude : List[str] = None, skip_dirs : Iterable[str] = (),
+                    timings : Dict[str, float] = None) -> FileInventory:
+    '''
+        Lists an input directory and inspects every file in it.
+
+        Arguments:
+            input_dir: directory to list
+            pool: worker pool used to inspect files. Only worth using where each file read has a high latency,
+                such as on network storage. If None files are inspected in this process
+            verbose: boolean indicating whether to show progress updates to terminal
+            recursive: also inspect files in every sub directory
+            include: if passed, only inspect files matching at least one of these glob patterns
+            exclude: skip files and directories matching any of these glob patterns
+            skip_dirs: directories not to list, e.g. an output directory inside the input directory
+            timings: if passed, the time spent listing and inspecting files is added to it
+
+        Returns:
+            FileInventory of the directory
+    '''
+    with timed(timings, STAGE_LISTING):
+        listed = list_files(input_dir, recursive, include, exclude, skip_dirs)
+    with timed(timings, STAGE_TYPE_CHECK):
+        if pool is None:
+            entries = list(map(inspect_listed_file, tqdm.tqdm(listed) if verbose else listed))
+        elif verbose:
+            entries = list(tqdm.tqdm(pool.imap(inspect_listed_file, listed), total=len(listed)))
+        else:
+            entries = pool.map(inspect_listed_file, listed)
+    return FileInventory(input_dir, [entry for entry in entries if entry is not None])
+
+def flat_name(file_path : str, input_dir : str) -> str:
+    '''
+        Names a file for an output directory so files with the same name in different sub directories of the
+        input directory do not overwrite each other. Sub directories are joined to the file name with "_",
+        e.g. "100CANON/IMG_0001.JPG" becomes "100CANON_IMG_0001.JPG". Files directly in the input directory
+        keep their name.
+
+        Arguments:
+            file_path: path of the file
+            input_dir: input directory the file was found in
+
+        Returns:
+            file name to use in the output directory
+    '''
+    try:
+        relative_path = os.path.relpath(file_path, input_dir)
+    except ValueError: # On a different drive to the input directory
+        return os.path.basename(file_path)
+    if relative_path.startswith(os.pardir):
+        return os.path.basename(file_path)
+    return relative_path.replace(os.sep, '_').replace('/', '_')
+
+def copy_non_images(inventory : FileInventory, non_image_dir : str):
+    '''
+        Copies all files in an inventory which are not images to the non-image directory so it is clear to the
+        user what has happened with them.
+
+        Arguments:
+            inventory: inventory of the input directory
+            non_image_dir: directory to copy non-image files to
+    '''
+    for file_path in inventory.non_image_paths():
+        os.makedirs(non_image_dir, exist_ok=True)
+        shutil.copyfile(file_path, os.path.join(non_image_dir, flat_name(file_path, inventory.input_dir)))
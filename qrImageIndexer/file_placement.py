@@ -0,0 +1,277 @@
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Dict, List, Optional
+import ctypes
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+
+PENDING_COPIES_PER_WORKER = 4
+
+PLACEMENT_COPY = 'copy'
+PLACEMENT_HARDLINK = 'hardlink'
+PLACEMENT_REFLINK = 'reflink'
+PLACEMENT_SYMLINK = 'symlink'
+PLACEMENT_MOVE = 'move'
+PLACEMENTS = (PLACEMENT_COPY, PLACEMENT_HARDLINK, PLACEMENT_REFLINK, PLACEMENT_SYMLINK, PLACEMENT_MOVE)
+
+FICLONE = 0x40049409 # Linux ioctl to clone a file's extents
+PLACED_SAMPLE_BYTES = 64 * 1024 # Size of each block compared by is_placed
+
+class CopyStats:
+    """
+        Running totals of files copied, used to report copy throughput. Safe to update from several threads.
+    """
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.start_time : Optional[float] = None
+        self.end_time : Optional[float] = None
+        self.fallbacks : Dict[str, int] = {}
+        self.fallback_reasons : Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+
+    def add(self, size : int):
+        with self.lock:
+            self.files += 1
+            self.bytes += size
+
+    def add_fallback(self, placement : str, reason : str):
+        with self.lock:
+            self.fallbacks[placement] = self.fallbacks.get(placement, 0) + 1
+            self.fallback_reasons.setdefault(placement, reason)
+
+    def stop(self):
+        self.end_time = time.perf_counter()
+
+    @property
+    def seconds(self) -> float:
+        if self.start_time is None:
+            return 0.0
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        return end_time - self.start_time
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / 1e6 / self.seconds if self.seconds else 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        lines = [f'Placed {self.files} files ({self.bytes / 1e6:.1f} MB) in {self.seconds:.1f}s: '
+                 f'{self.mb_per_second:.1f} MB/s, {self.files_per_second:.1f} files/s']
+        for placement, count in self.fallbacks.items():
+            lines.append(f'Could not {placement} {count} files ({self.fallback_reasons[placement]}), copied instead')
+        return '\n'.join(lines)
+
+def reflink_file(source : str, destination : str):
+    '''
+        Creates a copy-on-write clone of a file, sharing the data blocks with the source until either is changed.
+        Only supported on filesystems with reflink support such as Btrfs, XFS and APFS.
+
+        Arguments:
+            source: path of file to clone
+            destination: path of the clone
+
+        Raises OSError if the filesystem or platform does not support cloning
+    '''
+    if sys.platform.startswith('linux'):
+        import fcntl
+        with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+            try:
+                fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+            except OSError:
+                destination_file.close()
+                os.remove(destination)
+                raise
+    elif sys.platform == 'darwin':
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(source), os.fsencode(destination), 0) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+    else:
+        raise OSError(errno.ENOTSUP, 'Cloning files is not supported on this platform')
+
+def move_file(source : str, destination : str):
+    '''
+        Moves a file. Within one filesystem this is an atomic rename. Across filesystems the file is copied to a
+        temporary file beside the destination, renamed into place and then the source is removed.
+
+        Arguments:
+            source: path of file to move
+            destination: path to move the file to
+    '''
+    try:
+        os.replace(source, destination)
+    except OSError as error:
+        if error.errno != errno.EXDEV:
+            raise
+        temp_destination = destination + '.partial'
+        shutil.copy2(source, temp_destination)
+        os.replace(temp_destination, destination)
+        os.remove(source)
+
+def place_file(source : str, destination : str, placement : str = PLACEMENT_COPY, stats : CopyStats = None) -> str:
+    '''
+        Places a file at the destination using the requested placement. Links, clones and symlinks replace any
+        existing destination file as a copy would. If the placement is not possible (e.g. a hardlink across
+        devices) the file is copied instead and the fallback recorded in the stats.
+
+        Arguments:
+            source: path of file to place
+            destination: path to place the file at
+            placement: one of PLACEMENTS
+            stats: optional CopyStats to record fallbacks in
+
+        Returns:
+            placement actually used
+    '''
+    if placement == PLACEMENT_COPY:
+        # A link left by an earlier run would otherwise be copied through onto the source itself
+        if os.path.islink(destination) or (os.path.exists(destination) and os.path.samefile(source, destination)):
+            os.remove(destination)
+        shutil.copyfile(source, destination)
+        return PLACEMENT_COPY
+    if placement == PLACEMENT_MOVE:
+        move_file(source, destination)
+        return PLACEMENT_MOVE
+    if placement not in PLACEMENTS:
+        raise ValueError(f'Unknown placement: {placement}. Expected one of {PLACEMENTS}')
+
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        if placement == PLACEMENT_HARDLINK:
+            os.link(source, destination)
+        elif placement == PLACEMENT_REFLINK:
+            reflink_file(source, destination)
+        else:
+            os.symlink(os.path.abspath(source), destination)
+        return placement
+    except OSError as error:
+        if stats is not None:
+            stats.add_fallback(placement, error.strerror or str(error))
+        shutil.copyfile(source, destination)
+        return PLACEMENT_COPY
+
+def same_samples(source : str, destination : str, size : int) -> bool:
+    '''
+        Compares blocks at the start, middle and end of two files of the same size.
+    '''
+    offsets = sorted({0, max(0, size // 2 - PLACED_SAMPLE_BYTES // 2), max(0, size - PLACED_SAMPLE_BYTES)})
+    with open(source, 'rb') as source_file, open(destination, 'rb') as destination_file:
+        for offset in offsets:
+            source_file.seek(offset)
+            destination_file.seek(offset)
+            if source_file.read(PLACED_SAMPLE_BYTES) != destination_file.read(PLACED_SAMPLE_BYTES):
+                return False
+    return True
+
+def is_placed(source : str, destination : str) -> bool:
+    '''
+        Checks whether a file has already been placed at the destination, e.g. by an earlier interrupted sort.
+        A destination linked to the source counts as placed. Otherwise the destination must be the same size and
+        have the same bytes at its start, middle and end, so a partly written copy or a different photo which
+        happens to have the same size is placed again. Only PLACED_SAMPLE_BYTES blocks are read rather than
+        the whole file, as resuming may check many files on slow storage.
+
+        Arguments:
+            source: path of file to place
+            destination: path the file is placed at
+
+        Returns:
+            True if the destination already holds the file
+    '''
+    try:
+        if os.path.samefile(source, destination):
+            return True
+        size = os.path.getsize(source)
+        return size == os.path.getsize(destination) and same_samples(source, destination, size)
+    except OSError:
+        return False
+
+def check_copy_workers(workers : int):
+    '''
+        Raises ValueError if the number of concurrent copies is not a positive whole number.
+    '''
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError(f'Invalid number of copy workers: {workers}. Expected at least 1')
+
+class ParallelCopier:
+    """
+        Copies (or otherwise places) files on a pool of threads with a bounded number of copies in flight. Copies
+        to the same destination path are run in the order they were submitted, so the last submitted file wins
+        as it would when copying one at a time.
+
+        Arguments:
+            workers: number of concurrent copies
+            stats: optional CopyStats to record copies in. A new one is created if not passed
+            placement: how to place each file, one of PLACEMENTS
+    """
+    def __init__(self, workers : int = 1, stats : CopyStats = None, placement : str = PLACEMENT_COPY):
+        if placement not in PLACEMENTS:
+            raise ValueError(f'Unknown placement: {placement}. Expected one of {PLACEMENTS}')
+        check_copy_workers(workers)
+        self.placement = placement
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers * PENDING_COPIES_PER_WORKER)
+        self.stats = stats if stats is not None else CopyStats()
+        self.pending : Dict[str, Future] = {}
+        self.errors : List[BaseException] = []
+        self.lock = threading.Lock()
+
+    def submit(self, source : str, destination : str):
+        """
+            Queues a copy, blocking if the maximum number of copies are already in flight.
+
+            Arguments:
+                source: path of file to copy
+                destination: path to copy the file to
+        """
+        self.stats.start()
+        self.slots.acquire()
+        with self.lock:
+            previous = self.pending.get(destination)
+            future = self.executor.submit(self.copy, source, destination, previous)
+            self.pending[destination] = future
+        future.add_done_callback(lambda done: self.finish(destination, done))
+
+    def copy(self, source : str, destination : str, previous : Optional[Future]):
+        if previous is not None:
+            wait([previous])
+        place_file(source, destination, self.placement, self.stats)
+        self.stats.add(os.path.getsize(destination))
+
+    def finish(self, destination : str, future : Future):
+        with self.lock:
+            if self.pending.get(destination) is future:
+                del self.pending[destination]
+            if future.exception() is not None:
+                self.errors.append(future.exception())
+        self.slots.release()
+
+    def close(self):
+        """
+            Waits for all queued copies to finish. Raises the first error from any copy.
+        """
+        self.executor.shutdown(wait=True)
+        self.stats.stop()
+        if self.errors:
+            raise self.errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.executor.shutdown(wait=True)
@@ -1,11 +1,92 @@
 from distutils.command import build
-from typing import List
+from typing import Dict, Iterable, List, NamedTuple
 from fpdf import FPDF
-from qrImageIndexer.qr_generator import unpack_data, generate_qr_code_structure
-from qrImageIndexer.write_pdf_fpf2 import build_pdf_report
-
-def generate_qr_pdf(text_data: List[List[str]], qr_for_headings : bool,
-                    repeat_headings : bool, sort_sliceable : bool, string_header : str = '') -> FPDF:
-    data_struct = unpack_data(text_data, qr_for_headings, string_header)
-    iamge_struct = generate_qr_code_structure(data_struct)
-    return build_pdf_report(iamge_struct, repeat_headings, sort_sliceable)
\ No newline at end of file
+from multiprocessing import Pool, cpu_count
+from os import path
+from qrImageIndexer.qr_generator import unpack_data, generate_qr_code_structure, build_qr, build_qr_matrix
+from qrImageIndexer.write_pdf_fpf2 import build_pdf_report, build_pdf_table, build_data_table, TARGET_ROWS_PER_PAGE
+from qrImageIndexer.run_report import timed, STAGE_PARSE, STAGE_QR_GENERATION, STAGE_PDF_BUILD
+
+def generate_qr_pdf(text_data: Iterable[List[str]], qr_for_headings : bool,
+                    repeat_headings : bool, sort_sliceable : bool, string_header : str = '',
+                    timings : Dict[str, float] = None, workers : int = None, cache_dir : str = None,
+                    vector : bool = False) -> FPDF:
+    with timed(timings, STAGE_PARSE):
+        data_struct = unpack_data(text_data, qr_for_headings, string_header)
+    with timed(timings, STAGE_QR_GENERATION):
+        iamge_struct = generate_qr_code_structure(data_struct, workers=workers, cache_dir=cache_dir, vector=vector)
+    with timed(timings, STAGE_PDF_BUILD):
+        return build_pdf_report(iamge_struct, repeat_headings, sort_sliceable)
+
+class PdfPart(NamedTuple):
+    """
+        A single PDF file of a streamed PDF.
+
+        Attributes:
+            rows: rows of the table in the file, with the QR code string in the last cell of each row
+            path: path to save the file to
+            sort_sliceable: whether to order the rows of the file for slicing
+            vector: draw the QR codes as vector shapes instead of images
+    """
+    rows : List[List[str]]
+    path : str
+    sort_sliceable : bool
+    vector : bool
+
+def part_path(output_path : str, part : int, parts : int) -> str:
+    '''
+        Gets the path of a part of a split PDF, e.g. "codes_002.pdf" for part 2 of "codes.pdf". The output path is
+        used as is if the PDF is not split.
+    '''
+    if parts == 1:
+        return output_path
+    root, extension = path.splitext(output_path)
+    return f'{root}_{part + 1:0{max(3, len(str(parts)))}d}{extension}'
+
+def write_pdf_part(part : PdfPart) -> str:
+    '''
+        Builds and saves a single PDF file, building each QR code just before its row is drawn.
+
+        Returns:
+            path of the saved file
+    '''
+    pdf = build_pdf_table(part.rows, part.sort_sliceable, build_qr_matrix if part.vector else build_qr)
+    pdf.output(part.path)
+    return part.path
+
+def write_qr_pdfs(text_data : Iterable[List[str]], qr_for_headings : bool, repeat_headings : bool, sort_sliceable : bool,
+                  output_path : str, string_header : str = '', pages_per_file : int = None, workers : int = None,
+                  vector : bool = False, timings : Dict[str, float] = None) -> List[str]:
+    '''
+        Generates the PDF of QR codes for a text file without building every code first. Each code is built just
+        before its row is drawn and dropped after, so memory does not grow with the number of codes. The output can
+        be split into several files, which then are built in parallel and each hold only their own pages.
+
+        Parameters:
+            text_data: rows of the text file as returned by load_text_file, or read lazily with iter_rows
+            qr_for_headings: generate codes for headings as well as the last items in the tree
+            repeat_headings: repeat headings on every row
+            sort_sliceable: order the rows of each file for slicing. With split output each file is ordered on its
+                own, so it can be printed and sliced on its own
+            output_path: path to save the PDF to. Split files are numbered, e.g. "codes_001.pdf"
+            string_header: header for all QR code strings
+            pages_per_file: split the output into files of this many pages, None to write a single file
+            workers: number of worker processes to build split files on, defaults to the number of CPU cores
+            vector: draw the QR codes as vector shapes instead of images
+            timings: if passed, time spent parsing and building is added to it
+
+        Returns:
+            Paths of the saved files, in order
+    '''
+    with timed(timings, STAGE_PARSE):
+        data_table = build_data_table(unpack_data(text_data, qr_for_headings, string_header), repeat_headings)
+    rows_per_file = pages_per_file * TARGET_ROWS_PER_PAGE if pages_per_file else max(1, len(data_table))
+    chunks = [data_table[i:i + rows_per_file] for i in range(0, len(data_table), rows_per_file)] or [[]] # An empty index still writes an empty PDF
+    parts = [PdfPart(rows, part_path(output_path, i, len(chunks)), sort_sliceable, vector) for i, rows in enumerate(chunks)]
+
+    with timed(timings, STAGE_PDF_BUILD):
+        if len(parts) <= 1 or workers == 1:
+            return [write_pdf_part(part) for part in parts]
+        workers = min(workers or cpu_count(), len(parts))
+        with Pool(workers) as pool:
+            return pool.map(write_pdf_part, parts, chunksize=1)
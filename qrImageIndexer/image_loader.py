@@ -0,0 +1,378 @@
+import cv2
+import numpy
+import struct
+from datetime import datetime
+from PIL import Image
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+MIN_REDUCED_SIZE = 1000
+DECODE_BYTES_PER_PIXEL = 3 # Grayscale image, binarized copy and the decoder's working copy
+
+REDUCED_GRAYSCALE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+EXIF_HEADER = b'Exif\x00\x00'
+TIFF_HEADERS = (b'II*\x00', b'MM\x00*')
+TAG_PREVIEW_OFFSET = 0x0201 # JPEGInterchangeFormat
+TAG_PREVIEW_LENGTH = 0x0202 # JPEGInterchangeFormatLength
+TAG_SUB_IFDS = 0x014a
+TAG_EXIF_IFD = 0x8769
+TAG_DATE_TIME_ORIGINAL = 0x9003
+TAG_SUB_SEC_TIME_ORIGINAL = 0x9291
+TIFF_TYPE_ASCII = 2
+TIFF_TYPE_SIZES = {1: 1, 3: 2, 4: 4, 13: 4}
+MAX_IFDS = 32
+EXIF_DATE_TIME_FORMAT = '%Y:%m:%d %H:%M:%S'
+EPOCH = datetime(1970, 1, 1)
+
+def read_image_size(image_path : str) -> Optional[Tuple[int, int]]:
+    """
+        Reads the pixel dimensions of an image from the file header without decoding the pixel data.
+
+        Arguments:
+            image_path: path to image
+
+        Returns tuple of (width, height). Returns None if the file could not be read as an image.
+    """
+    try:
+        with Image.open(image_path) as im:
+            return im.size
+    except Exception:
+        return None
+
+def choose_reduction(size : Optional[Tuple[int, int]], min_size : int = MIN_REDUCED_SIZE) -> int:
+    """
+        Picks the largest reduction factor supported by OpenCV's reduced decoding which keeps the
+        long edge of the image at or above the minimum size.
+
+        Arguments:
+            size: tuple of (width, height) of the full image. If None no reduction is chosen
+            min_size: minimum length in pixels of the long edge of the reduced image
+
+        Returns reduction factor as an integer. 1 indicates no reduction.
+    """
+    if not size:
+        return 1
+    for reduction in sorted(REDUCED_GRAYSCALE_FLAGS, reverse=True):
+        if max(size) / reduction >= min_size:
+            return reduction
+    return 1
+
+def reduction_for_budget(size : Optional[Tuple[int, int]], max_pixels : Optional[int]) -> int:
+    """
+        Picks the smallest reduction factor supported by OpenCV's reduced decoding which keeps the number of
+        pixels in the image within a limit.
+
+        Arguments:
+            size: tuple of (width, height) of the full image. If None no reduction is chosen
+            max_pixels: largest number of pixels to decode at once. If None no reduction is chosen
+
+        Returns reduction factor as an integer. The largest supported factor if no factor is small enough.
+    """
+    if not size or not max_pixels:
+        return 1
+    for reduction in [1] + sorted(REDUCED_GRAYSCALE_FLAGS):
+        if (size[0] // reduction) * (size[1] // reduction) <= max_pixels:
+            return reduction
+    return max(REDUCED_GRAYSCALE_FLAGS)
+
+def reduction_for_scale(scale : float) -> Optional[int]:
+    """
+        Finds the reduced decoding factor which matches a scale exactly, e.g. 0.25 matches a reduction of 4.
+
+        Arguments:
+            scale: fraction of full resolution
+
+        Returns reduction factor as an integer, or None if no reduced decoding matches the scale.
+    """
+    if scale <= 0 or scale >= 1:
+        return None
+    reduction = round(1 / scale)
+    if reduction in REDUCED_GRAYSCALE_FLAGS and abs(1 / scale - reduction) < 1e-6:
+        return reduction
+    return None
+
+def load_grayscale(image_path : str, reduction : int = 1):
+    """
+        Loads an image as grayscale, optionally at reduced size. For JPEG files the reduction is applied by
+        the decoder itself, so a reduced image is much cheaper to load than a full one.
+
+        Arguments:
+            image_path: path to image
+            reduction: factor of 1, 2, 4 or 8 to reduce each dimension of the image by
+
+        Returns grayscale image as numpy array, or None if the image could not be read.
+    """
+    if reduction == 1:
+        return cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    return cv2.imread(image_path, REDUCED_GRAYSCALE_FLAGS[reduction])
+
+def load_thumbnail(image_path : str, size : int):
+    """
+        Loads a small grayscale copy of an image as cheaply as possible, using reduced size decoding where the
+        image is large enough and resizing the result so its long edge is at most the requested size.
+
+        Arguments:
+            image_path: path to image
+            size: maximum length in pixels of the long edge of the thumbnail
+
+        Returns grayscale thumbnail as numpy array, or None if the image could not be read.
+    """
+    im = load_grayscale(image_path, choose_reduction(read_image_size(image_path), size))
+    if im is None:
+        return None
+    long_edge = max(im.shape)
+    if long_edge > size:
+        im = cv2.resize(im, None, fx=size / long_edge, fy=size / long_edge, interpolation=cv2.INTER_AREA)
+    return im
+
+def find_exif_tiff_offset(f : BinaryIO) -> Optional[int]:
+    """
+        Walks the segment markers at the start of a JPEG file to find the EXIF block. Stops at the start of the
+        compressed image data so only the file header is read.
+
+        Arguments:
+            f: binary file object positioned just after the JPEG start of image marker
+
+        Returns file offset of the TIFF header inside the EXIF block, or None if there is no EXIF block.
+    """
+    while True:
+        marker = f.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            return None
+        marker_type = marker[1]
+        length = struct.unpack('>H', marker[2:])[0]
+        if marker_type == 0xDA: # Start of scan, no more header segments
+            return None
+        segment_start = f.tell()
+        if marker_type == 0xE1 and f.read(len(EXIF_HEADER)) == EXIF_HEADER:
+            return segment_start + len(EXIF_HEADER)
+        f.seek(segment_start + length - 2)
+
+def read_ifd_value(f : BinaryIO, tiff_offset : int, byte_order : str, field_type : int, count : int, value : bytes) -> List[int]:
+    """
+        Reads the values of a TIFF IFD entry, following the offset if the values do not fit in the entry itself.
+
+        Arguments:
+            f: binary file object
+            tiff_offset: file offset of the TIFF header which IFD offsets are relative to
+            byte_order: struct byte order character for the TIFF block
+            field_type: TIFF field type of the entry
+            count: number of values in the entry
+            value: raw four byte value field of the entry
+
+        Returns list of integer values. Empty if the field type is not an integer type.
+    """
+    size = TIFF_TYPE_SIZES.get(field_type)
+    if size is None:
+        return []
+    value_format = {1: 'B', 2: 'H', 4: 'I'}[size]
+    if size * count > 4:
+        f.seek(tiff_offset + struct.unpack(byte_order + 'I', value)[0])
+        value = f.read(size * count)
+    return list(struct.unpack(byte_order + value_format * count, value[:size * count]))
+
+def find_tiff_offset(f : BinaryIO) -> Optional[int]:
+    """
+        Finds the TIFF block holding the EXIF data of a JPEG file, or the start of a TIFF based RAW file.
+
+        Arguments:
+            f: binary file object positioned at the start of the file
+
+        Returns file offset of the TIFF header, or None if the file has no TIFF block.
+    """
+    start = f.read(4)
+    if start[:2] == b'\xff\xd8':
+        f.seek(2)
+        return find_exif_tiff_offset(f)
+    if start in TIFF_HEADERS:
+        return 0
+    return None
+
+def read_ifd_entries(f : BinaryIO, tiff_offset : int, byte_order : str, ifd_offset : int) -> Dict[int, Tuple[int, int, bytes]]:
+    """
+        Reads the entries of a single TIFF IFD.
+
+        Arguments:
+            f: binary file object
+            tiff_offset: file offset of the TIFF header which IFD offsets are relative to
+            byte_order: struct byte order character for the TIFF block
+            ifd_offset: offset of the IFD relative to the TIFF header
+
+        Returns dictionary of tag against (field type, count, raw four byte value field). Empty if the IFD could
+        not be read.
+    """
+    f.seek(tiff_offset + ifd_offset)
+    raw_count = f.read(2)
+    if len(raw_count) < 2:
+        return {}
+    entry_count = struct.unpack(byte_order + 'H', raw_count)[0]
+    raw_entries = f.read(12 * entry_count)
+    entries = {}
+    for i in range(len(raw_entries) // 12):
+        tag, field_type, count, value = struct.unpack(byte_order + 'HHI4s', raw_entries[12 * i: 12 * (i + 1)])
+        entries[tag] = (field_type, count, value)
+    return entries
+
+def read_ifd_string(f : BinaryIO, tiff_offset : int, byte_order : str, field_type : int, count : int, value : bytes) -> Optional[str]:
+    """
+        Reads the text of an ASCII TIFF IFD entry, following the offset if the text does not fit in the entry itself.
+
+        Returns the text without trailing null characters, or None if the entry is not ASCII.
+    """
+    if field_type != TIFF_TYPE_ASCII:
+        return None
+    if count > 4:
+        f.seek(tiff_offset + struct.unpack(byte_order + 'I', value)[0])
+        value = f.read(count)
+    return value[:count].split(b'\x00')[0].decode('ascii', errors='replace')
+
+def find_tiff_previews(f : BinaryIO, tiff_offset : int) -> List[Tuple[int, int]]:
+    """
+        Walks the IFDs of a TIFF block (including sub IFDs as used by RAW formats) and collects the location
+        of every embedded JPEG preview.
+
+        Arguments:
+            f: binary file object
+            tiff_offset: file offset of the TIFF header
+
+        Returns list of (file offset, length) tuples for each embedded preview
+    """
+    f.seek(tiff_offset)
+    header = f.read(8)
+    if len(header) < 8 or header[:4] not in TIFF_HEADERS:
+        return []
+    byte_order = '<' if header[:2] == b'II' else '>'
+    to_visit = [struct.unpack(byte_order + 'I', header[4:])[0]]
+    visited = set()
+    previews = []
+    while to_visit and len(visited) < MAX_IFDS:
+        ifd_offset = to_visit.pop(0)
+        if ifd_offset == 0 or ifd_offset in visited:
+            continue
+        visited.add(ifd_offset)
+        f.seek(tiff_offset + ifd_offset)
+        raw_count = f.read(2)
+        if len(raw_count) < 2:
+            continue
+        entry_count = struct.unpack(byte_order + 'H', raw_count)[0]
+        entries = f.read(12 * entry_count + 4)
+        if len(entries) < 12 * entry_count + 4:
+            continue
+        preview_offset = None
+        preview_length = None
+        for i in range(entry_count):
+            tag, field_type, count, value = struct.unpack(byte_order + 'HHI4s', entries[12 * i: 12 * (i + 1)])
+            if tag == TAG_PREVIEW_OFFSET:
+                preview_offset = read_ifd_value(f, tiff_offset, byte_order, field_type, 1, value)
+            elif tag == TAG_PREVIEW_LENGTH:
+                preview_length = read_ifd_value(f, tiff_offset, byte_order, field_type, 1, value)
+            elif tag == TAG_SUB_IFDS:
+                to_visit.extend(read_ifd_value(f, tiff_offset, byte_order, field_type, count, value))
+        if preview_offset and preview_length:
+            previews.append((tiff_offset + preview_offset[0], preview_length[0]))
+        to_visit.append(struct.unpack(byte_order + 'I', entries[-4:])[0])
+    return previews
+
+def read_embedded_preview(image_path : str) -> Optional[bytes]:
+    """
+        Reads the largest embedded JPEG preview from a JPEG file's EXIF block or from a TIFF based RAW file.
+        Only the file header and the preview itself are read from disk.
+
+        Arguments:
+            image_path: path to image
+
+        Returns the JPEG encoded preview as bytes, or None if the file does not contain a preview.
+    """
+    try:
+        with open(image_path, 'rb') as f:
+            tiff_offset = find_tiff_offset(f)
+            if tiff_offset is None:
+                return None
+            previews = find_tiff_previews(f, tiff_offset)
+            if not previews:
+                return None
+            offset, length = max(previews, key=lambda preview: preview[1])
+            f.seek(offset)
+            data = f.read(length)
+    except (OSError, struct.error):
+        return None
+    if not data.startswith(b'\xff\xd8'):
+        return None
+    return data
+
+def load_embedded_preview(image_path : str):
+    """
+        Loads the largest embedded JPEG preview of an image as grayscale.
+
+        Arguments:
+            image_path: path to image
+
+        Returns grayscale preview as numpy array, or None if the file has no readable preview.
+    """
+    data = read_embedded_preview(image_path)
+    if data is None:
+        return None
+    return cv2.imdecode(numpy.frombuffer(data, numpy.uint8), cv2.IMREAD_GRAYSCALE)
+
+def parse_capture_time(date_time : Optional[str], sub_sec : Optional[str] = None) -> Optional[float]:
+    """
+        Converts an EXIF date and time, with optional fractional seconds, to a number of seconds for ordering.
+
+        Arguments:
+            date_time: EXIF date and time as "YYYY:MM:DD HH:MM:SS"
+            sub_sec: EXIF fractional seconds as digits, e.g. "05" for 0.05 seconds
+
+        Returns seconds since 1970 in the camera's local time, or None if the date is missing or invalid.
+    """
+    if not date_time:
+        return None
+    try:
+        seconds = (datetime.strptime(date_time.strip(), EXIF_DATE_TIME_FORMAT) - EPOCH).total_seconds()
+    except ValueError:
+        return None
+    if sub_sec and sub_sec.strip().isdigit():
+        seconds += float('0.' + sub_sec.strip())
+    return seconds
+
+def read_capture_time(image_path : str) -> Optional[float]:
+    """
+        Reads the time a photo was taken from the EXIF DateTimeOriginal and SubSecTimeOriginal tags of a JPEG,
+        TIFF or TIFF based RAW file, from the EXIF IFD or else from IFD0. Only the file header is read.
+
+        Arguments:
+            image_path: path to image
+
+        Returns seconds since 1970 in the camera's local time, see parse_capture_time. None if the file has no
+        capture time.
+    """
+    try:
+        with open(image_path, 'rb') as f:
+            tiff_offset = find_tiff_offset(f)
+            if tiff_offset is None:
+                return None
+            f.seek(tiff_offset)
+            header = f.read(8)
+            if len(header) < 8 or header[:4] not in TIFF_HEADERS:
+                return None
+            byte_order = '<' if header[:2] == b'II' else '>'
+            ifd0 = read_ifd_entries(f, tiff_offset, byte_order, struct.unpack(byte_order + 'I', header[4:])[0])
+            exif = {}
+            if TAG_EXIF_IFD in ifd0:
+                exif_offset = read_ifd_value(f, tiff_offset, byte_order, *ifd0[TAG_EXIF_IFD])
+                if exif_offset:
+                    exif = read_ifd_entries(f, tiff_offset, byte_order, exif_offset[0])
+            if TAG_DATE_TIME_ORIGINAL not in exif:
+                exif = ifd0 # Some TIFF writers, e.g. PIL with tiffinfo, put the EXIF tags in IFD0 itself
+            if TAG_DATE_TIME_ORIGINAL not in exif:
+                return None
+            date_time = read_ifd_string(f, tiff_offset, byte_order, *exif[TAG_DATE_TIME_ORIGINAL])
+            sub_sec = None
+            if TAG_SUB_SEC_TIME_ORIGINAL in exif:
+                sub_sec = read_ifd_string(f, tiff_offset, byte_order, *exif[TAG_SUB_SEC_TIME_ORIGINAL])
+    except (OSError, struct.error):
+        return None
+    return parse_capture_time(date_time, sub_sec)
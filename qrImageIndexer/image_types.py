@@ -0,0 +1,97 @@
+from typing import Optional
+import os
+
+MAGIC_BYTES_LENGTH = 32
+
+IMAGE_JPEG = 'jpeg'
+IMAGE_PNG = 'png'
+IMAGE_TIFF = 'tiff'
+IMAGE_HEIC = 'heic'
+IMAGE_RAW = 'raw'
+IMAGE_GIF = 'gif'
+IMAGE_BMP = 'bmp'
+IMAGE_WEBP = 'webp'
+
+EXTENSION_TYPES = {
+    '.jpg' : IMAGE_JPEG, '.jpeg' : IMAGE_JPEG, '.jpe' : IMAGE_JPEG,
+    '.png' : IMAGE_PNG,
+    '.tif' : IMAGE_TIFF, '.tiff' : IMAGE_TIFF,
+    '.heic' : IMAGE_HEIC, '.heif' : IMAGE_HEIC, '.hif' : IMAGE_HEIC,
+    '.gif' : IMAGE_GIF,
+    '.bmp' : IMAGE_BMP,
+    '.webp' : IMAGE_WEBP,
+    '.cr2' : IMAGE_RAW, '.cr3' : IMAGE_RAW, '.nef' : IMAGE_RAW, '.nrw' : IMAGE_RAW, '.arw' : IMAGE_RAW,
+    '.srf' : IMAGE_RAW, '.sr2' : IMAGE_RAW, '.dng' : IMAGE_RAW, '.orf' : IMAGE_RAW, '.rw2' : IMAGE_RAW,
+    '.raf' : IMAGE_RAW, '.pef' : IMAGE_RAW, '.srw' : IMAGE_RAW, '.3fr' : IMAGE_RAW, '.iiq' : IMAGE_RAW,
+}
+
+# Sidecar, video and other files commonly found on camera cards, rejected without being opened
+NON_IMAGE_EXTENSIONS = {'.txt', '.xmp', '.json', '.xml', '.csv', '.pdf', '.ini', '.db', '.log', '.zip',
+                        '.mov', '.mp4', '.m4v', '.avi', '.mts', '.m2ts', '.lrv', '.wav', '.mp3', '.ctg'}
+
+TIFF_HEADERS = (b'II*\x00', b'MM\x00*')
+RAW_HEADERS = (b'IIRO', b'IIRS', b'MMOR', b'IIU\x00') # Olympus ORF and Panasonic RW2
+FUJIFILM_HEADER = b'FUJIFILMCCD-RAW'
+HEIF_BRANDS = {b'heic', b'heix', b'hevc', b'hevx', b'heim', b'heis', b'mif1', b'msf1'}
+CANON_CR3_BRAND = b'crx '
+
+def sniff_image_type(header : bytes, extension : str = '') -> Optional[str]:
+    '''
+        Identifies an image format from the magic bytes at the start of a file.
+
+        Arguments:
+            header: first bytes of the file, at least MAGIC_BYTES_LENGTH where the file is long enough
+            extension: lower case file extension including the dot. Used to tell RAW files built on TIFF,
+                such as NEF, ARW and DNG, from plain TIFF images
+
+        Returns:
+            image type as string (e.g. IMAGE_JPEG), None if the bytes are not a known image format
+    '''
+    if header.startswith(b'\xff\xd8\xff'):
+        return IMAGE_JPEG
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return IMAGE_PNG
+    if header[:4] in TIFF_HEADERS:
+        if header[8:10] == b'CR' or EXTENSION_TYPES.get(extension) == IMAGE_RAW:
+            return IMAGE_RAW
+        return IMAGE_TIFF
+    if header[:4] in RAW_HEADERS or header.startswith(FUJIFILM_HEADER):
+        return IMAGE_RAW
+    if header[4:8] == b'ftyp': # ISO base media file, the major brand and compatible brands identify the format
+        box_size = int.from_bytes(header[:4], 'big')
+        # Major brand, then the minor version which is not a brand, then the compatible brands
+        brands = {header[8:12]} | {header[i:i + 4] for i in range(16, min(box_size, len(header)) - 3, 4)}
+        if brands & HEIF_BRANDS:
+            return IMAGE_HEIC
+        if CANON_CR3_BRAND in brands:
+            return IMAGE_RAW
+        return None
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return IMAGE_GIF
+    if header[:2] == b'BM':
+        return IMAGE_BMP
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return IMAGE_WEBP
+    return None
+
+def get_image_type(file_path : str) -> Optional[str]:
+    '''
+        Detects the type of an image. Files with an extension known not to be an image are rejected by name,
+        everything else is confirmed by reading the first MAGIC_BYTES_LENGTH bytes of the file, so images with a
+        wrong or missing extension are still found.
+
+        Arguments:
+            file_path: path to file
+
+        Returns:
+            image type as string (e.g. 'jpeg'), None if the file is not an image or could not be read
+    '''
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in NON_IMAGE_EXTENSIONS:
+        return None
+    try:
+        with open(file_path, 'rb') as f:
+            header = f.read(MAGIC_BYTES_LENGTH)
+    except OSError:
+        return None
+    return sniff_image_type(header, extension)
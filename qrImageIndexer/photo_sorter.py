@@ -1,46 +1,266 @@
 from pyzbar.pyzbar import decode, ZBarSymbol
 import cv2
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, NamedTuple, Optional, Iterable, Iterator
 from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
 import os
 import shutil
 from functools import partial
+from contextlib import contextmanager
 import tqdm
-import imghdr
+import json
 import re
+import time
+from datetime import datetime
+from qrImageIndexer.image_loader import read_image_size, choose_reduction, reduction_for_scale, reduction_for_budget, load_grayscale, load_embedded_preview, read_capture_time, EPOCH, DECODE_BYTES_PER_PIXEL
+from qrImageIndexer.qr_prefilter import has_qr_candidate
+from qrImageIndexer.qr_decoders import decode_cascade
+from qrImageIndexer.file_inventory import FileInventory, build_inventory, copy_non_images
+from qrImageIndexer.image_types import get_image_type
+from qrImageIndexer.scan_cache import ScanCache, CACHE_FILE_NAME
+from qrImageIndexer.scan_checkpoint import ScanCheckpoint, CHECKPOINT_FILE_NAME
+from qrImageIndexer.file_placement import CopyStats, check_copy_workers, PLACEMENT_COPY, PLACEMENT_MOVE
+from qrImageIndexer.sort_plan import sanitise_path, plan_sort, plan_directories, apply_plan, PlanWriter
+from qrImageIndexer.run_report import timed, build_run_report, write_run_report, TIMING_PREVIEW, TIMING_PREFILTER, \
+    TIMING_LOAD, TIMING_RESIZE, TIMING_ZBAR, TIMING_BINARIZATION, BINARIZATION_HITS, STAGE_CAPTURE_TIMES, STAGE_SCAN, \
+    STAGE_SORT, STAGE_SCAN_AND_SORT, STAGE_NON_IMAGES
 
-def read_qr_zbar(image_path : str, binarization : bool = False) -> List:
+PYRAMID_SCALES = (0.25, 0.5, 1.0)
+
+BACKEND_PROCESS = 'process'
+BACKEND_THREAD = 'thread'
+BACKENDS = (BACKEND_PROCESS, BACKEND_THREAD)
+
+STAGE_PREFILTER = 'prefilter'
+STAGE_PREVIEW = 'preview'
+STAGE_IMAGE = 'image'
+STAGE_NOT_FOUND = 'not_found'
+
+class ScanSettings(NamedTuple):
+    """
+        Settings controlling how images are loaded and decoded when scanning for QR codes.
+
+        Attributes:
+            binarization: retry with an OTSU binarized image if no QR code is found
+            scales: if set, decode a grayscale image at each of these scales (fractions of full
+                resolution) in order, stopping at the first scale that finds a QR code
+            reduced_load: load images as grayscale using OpenCV's reduced size JPEG decoding. Without scales
+                the reduction is chosen from the image dimensions, falling back to a full size decode if
+                nothing is found. With scales, any scale of 1/2, 1/4 or 1/8 is loaded directly at that size
+            use_preview: scan the embedded EXIF or RAW preview first, only loading the full image if the preview
+                does not exist or contains no valid QR code
+            prefilter: check a small thumbnail for QR finder patterns before the full decode. Images without any
+                are rejected without being decoded or binarized
+            max_pixels: largest number of pixels to decode at once. Images are loaded as grayscale and any image
+                larger than this, going by the dimensions in its header, is loaded at a reduced size instead. Bounds
+                the memory used by each worker, see memory_budget_pixels
+            decoders: if set, the names of decoders from qr_decoders.DECODERS to try in order, stopping at the first
+                which finds a code. Binarization is then only done by the qr_decoders.DECODER_ZBAR_OTSU decoder and the
+                binarization setting is ignored. If not set, images are decoded with pyzbar
+    """
+    binarization : bool = False
+    scales : Optional[Tuple[float, ...]] = None
+    reduced_load : bool = False
+    use_preview : bool = False
+    prefilter : bool = False
+    max_pixels : Optional[int] = None
+    decoders : Optional[Tuple[str, ...]] = None
+
+def check_scales(scales : Optional[Tuple[float, ...]]):
+    '''
+        Raises ValueError if any pyramid scale is not a fraction of full resolution, i.e. outside (0, 1].
+    '''
+    invalid = [scale for scale in scales or () if not 0 < scale <= 1]
+    if invalid:
+        raise ValueError(f'Invalid pyramid scales: {invalid}. Scales must be greater than 0 and at most 1')
+
+class ScanResult(NamedTuple):
+    """
+        Result of scanning a single image.
+
+        Attributes:
+            path: path of the scanned image
+            qr: content of the found QR code with the string header removed, None if nothing found
+            scale: scale of the image at which the QR code was found, None if nothing found or unknown
+            stage: stage of the scan which found the QR code (STAGE_PREVIEW or STAGE_IMAGE). If nothing found,
+                STAGE_PREFILTER if the image was rejected by the prefilter, otherwise STAGE_NOT_FOUND
+            seconds: time taken to scan the image, None if unknown (e.g. a cached result)
+            timings: seconds spent in each part of the scan (run_report.TIMING_*) and the number of binarization
+                retries which found a code (run_report.BINARIZATION_HITS). None if unknown
+    """
+    path : str
+    qr : Optional[str]
+    scale : Optional[float] = None
+    stage : str = STAGE_NOT_FOUND
+    seconds : Optional[float] = None
+    timings : Optional[Dict[str, float]] = None
+
+def decode_qr_image(im, binarization : bool = False, timings : Dict[str, float] = None,
+                    decoders : Tuple[str, ...] = None) -> List:
+    """
+        Scans an already loaded image for qr codes using pyzbar. If it fails to find a QR code and binarization
+        is requested will try again with binarization using OpenCV with OTSU threshold finding.
+
+        Arguments:
+            im: image as numpy array, either BGR or grayscale. May be None if the image could not be loaded, e.g.
+                a HEIC or RAW file OpenCV cannot decode
+            binarization: whether to retry with a binarized image
+            timings: if passed, the time spent decoding and binarizing is added to it, see ScanResult.timings
+            decoders: if passed, decode with this cascade of decoders instead, see qr_decoders.decode_cascade
+
+        Returns pyzbar results in list
+    """
+    if im is None:
+        return []
+    if decoders:
+        return decode_cascade(im, decoders, timings)
+    with timed(timings, TIMING_ZBAR):
+        result = decode(im, symbols = [ZBarSymbol.QRCODE])
+    if not result and binarization:
+        with timed(timings, TIMING_BINARIZATION):
+            im_gray = im if len(im.shape) == 2 else cv2.cvtColor(im, cv2.COLOR_BGR2GRAY)
+            thres, im_binarized = cv2.threshold(im_gray, 128, 255, cv2.THRESH_OTSU)
+            result = decode(im_binarized, symbols = [ZBarSymbol.QRCODE])
+        if result and timings is not None:
+            timings[BINARIZATION_HITS] = timings.get(BINARIZATION_HITS, 0) + 1
+    return result
+
+def read_qr_zbar(image_path : str, binarization : bool = False, timings : Dict[str, float] = None,
+                 decoders : Tuple[str, ...] = None) -> List:
     """
         Loads and scans image for qr code using pyzbar. Processes raw image first. If it fails to find a QR code will
         try again with binarization using OpenCV with OTSU threshold finding.
 
         Arguments:
             image_path: path to image to scan
+            timings: if passed, the time spent in each part of the scan is added to it
+            decoders: if passed, decode with this cascade of decoders instead of pyzbar
         
         Returns pyzbar results in list
     """
-    im = cv2.imread(image_path)
-    result = decode(im, symbols = [ZBarSymbol.QRCODE])
-    if not result and binarization:
-        im_gray = cv2.cvtColor(im, cv2.COLOR_BGR2GRAY)
-        thres, im_binarized = cv2.threshold(im_gray, 128, 255, cv2.THRESH_OTSU)
-        result = decode(im_binarized, symbols = [ZBarSymbol.QRCODE])
-    return result
+    with timed(timings, TIMING_LOAD):
+        im = cv2.imread(image_path)
+    return decode_qr_image(im, binarization, timings, decoders)
 
-def get_qr(image_path : str, string_header : str = '', binarization : bool = False) -> str:
+def load_grayscale_timed(image_path : str, reduction : int = 1, timings : Dict[str, float] = None):
     """
-        Loads image and attempts to find a QR code
-    
+        Calls image_loader.load_grayscale, adding the time taken to timings if passed
+    """
+    with timed(timings, TIMING_LOAD):
+        return load_grayscale(image_path, reduction)
+
+def read_qr_zbar_reduced(image_path : str, binarization : bool = False, min_reduction : int = 1,
+                         timings : Dict[str, float] = None, decoders : Tuple[str, ...] = None) -> Tuple[List, Optional[float]]:
+    """
+        Loads image as grayscale at a reduced size chosen from its pixel dimensions and scans it for a qr code.
+        If nothing is found the full size image is loaded and scanned instead.
+
         Arguments:
-            image_path: string indicating path of photo to scan
-            string_header: optional string that indicates the header to look  for if one was use
-                if a header is passed only QR codes with this header will be returned
+            image_path: path to image to scan
+            binarization: whether to retry each size with a binarized image
+            min_reduction: smallest reduction to load the image at, used in place of the full size image
+            timings: if passed, the time spent in each part of the scan is added to it
+            decoders: if passed, decode with this cascade of decoders instead of pyzbar
+
+        Returns tuple of pyzbar results in list and the scale which produced them (None if nothing found)
+    """
+    reduction = max(choose_reduction(read_image_size(image_path)), min_reduction)
+    if reduction > min_reduction:
+        result = decode_qr_image(load_grayscale_timed(image_path, reduction, timings), binarization, timings, decoders)
+        if result:
+            return result, 1 / reduction
+    result = decode_qr_image(load_grayscale_timed(image_path, min_reduction, timings), binarization, timings, decoders)
+    if result:
+        return result, 1 / min_reduction
+    return [], None
+
+def read_qr_zbar_preview(image_path : str, binarization : bool = False,
+                         timings : Dict[str, float] = None, decoders : Tuple[str, ...] = None) -> Tuple[List, Optional[float]]:
+    """
+        Scans the embedded EXIF or RAW preview of an image for a qr code. Only the file header and the preview
+        are read from disk.
+
+        Arguments:
+            image_path: path to image to scan
+            binarization: whether to retry with a binarized preview
+            timings: if passed, the time spent in each part of the scan is added to it
+            decoders: if passed, decode with this cascade of decoders instead of pyzbar
+
+        Returns tuple of pyzbar results in list and the scale of the preview relative to the full image (None if
+        nothing found or if the full image size is unknown)
+    """
+    with timed(timings, TIMING_PREVIEW):
+        im = load_embedded_preview(image_path)
+    if im is None:
+        return [], None
+    result = decode_qr_image(im, binarization, timings, decoders)
+    if not result:
+        return [], None
+    size = read_image_size(image_path)
+    return result, im.shape[1] / size[0] if size else None
+
+def read_qr_zbar_pyramid(image_path : str, binarization : bool = False,
+                         scales : Tuple[float, ...] = PYRAMID_SCALES, reduced_load : bool = False,
+                         min_reduction : int = 1, timings : Dict[str, float] = None,
+                         decoders : Tuple[str, ...] = None) -> Tuple[List, Optional[float]]:
+    """
+        Loads image as grayscale and scans downscaled copies of it for a qr code, working through the
+        provided scales in order and stopping at the first scale which finds a code. Large printed codes
+        are usually found at a fraction of the full resolution, which is far cheaper to scan.
+
+        Arguments:
+            image_path: path to image to scan
+            binarization: whether to retry each scale with a binarized image
+            scales: fractions of full resolution to try, in order. Values of 1 or more use the full image
+            reduced_load: load scales of 1/2, 1/4 and 1/8 with reduced size decoding instead of resizing the
+                full image. The full image is then only loaded if another scale needs it
+            min_reduction: smallest reduction to load the image at. Scales above 1 / min_reduction are scanned at
+                that scale instead
+            timings: if passed, the time spent in each part of the scan is added to it
+            decoders: if passed, decode with this cascade of decoders instead of pyzbar
+
+        Returns tuple of pyzbar results in list and the scale which produced them (None if nothing found)
+    """
+    max_scale = 1 / min_reduction
+    im = None
+    scanned_scales = set()
+    for scale in scales:
+        scale = min(scale, max_scale)
+        if scale in scanned_scales:
+            continue
+        scanned_scales.add(scale)
+        reduction = reduction_for_scale(scale) if reduced_load else None
+        if reduction:
+            im_scaled = load_grayscale_timed(image_path, reduction, timings)
+        else:
+            if im is None:
+                im = load_grayscale_timed(image_path, min_reduction, timings)
+                if im is None:
+                    return [], None
+            if scale >= max_scale:
+                im_scaled = im
+            else:
+                factor = scale / max_scale
+                with timed(timings, TIMING_RESIZE):
+                    im_scaled = cv2.resize(im, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        result = decode_qr_image(im_scaled, binarization, timings, decoders)
+        del im_scaled # Free this scale before loading the next
+        if result:
+            return result, scale
+    return [], None
+
+def filter_qr_results(results : List, string_header : str = '') -> str:
+    """
+        Picks the QR code string from pyzbar results, only accepting codes starting with the string header.
+
+        Arguments:
+            results: pyzbar results
+            string_header: header that valid QR codes start with. Removed from the returned string
 
         Returns a string indicating content of found QR code. Returns None if nothing found.
 
-        Does not currently handle multiple QR codes. Will raise exception
+        Raises exception if multiple valid QR codes are found
     """
-    results = read_qr_zbar(image_path, binarization)
     valid_results : List(str) = []
     for result in results:
         str_data :str = result.data.decode('utf-8')
@@ -55,6 +275,87 @@ def get_qr(image_path : str, string_header : str = '', binarization : bool = Fal
     else:
         return None
 
+def scan_image(image_path : str, string_header : str = '', settings : ScanSettings = ScanSettings()) -> ScanResult:
+    """
+        Loads image and attempts to find a QR code using the provided scan settings
+
+        Arguments:
+            image_path: string indicating path of photo to scan
+            string_header: optional string that indicates the header to look  for if one was use
+                if a header is passed only QR codes with this header will be returned
+            settings: settings to use for loading and decoding the image
+
+        Returns ScanResult for the image
+    """
+    timings = {}
+    start = time.perf_counter()
+    result = scan_image_stages(image_path, string_header, settings, timings)
+    return result._replace(seconds=time.perf_counter() - start, timings=timings)
+
+def scan_image_stages(image_path : str, string_header : str = '', settings : ScanSettings = ScanSettings(),
+                      timings : Dict[str, float] = None) -> ScanResult:
+    """
+        Runs each scan stage enabled in the settings on an image in turn, stopping at the first which finds a
+        QR code or rejects the image. Called by scan_image, which adds the time taken.
+
+        Arguments:
+            image_path: string indicating path of photo to scan
+            string_header: header QR codes must start with
+            settings: settings to use for loading and decoding the image
+            timings: if passed, the time spent in each part of the scan is added to it
+
+        Returns ScanResult for the image without timing
+    """
+    if settings.use_preview:
+        results, scale = read_qr_zbar_preview(image_path, settings.binarization, timings, settings.decoders)
+        qr = filter_qr_results(results, string_header)
+        if qr is not None:
+            return ScanResult(image_path, qr, scale, STAGE_PREVIEW)
+
+    if settings.prefilter:
+        with timed(timings, TIMING_PREFILTER):
+            candidate = has_qr_candidate(image_path)
+        if not candidate:
+            return ScanResult(image_path, None, stage=STAGE_PREFILTER)
+
+    min_reduction = 1
+    if settings.max_pixels:
+        min_reduction = reduction_for_budget(read_image_size(image_path), settings.max_pixels)
+
+    if settings.scales:
+        results, scale = read_qr_zbar_pyramid(image_path, settings.binarization, settings.scales, settings.reduced_load,
+                                              min_reduction, timings, settings.decoders)
+    elif settings.reduced_load:
+        results, scale = read_qr_zbar_reduced(image_path, settings.binarization, min_reduction, timings, settings.decoders)
+    elif settings.max_pixels:
+        # A grayscale load avoids holding the full colour image as well
+        im = load_grayscale_timed(image_path, min_reduction, timings)
+        results, scale = decode_qr_image(im, settings.binarization, timings, settings.decoders), 1 / min_reduction
+    else:
+        results, scale = read_qr_zbar(image_path, settings.binarization, timings, settings.decoders), 1.0
+    qr = filter_qr_results(results, string_header)
+    if qr is None:
+        return ScanResult(image_path, None)
+    return ScanResult(image_path, qr, scale, STAGE_IMAGE)
+
+def get_qr(image_path : str, string_header : str = '', binarization : bool = False, settings : ScanSettings = None) -> str:
+    """
+        Loads image and attempts to find a QR code
+    
+        Arguments:
+            image_path: string indicating path of photo to scan
+            string_header: optional string that indicates the header to look  for if one was use
+                if a header is passed only QR codes with this header will be returned
+            settings: optional scan settings. If passed binarization argument is ignored
+
+        Returns a string indicating content of found QR code. Returns None if nothing found.
+
+        Does not currently handle multiple QR codes. Will raise exception
+    """
+    if settings is None:
+        settings = ScanSettings(binarization=binarization)
+    return scan_image(image_path, string_header, settings).qr
+
 def get_qr_mt(image_path : str, string_header : str = '', binarization : bool = False) -> Tuple[str, str]:
     """
         Calls get_qr and returns image path and result of get_qr in a tuple to allow multiprocessing
@@ -67,53 +368,280 @@ def get_qr_mt(image_path : str, string_header : str = '', binarization : bool =
     """
     return image_path, get_qr(image_path, string_header, binarization)
 
-def get_qr_for_files(files : List[str], string_header : str = '', verbose : bool = False, binarization : bool = False) -> Dict[str, str]:
+def memory_budget_pixels(memory_budget : int, workers : int = None) -> int:
     '''
-        Process a list of files using multiprocessing. Will return dictionary of each images'
+        Splits a memory budget for decoding between workers, giving the largest image each worker may decode at
+        once for ScanSettings.max_pixels.
+
+        Arguments:
+            memory_budget: memory in bytes to allow for decoding images across all workers
+            workers: number of workers, defaults to the number of CPU cores
+
+        Returns:
+            largest number of pixels each worker may decode at once
+    '''
+    if workers is None:
+        workers = cpu_count()
+    return max(1, memory_budget // (workers * DECODE_BYTES_PER_PIXEL))
+
+def create_pool(backend : str = BACKEND_PROCESS, workers : int = None):
+    '''
+        Creates a worker pool for processing files. Process pools avoid the GIL entirely but pay for process
+        startup, module imports and pickling. OpenCV and zbar release the GIL while decoding, so a thread pool
+        is often as fast for small and medium batches and starts instantly.
+
+        Arguments:
+            backend: BACKEND_PROCESS or BACKEND_THREAD
+            workers: number of workers, defaults to the number of CPU cores
+
+        Returns:
+            multiprocessing Pool or ThreadPool
+    '''
+    if workers is None:
+        workers = cpu_count()
+    if backend == BACKEND_PROCESS:
+        return Pool(processes=workers)
+    elif backend == BACKEND_THREAD:
+        return ThreadPool(processes=workers)
+    raise ValueError(f'Unknown backend: {backend}. Expected one of {BACKENDS}')
+
+@contextmanager
+def use_pool(pool = None, backend : str = BACKEND_PROCESS, workers : int = None):
+    '''
+        Context manager which provides a worker pool. If an existing pool is passed it is used as is and left open
+        for the caller to reuse, otherwise a new pool is created and closed on exit.
+
+        Arguments:
+            pool: existing pool to use, if any
+            backend: type of pool to create if none passed, BACKEND_PROCESS or BACKEND_THREAD
+            workers: number of workers for a created pool, defaults to the number of CPU cores
+    '''
+    if pool is not None:
+        yield pool
+    else:
+        with create_pool(backend, workers) as new_pool:
+            yield new_pool
+
+def map_in_pool(pool, func, items : List, verbose : bool = False) -> List:
+    '''
+        Maps a function over items using a worker pool, showing a progress bar if verbose.
+
+        Arguments:
+            pool: worker pool
+            func: function to apply to each item
+            items: list of items
+            verbose: boolean indicating whether to show progress updates to terminal
+
+        Returns:
+            List of results in the same order as items
+    '''
+    if verbose:
+        return list(tqdm.tqdm(pool.imap(func, items), total=len(items)))
+    return pool.map(func, items)
+
+def scan_settings_key(string_header : str, settings : ScanSettings) -> str:
+    '''
+        Builds a string identifying the string header and scan settings, used to invalidate cached results
+        when either changes.
+
+        Arguments:
+            string_header: string header used in images if any
+            settings: settings used to load and decode the images
+
+        Returns:
+            JSON string of the header and settings
+    '''
+    return json.dumps({'string_header' : string_header, 'settings' : settings._asdict()}, sort_keys=True)
+
+def open_scan_cache(output_dir : str, string_header : str = '', settings : ScanSettings = ScanSettings(),
+                    use_hash : bool = False) -> ScanCache:
+    '''
+        Opens the scan result cache kept in an output directory.
+
+        Arguments:
+            output_dir: output directory of the sort, must exist
+            string_header: string header used in images if any
+            settings: settings used to load and decode the images
+            use_hash: also check a hash of each file's content before using a cached result
+
+        Returns:
+            ScanCache for the output directory
+    '''
+    return ScanCache(os.path.join(output_dir, CACHE_FILE_NAME), scan_settings_key(string_header, settings), use_hash)
+
+def open_scan_checkpoint(output_dir : str, string_header : str = '', settings : ScanSettings = ScanSettings(),
+                         resume : bool = False) -> ScanCheckpoint:
+    '''
+        Opens the checkpoint of scan results kept in an output directory while a sort runs.
+
+        Arguments:
+            output_dir: output directory of the sort, must exist
+            string_header: string header used in images if any
+            settings: settings used to load and decode the images
+            resume: keep the results of an earlier interrupted sort with the same string header and settings
+
+        Returns:
+            ScanCheckpoint for the output directory
+    '''
+    return ScanCheckpoint(os.path.join(output_dir, CHECKPOINT_FILE_NAME), scan_settings_key(string_header, settings), resume)
+
+def file_signature(path : str, inventory : FileInventory = None) -> Tuple[int, float]:
+    '''
+        Gets the size and modified time of a file, from the inventory if it contains the file.
+
+        Returns:
+            tuple of size and modified time
+    '''
+    if inventory is not None and path in inventory.entries:
+        entry = inventory.entries[path]
+        return entry.size, entry.mtime
+    file_stat = os.stat(path)
+    return file_stat.st_size, file_stat.st_mtime
+
+def iter_scan_files(files : List[str], string_header : str = '', settings : ScanSettings = ScanSettings(),
+                    backend : str = BACKEND_PROCESS, workers : int = None, pool = None, cache : ScanCache = None,
+                    inventory : FileInventory = None, checkpoint : ScanCheckpoint = None) -> Iterator[ScanResult]:
+    '''
+        Scans a list of files using a worker pool, yielding each result in the order of the files as soon as it
+        is available. This allows later stages to start on the first results while the rest are still scanning.
+
+        Arguments:
+            files: list of file paths as string
+            string_header: string header used in images if any
+            settings: settings to use for loading and decoding the images
+            backend: type of worker pool to use, BACKEND_PROCESS or BACKEND_THREAD
+            workers: number of workers, defaults to the number of CPU cores
+            pool: existing worker pool to reuse. If passed backend and workers are ignored
+            cache: scan result cache. Unchanged files with a cached result are not scanned again and new results
+                are added to the cache once all files are scanned. Must have been opened with the same string
+                header and settings
+            inventory: inventory of the files if already built, used for file sizes and modified times
+            checkpoint: scan checkpoint. Unchanged files with a checkpointed result are not scanned again and each
+                new result is added to the checkpoint as soon as it arrives
+
+        Returns:
+            Iterator of ScanResult in the same order as files
+    '''
+    check_scales(settings.scales)
+    cached_results = {}
+    to_scan = files
+    if cache is not None or checkpoint is not None:
+        signatures = {path : file_signature(path, inventory) for path in files}
+        to_scan = []
+        for path in files:
+            cached = checkpoint.get(path, *signatures[path]) if checkpoint is not None else None
+            if cached is None and cache is not None:
+                cached = cache.get(path, *signatures[path])
+            if cached is None:
+                to_scan.append(path)
+            else:
+                cached_results[path] = ScanResult(path, *cached)
+
+    func = partial(scan_image, string_header=string_header, settings=settings)
+    new_results = []
+    with use_pool(pool, backend, workers) as pool:
+        scanned = pool.imap(func, to_scan)
+        for path in files:
+            if path in cached_results:
+                yield cached_results[path]
+            else:
+                result = next(scanned)
+                new_results.append(result)
+                if checkpoint is not None:
+                    checkpoint.add(path, *signatures[path], result.qr, result.scale, result.stage, result.seconds)
+                yield result
+    if checkpoint is not None:
+        checkpoint.flush()
+
+    if cache is not None:
+        cache.put_many((item.path, *signatures[item.path], item.qr, item.scale, item.stage) for item in new_results)
+
+def scan_files(files : List[str], string_header : str = '', verbose : bool = False,
+               settings : ScanSettings = ScanSettings(), backend : str = BACKEND_PROCESS,
+               workers : int = None, pool = None, cache : ScanCache = None,
+               inventory : FileInventory = None, checkpoint : ScanCheckpoint = None) -> Dict[str, ScanResult]:
+    '''
+        Process a list of files using a worker pool. Will return dictionary of each images'
+        detailed scan result against it's filename as a key
+
+        Arguments:
+            files: list of file paths as string
+            string_header: string header used in images if any
+            verbose: boolean indicating whether to show progress updates to terminal
+            settings: settings to use for loading and decoding the images
+            backend: type of worker pool to use, BACKEND_PROCESS or BACKEND_THREAD
+            workers: number of workers, defaults to the number of CPU cores
+            pool: existing worker pool to reuse. If passed backend and workers are ignored
+            cache: scan result cache. Unchanged files with a cached result are not scanned again and new results
+                are added to the cache. Must have been opened with the same string header and settings
+            inventory: inventory of the files if already built, used for file sizes and modified times
+            checkpoint: scan checkpoint. Unchanged files with a checkpointed result are not scanned again and new
+                results are added to the checkpoint in batches as they arrive
+
+        Returns:
+            Dictionary of (str, ScanResult) where key is file path
+    '''
+    results = iter_scan_files(files, string_header, settings, backend, workers, pool, cache, inventory, checkpoint)
+    if verbose:
+        results = tqdm.tqdm(results, total=len(files))
+    return {item.path : item for item in results}
+
+def get_qr_for_files(files : List[str], string_header : str = '', verbose : bool = False, binarization : bool = False,
+                     settings : ScanSettings = None, backend : str = BACKEND_PROCESS, workers : int = None,
+                     pool = None) -> Dict[str, str]:
+    '''
+        Process a list of files using a worker pool. Will return dictionary of each images'
         result against it's filename as a key
 
         Arguments:
             files: list of file paths as string
             string_header: string header used in images if any
             verbose: boolean indicating whether to show progress updates to terminal
+            settings: optional scan settings. If passed binarization argument is ignored
+            backend: type of worker pool to use, BACKEND_PROCESS or BACKEND_THREAD
+            workers: number of workers, defaults to the number of CPU cores
+            pool: existing worker pool to reuse. If passed backend and workers are ignored
 
         Returns:
             Dictionary of (str, str) where key is file path and value is the result
     '''
-    cores = cpu_count()
-    func = partial(get_qr_mt, string_header=string_header, binarization=binarization)
-    with Pool(processes=cores) as pool:
-        if verbose:
-            results = list(tqdm.tqdm(pool.imap(func, files), total=len(files)))
-        else:
-            results = pool.map(func, files)
-    
-    results_dict = {}
-    for item in results:
-        results_dict[item[0]] = item[1]
+    if settings is None:
+        settings = ScanSettings(binarization=binarization)
+    results = scan_files(files, string_header, verbose, settings, backend, workers, pool)
+    return {path : result.qr for path, result in results.items()}
+
+def summarise_scales(results : Dict[str, ScanResult]) -> Dict[float, int]:
+    '''
+        Counts how many QR codes were found at each scale. Useful to tune the scales used for
+        pyramid decoding against a set of photos.
 
-    return results_dict
+        Arguments:
+            results: detailed scan results as returned by scan_files
 
-def sanitise_path(path : str) -> str:
+        Returns:
+            Dictionary of scale against number of QR codes found at that scale
+    '''
+    counts = {}
+    for result in results.values():
+        if result.qr is not None:
+            counts[result.scale] = counts.get(result.scale, 0) + 1
+    return counts
+
+def summarise_stages(results : Dict[str, ScanResult]) -> Dict[str, int]:
     '''
-        Function to remove invalid path characters from a path. Will prevent failure if user uses
-        characters such as question marks in image strings.
+        Counts the scan stage each image finished at. Prefilter rejections against codes found by later stages
+        can be used to tune the prefilter for false negatives.
 
         Arguments:
-            path: path to sanitise
+            results: detailed scan results as returned by scan_files
 
         Returns:
-            sanitised path
-    '''
-    drive_designator_pos = path.find(':\\') + 2
-    if drive_designator_pos > 0: #For windows with :\ in the tart of the path
-        windows_drive_designator = path[:drive_designator_pos]
-        remainder_path = path[drive_designator_pos:]
-    else: #If windows drive designator not present (e.g. on Linux or with relative pathing)
-        windows_drive_designator = ''
-        remainder_path = path
-    remainder_path = re.sub(r'[^\w\-_\. \\\/]', '_', remainder_path)
-    return windows_drive_designator + remainder_path
+            Dictionary of stage name against number of images finishing at that stage
+    '''
+    counts = {STAGE_PREFILTER : 0, STAGE_PREVIEW : 0, STAGE_IMAGE : 0, STAGE_NOT_FOUND : 0}
+    for result in results.values():
+        counts[result.stage] += 1
+    return counts
 
 def check_if_image(file_path : str) -> Tuple[bool, str]:
     '''
@@ -126,14 +654,13 @@ def check_if_image(file_path : str) -> Tuple[bool, str]:
         Returns:
             tuple of boolean and string indicating whether it is am image or not and the filepath of the associated check
     '''
-    try:
-        if imghdr.what(file_path):
-            return (True, file_path)
-    except:
-        return (False, file_path)
+    if get_image_type(file_path):
+        return (True, file_path)
     return (False, file_path)
 
-def remove_non_images(files : List[str], verbose : bool, non_image_dir : str) -> List[str]:
+def remove_non_images(files : List[str], verbose : bool, non_image_dir : str,
+                      backend : str = BACKEND_PROCESS, workers : int = None, pool = None,
+                      pooled_listing : bool = False) -> List[str]:
     '''
         Function to remove items from the file list if they are not images. Non images files will be
         copied to the non-image directory so it is clear to the user what has happened with them.
@@ -142,18 +669,22 @@ def remove_non_images(files : List[str], verbose : bool, non_image_dir : str) ->
             files: list of files to check for image-ness
             verbose: indicates whether to provide verbose output to the user
             non_image_dir: directory to copy non-image files to for use feedback
+            backend: type of worker pool to use, BACKEND_PROCESS or BACKEND_THREAD
+            workers: number of workers, defaults to the number of CPU cores
+            pool: existing worker pool to check files on. If passed backend and workers are ignored
+            pooled_listing: check files on a worker pool, which only helps where each file read has a high latency
+                such as on network storage. Otherwise files are checked in this process unless a pool is passed
 
         Returns:
             List of all files which are images
     '''
     if verbose:
         print("Checking for non-image files in the sorting directory. If any exist these will be saved to: " + non_image_dir)
-    cores = cpu_count()
-    with Pool(processes=cores) as pool:
-        if verbose:
-            results = list(tqdm.tqdm(pool.imap(check_if_image, files), total=len(files)))
-        else:
-            results = pool.map(check_if_image, files)
+    if pool is None and not pooled_listing:
+        results = [check_if_image(file_path) for file_path in (tqdm.tqdm(files) if verbose else files)]
+    else:
+        with use_pool(pool, backend, workers) as pool:
+            results = map_in_pool(pool, check_if_image, files, verbose)
 
     new_files = []
     for is_image, file_path in results:
@@ -168,7 +699,10 @@ def remove_non_images(files : List[str], verbose : bool, non_image_dir : str) ->
 
 
 
-def get_image_paths(input_dir : str,  non_image_dir : str, verbose : bool = False) -> List[str]:
+def get_image_paths(input_dir : str,  non_image_dir : str, verbose : bool = False,
+                    backend : str = BACKEND_PROCESS, workers : int = None, pool = None,
+                    recursive : bool = False, include : List[str] = None, exclude : List[str] = None,
+                    pooled_listing : bool = False) -> List[str]:
     """
         Gets all images in the provided input directory. Will exclude non-image files.
 
@@ -176,15 +710,27 @@ def get_image_paths(input_dir : str,  non_image_dir : str, verbose : bool = Fals
             input_dir: Path to input directory containing photos as a string
             non_image_dir: Path to copy non-image files to
             verbose: Boolean indicating whether to print status information to command line
+            backend: type of worker pool to use, BACKEND_PROCESS or BACKEND_THREAD
+            workers: number of workers, defaults to the number of CPU cores
+            pool: existing worker pool to reuse. If passed backend and workers are ignored
+            recursive: also find images in every sub directory of the input directory
+            include: if passed, only find files matching at least one of these glob patterns, e.g. "*.jpg"
+            exclude: skip files and directories matching any of these glob patterns
+            pooled_listing: read file headers on a worker pool, which only helps where each file read has a high
+                latency such as on network storage. Otherwise headers are read in this process unless a pool is passed
 
         Returns:
             List[str] of all iamge paths
     """
-    images = os.listdir(input_dir)
-    image_paths = [os.path.join(input_dir, x) for x in images]
-    
-    image_paths = remove_non_images(image_paths, verbose, non_image_dir)
-    return image_paths
+    if verbose:
+        print("Checking for non-image files in the sorting directory. If any exist these will be saved to: " + non_image_dir)
+    if pool is None and not pooled_listing:
+        inventory = build_inventory(input_dir, None, verbose, recursive, include, exclude, [non_image_dir])
+    else:
+        with use_pool(pool, backend, workers) as pool:
+            inventory = build_inventory(input_dir, pool, verbose, recursive, include, exclude, [non_image_dir])
+    copy_non_images(inventory, non_image_dir)
+    return inventory.image_paths()
 
 
 def sort_directory(input_dir : str,
@@ -192,7 +738,27 @@ def sort_directory(input_dir : str,
                    string_header : str = '', 
                    verbose : bool = False, 
                    binarization : bool = False, 
-                   order_by_date : bool = False) -> List[str]:
+                   order_by_date : bool = False,
+                   settings : ScanSettings = None,
+                   backend : str = BACKEND_PROCESS,
+                   workers : int = None,
+                   pool = None,
+                   use_cache : bool = False,
+                   cache_hash : bool = False,
+                   streaming : bool = False,
+                   copy_workers : int = 1,
+                   placement : str = PLACEMENT_COPY,
+                   plan_path : str = None,
+                   dry_run : bool = False,
+                   checkpoint : bool = False,
+                   resume : bool = False,
+                   recursive : bool = False,
+                   include : List[str] = None,
+                   exclude : List[str] = None,
+                   pooled_listing : bool = False,
+                   order_by_capture_time : bool = False,
+                   memory_budget : int = None,
+                   report_path : str = None) -> List[str]:
     """
         Takes all images in a directory and sorts them by QR codes found in the images. Any
         images which are found before the first QR code will go into an "unsorted" folder in the directory.
@@ -203,33 +769,277 @@ def sort_directory(input_dir : str,
             string_header: if a header is used in the QR codes to differentiate from other QR
                 codes in the images, QR codes will be checked to ensure that the strings start
                 with this substring
+            settings: optional scan settings. If passed binarization argument is ignored
+            backend: type of worker pool to use, BACKEND_PROCESS or BACKEND_THREAD
+            workers: number of workers, defaults to the number of CPU cores
+            pool: existing worker pool to reuse. If passed backend and workers are ignored
+            use_cache: keep scan results in a cache in the output directory and reuse them for unchanged images
+                on later runs with the same string header and settings
+            cache_hash: also check a hash of each image's content before using a cached result
+            streaming: start copying images in order as soon as their scan results arrive, instead of waiting for
+                every image to be scanned, so copying overlaps with scanning
+            copy_workers: number of files to copy concurrently
+            placement: how to place images in the output directory, one of file_placement.PLACEMENTS. Falls
+                back to copying where the placement is not possible
+            plan_path: if passed, write the sort plan to this JSON Lines or CSV manifest (CSV if the name ends
+                in .csv). The manifest can be applied later with sort_plan.apply_plan
+            dry_run: only plan the sort. No images or non-image files are placed in the output directory
+            checkpoint: record scan results in a checkpoint in the output directory as they arrive, so the sort can
+                be resumed if it is interrupted. The checkpoint is removed once the sort finishes
+            resume: resume an interrupted sort run with checkpoint, keeping checkpointed scan results and skipping
+                images already placed in the output directory. Implies checkpoint. Not supported when moving images
+            recursive: also sort images in every sub directory of the input directory, e.g. each DCIM folder of a
+                memory card. Images in sub directories are named with the sub directory, see file_inventory.flat_name
+            include: if passed, only sort files matching at least one of these glob patterns, e.g. "*.jpg"
+            exclude: skip files and directories matching any of these glob patterns
+            pooled_listing: read file headers on the worker pool when listing the input directory, which only helps
+                where each file read has a high latency such as on network storage
+            order_by_capture_time: order images by the EXIF capture time read from their headers instead of by file
+                name or modified time. Capture times are kept in the scan result cache if use_cache is set
+            memory_budget: memory in bytes to allow for decoding images across all workers. Sets max_pixels of the
+                settings from the number of workers (the number of CPU cores if a pool is passed without workers),
+                so large images are loaded at a reduced size rather than exceeding the budget
+            report_path: if passed, write a JSON report of the time spent in each stage of the sort, the scan time of
+                each image and the slowest images to this file, see run_report.build_run_report
 
         Returns:
             List[str] of all paths found in QR codes
     """
+    start = time.perf_counter()
+    timings = {}
+    copy_stats = CopyStats()
 
-    
+    if settings is None:
+        settings = ScanSettings(binarization=binarization)
+    if memory_budget is not None:
+        settings = settings._replace(max_pixels=memory_budget_pixels(memory_budget, workers))
+    if resume and placement == PLACEMENT_MOVE:
+        raise ValueError('Resuming a sort is not supported when moving images, as moved images are no longer in the input directory')
+    check_copy_workers(copy_workers) # Checked before scanning rather than when the first image is placed
 
-    non_image_dir = os.path.join(output_dir, 'non_image_files')
+    # One pool is shared by every stage so workers are only started once per sort
+    with use_pool(pool, backend, workers) as pool:
+        if verbose:
+            print('Checking for image files in the sorting directory')
+        inventory = build_inventory(input_dir, pool if pooled_listing else None, verbose, recursive, include, exclude,
+                                    [output_dir], timings)
 
-    image_paths = get_image_paths(input_dir, non_image_dir, verbose)
+        os.makedirs(output_dir, exist_ok=True)
+        cache = open_scan_cache(output_dir, string_header, settings, cache_hash) if use_cache else None
+        scan_checkpoint = open_scan_checkpoint(output_dir, string_header, settings, resume) if checkpoint or resume else None
 
-    if verbose:
-        print('Scanning images for QR codes')
-    results = get_qr_for_files(image_paths, string_header=string_header, verbose=verbose, binarization=binarization)
-    os.makedirs(output_dir, exist_ok=True)
+        try:
+            capture_times = None
+            if order_by_capture_time:
+                if verbose:
+                    print('Reading capture times')
+                with timed(timings, STAGE_CAPTURE_TIMES):
+                    capture_times = read_capture_times(inventory.image_paths(), pool, cache, inventory, verbose)
+
+            if streaming:
+                if verbose:
+                    print('Scanning and sorting images')
+                image_paths = order_image_paths(inventory.image_paths(), order_by_date, inventory, capture_times)
+                scan_results = {}
+                scanned = iter_scan_files(image_paths, string_header, settings, pool=pool, cache=cache, inventory=inventory,
+                                          checkpoint=scan_checkpoint)
+                with timed(timings, STAGE_SCAN_AND_SORT):
+                    found_directories = sort_scan_results(record_scan_results(scanned, scan_results), output_dir, verbose,
+                                                          len(image_paths), copy_workers, placement, plan_path, dry_run,
+                                                          copy_stats, skip_existing=resume, input_dir=input_dir)
+                if not dry_run:
+                    with timed(timings, STAGE_NON_IMAGES):
+                        copy_non_images(inventory, os.path.join(output_dir, 'non_image_files'))
+            else:
+                if verbose:
+                    print('Scanning images for QR codes')
+                with timed(timings, STAGE_SCAN):
+                    scan_results = scan_files(inventory.image_paths(), string_header=string_header, verbose=verbose,
+                                              settings=settings, pool=pool, cache=cache, inventory=inventory,
+                                              checkpoint=scan_checkpoint)
 
+            if verbose and (settings.prefilter or settings.use_preview):
+                print('Images per scan stage:')
+                for stage, count in summarise_stages(scan_results).items():
+                    print(f'{stage}: {count}')
+            if verbose and settings.scales:
+                print('QR codes found per scale:')
+                for scale, count in sorted(summarise_scales(scan_results).items()):
+                    print(f'{scale}: {count}')
 
-    found_directories = sort_directory_exisitng_results(results, input_dir, output_dir, verbose, order_by_date=order_by_date)
+            if not streaming:
+                if not dry_run:
+                    with timed(timings, STAGE_NON_IMAGES):
+                        copy_non_images(inventory, os.path.join(output_dir, 'non_image_files'))
+                image_paths = order_image_paths(inventory.image_paths(), order_by_date, inventory, capture_times)
+                if verbose:
+                    print('Sorting image files')
+                with timed(timings, STAGE_SORT):
+                    found_directories = sort_scan_results((scan_results[image_path] for image_path in image_paths), output_dir,
+                                                          verbose, len(image_paths), copy_workers, placement, plan_path,
+                                                          dry_run, copy_stats, skip_existing=resume, input_dir=input_dir)
+        finally:
+            if cache is not None:
+                cache.close()
+            if scan_checkpoint is not None:
+                scan_checkpoint.close()
+
+        # Only reached once every image is placed, an interrupted sort leaves the checkpoint to resume from
+        if scan_checkpoint is not None:
+            scan_checkpoint.remove()
+
+    if report_path:
+        report = build_run_report(timings, time.perf_counter() - start, scan_results.values(),
+                                  None if dry_run else copy_stats)
+        write_run_report(report, report_path)
+        if verbose:
+            print('Saved run report: ' + report_path)
 
     found_directories.sort()
     return found_directories
 
+def record_scan_results(results : Iterable[ScanResult], scan_results : Dict[str, ScanResult]) -> Iterator[ScanResult]:
+    """
+        Passes scan results through to the sorting stage while recording each one.
+
+        Parameters:
+            results: iterable of scan results
+            scan_results: dictionary to record each result in against its path
+
+        Returns:
+            Iterator of the same scan results
+    """
+    for result in results:
+        scan_results[result.path] = result
+        yield result
+
+def read_capture_times(image_paths : List[str], pool, cache : ScanCache = None, inventory : FileInventory = None,
+                       verbose : bool = False) -> Dict[str, Optional[float]]:
+    """
+        Reads the EXIF capture time of each image from the file headers using a worker pool. Capture times already
+        in the cache for unchanged images are reused and new ones are added to it.
+
+        Parameters:
+            image_paths: paths of images
+            pool: worker pool used to read the headers
+            cache: scan result cache, if any
+            inventory: inventory of the images if already built, used for file sizes and modified times
+            verbose: boolean indicating whether to show progress updates to terminal
+
+        Returns:
+            Dictionary of image path against capture time, see image_loader.read_capture_time
+    """
+    capture_times = {}
+    to_read = image_paths
+    if cache is not None:
+        signatures = {path : file_signature(path, inventory) for path in image_paths}
+        capture_times = cache.get_capture_times(signatures)
+        to_read = [path for path in image_paths if path not in capture_times]
+
+    new_times = map_in_pool(pool, read_capture_time, to_read, verbose)
+    capture_times.update(zip(to_read, new_times))
+
+    if cache is not None:
+        cache.put_capture_times((path, *signatures[path], capture_time) for path, capture_time in zip(to_read, new_times))
+    return capture_times
+
+def sequence_number(image_path : str) -> int:
+    """
+        Gets the sequence number cameras put at the end of file names, e.g. 1234 from IMG_1234.JPG. Returns -1
+        if the file name has no number.
+    """
+    match = re.search(r'(\d+)\D*$', os.path.splitext(os.path.basename(image_path))[0])
+    return int(match.group(1)) if match else -1
+
+def order_image_paths(image_paths : List[str], order_by_date : bool = False, inventory : FileInventory = None,
+                      capture_times : Dict[str, Optional[float]] = None) -> List[str]:
+    """
+        Orders image paths for sorting, either by file name, by modified time or by capture time.
+
+        Parameters:
+            image_paths: paths to order
+            order_by_date: order by modified time instead of file name
+            inventory: inventory of the input directory. If passed modified times are taken from it
+            capture_times: if passed, order by these EXIF capture times (see read_capture_times) instead. Images
+                taken in the same instant, e.g. by two cameras, are ordered by the sequence number in the file name
+                and then by path. Images without a capture time are ordered by their modified time
+
+        Returns:
+            List[str] of ordered image paths
+    """
+    if capture_times is not None:
+        get_mtime = inventory.mtime if inventory is not None else os.path.getmtime
+        def capture_key(image_path : str) -> Tuple[float, int, str]:
+            capture_time = capture_times.get(image_path)
+            if capture_time is None: # Capture times are in the camera's local time, so compare with local modified time
+                capture_time = (datetime.fromtimestamp(get_mtime(image_path)) - EPOCH).total_seconds()
+            return capture_time, sequence_number(image_path), image_path
+        return sorted(image_paths, key=capture_key)
+    if order_by_date:
+        return sorted(image_paths, key=inventory.mtime if inventory is not None else os.path.getmtime)
+    return sorted(image_paths)
+
+def sort_scan_results(ordered_results : Iterable[ScanResult],
+                      output_dir : str,
+                      verbose : bool = False,
+                      total : int = None,
+                      copy_workers : int = 1,
+                      placement : str = PLACEMENT_COPY,
+                      plan_path : str = None,
+                      dry_run : bool = False,
+                      stats : CopyStats = None,
+                      skip_existing : bool = False,
+                      input_dir : str = None) -> List[str]:
+    """
+        Plans where each image goes from its scan result and applies the plan, consuming results in order as
+        they arrive. Images before the first QR code are placed in the "unsorted" directory.
+
+        Parameters:
+            ordered_results: iterable of scan results in sorting order
+            output_dir: output directory to save images in
+            verbose: whether or not to write verbose output to the terminal
+            total: number of images for the progress bar, if known
+            copy_workers: number of files to copy concurrently
+            placement: how to place images in the output directory, one of file_placement.PLACEMENTS
+            plan_path: if passed, write the plan to this JSON Lines or CSV manifest as it is applied
+            dry_run: only plan the sort without placing any images
+            stats: optional CopyStats to record the number of files and bytes copied in
+            skip_existing: skip images already placed at their destination by an earlier interrupted sort
+            input_dir: input directory the images were found in, used to name images found in sub directories
+
+        Returns:
+            List[str] of all paths found in QR codes
+    """
+    plan = plan_sort(ordered_results, input_dir)
+    writer = PlanWriter(plan_path) if plan_path else None
+    try:
+        if writer is not None:
+            plan = writer.record(plan)
+        if dry_run:
+            return plan_directories(plan)
+        return apply_plan(plan, output_dir, verbose, total, copy_workers, stats, placement, skip_existing)
+    finally:
+        if writer is not None:
+            writer.close()
+
 def sort_directory_exisitng_results(results : Dict[str, str], 
                                     input_dir : str, 
                                     output_dir : str, 
                                     verbose : bool = False,
-                                    order_by_date : bool = False) -> List[str]:
+                                    order_by_date : bool = False,
+                                    backend : str = BACKEND_PROCESS,
+                                    workers : int = None,
+                                    pool = None,
+                                    inventory : FileInventory = None,
+                                    copy_workers : int = 1,
+                                    placement : str = PLACEMENT_COPY,
+                                    plan_path : str = None,
+                                    dry_run : bool = False,
+                                    recursive : bool = False,
+                                    include : List[str] = None,
+                                    exclude : List[str] = None,
+                                    pooled_listing : bool = False,
+                                    order_by_capture_time : bool = False) -> List[str]:
     """
         Takes results from the QR code scanning and uses that information to sort the images. Function separated from
         above for better integration with GUI code.
@@ -239,34 +1049,46 @@ def sort_directory_exisitng_results(results : Dict[str, str],
             input_dir: input directory containing photos as string
             output_dir: output directory to save images in
             verbose: whether or not to write verbose output to the terminal
+            backend: type of worker pool to use, BACKEND_PROCESS or BACKEND_THREAD
+            workers: number of workers, defaults to the number of CPU cores
+            pool: existing worker pool to reuse. If passed backend and workers are ignored
+            inventory: inventory of the input directory if already built. If not passed the input directory is
+                listed and checked again
+            copy_workers: number of files to copy concurrently
+            placement: how to place images in the output directory, one of file_placement.PLACEMENTS. Falls
+                back to copying where the placement is not possible
+            plan_path: if passed, write the sort plan to this JSON Lines or CSV manifest
+            dry_run: only plan the sort. No images or non-image files are placed in the output directory
+            recursive: if the inventory is not passed, also list every sub directory of the input directory
+            include: if the inventory is not passed, only list files matching at least one of these glob patterns
+            exclude: if the inventory is not passed, skip files and directories matching any of these glob patterns
+            pooled_listing: if the inventory is not passed, read file headers on a worker pool. Otherwise headers are
+                read in this process unless a pool is passed
+            order_by_capture_time: order images by the EXIF capture time read from their headers
 
         Returns:
             List[str] of all paths found in QR codes
     """
-    found_directories = []
     non_image_dir = os.path.join(output_dir, 'non_image_files')
-    image_paths = get_image_paths(input_dir, non_image_dir, verbose)
-
-    if order_by_date:
-        image_paths.sort(key=lambda path: os.path.getmtime(path))
-    else:
-        image_paths.sort()
+    if inventory is None:
+        if verbose:
+            print("Checking for non-image files in the sorting directory. If any exist these will be saved to: " + non_image_dir)
+        if pool is None and not pooled_listing:
+            inventory = build_inventory(input_dir, None, verbose, recursive, include, exclude, [output_dir])
+        else:
+            with use_pool(pool, backend, workers) as pool:
+                inventory = build_inventory(input_dir, pool, verbose, recursive, include, exclude, [output_dir])
+    if not dry_run:
+        copy_non_images(inventory, non_image_dir)
+    capture_times = None
+    if order_by_capture_time:
+        with use_pool(pool, backend, workers) as pool:
+            capture_times = read_capture_times(inventory.image_paths(), pool, inventory=inventory, verbose=verbose)
+    image_paths = order_image_paths(inventory.image_paths(), order_by_date, inventory, capture_times)
 
     if verbose:
         print('Sorting image files')
-    current_path = os.path.join(output_dir, 'unsorted')
-    for image_path in tqdm.tqdm(image_paths) if verbose else image_paths:
-        _, image = os.path.split(image_path)
-        qr_string = ''
-        if image_path in results:
-            qr_string = results[image_path]
-        if qr_string:
-            qr_string = sanitise_path(qr_string)
-            current_path = os.path.join(output_dir, qr_string)
-            if qr_string not in found_directories:
-                found_directories.append(qr_string)
-            
-        os.makedirs(current_path, exist_ok=True)
-        shutil.copyfile(image_path, os.path.join(current_path, image))
-    
-    return found_directories
+    # Plain results carry no scan details, so the stage and timing of each image are unknown
+    ordered_results = (ScanResult(image_path, results.get(image_path), stage=None) for image_path in image_paths)
+    return sort_scan_results(ordered_results, output_dir, verbose, len(image_paths), copy_workers, placement,
+                             plan_path, dry_run, input_dir=input_dir)
@@ -0,0 +1,60 @@
+from typing import Optional
+import hashlib
+import os
+import tempfile
+
+class QRCache:
+    """
+        Content-addressed on-disk cache of rendered QR code images. Each image is stored as a PNG file named by
+        a hash of the code content and the settings used to render it, so an image is reused for the same content
+        and settings and a change to either renders a new image. Files are never modified once written, so a
+        cache directory can be shared between runs and machines.
+
+        Arguments:
+            cache_dir: directory to keep the images in, created if it does not exist
+            settings_key: string identifying the settings used to render the images
+    """
+    def __init__(self, cache_dir : str, settings_key : str):
+        self.cache_dir = cache_dir
+        self.settings_key = settings_key
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, data : str) -> str:
+        """
+            Gets the path of the cached image for code content, sharded into sub directories by the first two
+            characters of the hash to keep directories small.
+        """
+        digest = hashlib.sha256((self.settings_key + '\0' + data).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + '.png')
+
+    def get(self, data : str) -> Optional[bytes]:
+        """
+            Looks up the cached image for code content.
+
+            Returns PNG bytes of the image if cached, otherwise None
+        """
+        try:
+            with open(self.path(data), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, data : str, png : bytes):
+        """
+            Stores the image for code content. The file is written under a temporary name and then renamed, so
+            an interrupted write never leaves a partial image in the cache.
+
+            Arguments:
+                data: content of the code
+                png: PNG bytes of the rendered code
+        """
+        path = self.path(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(png)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
@@ -0,0 +1,228 @@
+from pyzbar.pyzbar import decode, ZBarSymbol
+import cv2
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+import threading
+import time
+import tqdm
+from qrImageIndexer.image_loader import load_grayscale
+from qrImageIndexer.qr_prefilter import find_finder_patterns
+from qrImageIndexer.run_report import timed, TIMING_BINARIZATION, BINARIZATION_HITS
+
+DECODER_ZBAR = 'zbar'
+DECODER_ZBAR_OTSU = 'zbar_otsu'
+DECODER_ZBAR_ROI = 'zbar_roi'
+DECODER_OPENCV = 'opencv'
+
+ROI_SEARCH_SIZE = 640
+ROI_PADDING = 3 # Finder pattern widths to pad the region by, a code is at most about 3 patterns wide
+CALIBRATION_SAMPLE_SIZE = 50
+
+class DecodedCode(NamedTuple):
+    """
+        A decoded QR code, with the same data attribute as pyzbar results so results of any decoder can be
+        filtered the same way.
+
+        Attributes:
+            data: content of the code as bytes
+    """
+    data : bytes
+
+def to_grayscale(im):
+    return im if len(im.shape) == 2 else cv2.cvtColor(im, cv2.COLOR_BGR2GRAY)
+
+def decode_zbar(im) -> List:
+    '''
+        Decodes QR codes with pyzbar.
+    '''
+    return decode(im, symbols = [ZBarSymbol.QRCODE])
+
+def decode_zbar_otsu(im) -> List:
+    '''
+        Decodes QR codes with pyzbar from a copy of the image binarized with OpenCV's OTSU threshold finding.
+        Finds codes in unevenly lit or low contrast images which are missed in the image itself.
+    '''
+    thres, im_binarized = cv2.threshold(to_grayscale(im), 128, 255, cv2.THRESH_OTSU)
+    return decode(im_binarized, symbols = [ZBarSymbol.QRCODE])
+
+def decode_zbar_roi(im) -> List:
+    '''
+        Finds QR code finder patterns in a small copy of the image and decodes only the region around them with
+        pyzbar at full resolution. Much faster than decoding the whole image where a code only fills a small part
+        of a large photo. Images without any finder patterns are not decoded at all.
+    '''
+    im_gray = to_grayscale(im)
+    height, width = im_gray.shape
+    factor = min(1.0, ROI_SEARCH_SIZE / max(height, width))
+    im_small = cv2.resize(im_gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA) if factor < 1 else im_gray
+    patterns = find_finder_patterns(im_small)
+    if not patterns:
+        return []
+    padding = ROI_PADDING * max(max(w, h) for _, _, w, h in patterns)
+    left = max(0, int((min(x for x, _, _, _ in patterns) - padding) / factor))
+    top = max(0, int((min(y for _, y, _, _ in patterns) - padding) / factor))
+    right = min(width, int((max(x + w for x, _, w, _ in patterns) + padding) / factor))
+    bottom = min(height, int((max(y + h for _, y, _, h in patterns) + padding) / factor))
+    return decode(im_gray[top:bottom, left:right], symbols = [ZBarSymbol.QRCODE])
+
+opencv_detectors = threading.local() # QRCodeDetector is not safe to share between threads
+
+def decode_opencv(im) -> List[DecodedCode]:
+    '''
+        Decodes QR codes with OpenCV's QRCodeDetector. Does not need the ZBar library and copes with some
+        perspective distortion that pyzbar does not.
+    '''
+    detector = getattr(opencv_detectors, 'detector', None)
+    if detector is None:
+        detector = opencv_detectors.detector = cv2.QRCodeDetector()
+    found, texts, _, _ = detector.detectAndDecodeMulti(im)
+    if not found:
+        return []
+    return [DecodedCode(text.encode('utf-8')) for text in texts if text]
+
+# Decoders by name. Each takes an image as a BGR or grayscale numpy array and returns a list of results with
+# the code content as bytes in a data attribute. Other decoders can be added with register_decoder
+DECODERS : Dict[str, Callable[..., List]] = {
+    DECODER_ZBAR : decode_zbar,
+    DECODER_ZBAR_OTSU : decode_zbar_otsu,
+    DECODER_ZBAR_ROI : decode_zbar_roi,
+    DECODER_OPENCV : decode_opencv,
+}
+
+# Names the time of each decoder is reported under, so a cascade reports like the default scan
+DECODER_TIMINGS = {DECODER_ZBAR_OTSU : TIMING_BINARIZATION}
+
+def register_decoder(name : str, decoder : Callable[..., List]):
+    '''
+        Adds a decoder which can then be used in a cascade by name. With a process pool the decoder must be
+        registered when a module imported by the workers is imported, not only in the main process.
+
+        Arguments:
+            name: name of the decoder
+            decoder: function taking an image as numpy array and returning a list of results with a data attribute
+    '''
+    DECODERS[name] = decoder
+
+def check_decoders(decoders : Tuple[str, ...]):
+    '''
+        Raises ValueError if any decoder in a cascade is not known.
+    '''
+    unknown = [name for name in decoders if name not in DECODERS]
+    if unknown:
+        raise ValueError(f'Unknown decoders: {unknown}. Expected any of {list(DECODERS)}')
+
+def decode_cascade(im, decoders : Tuple[str, ...], timings : Dict[str, float] = None) -> List:
+    '''
+        Tries each decoder of a cascade on an image in order, stopping at the first which finds a code.
+
+        Arguments:
+            im: image as numpy array, either BGR or grayscale
+            decoders: names of the decoders to try, from DECODERS
+            timings: if passed, the time spent in each decoder is added to it under the decoder name
+
+        Returns:
+            results of the first decoder which found a code, empty list if none did
+    '''
+    for name in decoders:
+        timing_name = DECODER_TIMINGS.get(name, name)
+        with timed(timings, timing_name):
+            results = DECODERS[name](im)
+        if results:
+            if timing_name == TIMING_BINARIZATION and timings is not None:
+                timings[BINARIZATION_HITS] = timings.get(BINARIZATION_HITS, 0) + 1
+            return results
+    return []
+
+class DecoderMeasurement(NamedTuple):
+    """
+        Speed and recall of a decoder measured on a sample of images.
+
+        Attributes:
+            decoder: name of the decoder
+            seconds: mean time to decode an image
+            found: number of images the decoder found a valid code in
+            recall: fraction of the images in which any decoder found a code that this decoder found a code in
+    """
+    decoder : str
+    seconds : float
+    found : int
+    recall : Optional[float]
+
+def has_valid_code(results : List, string_header : str = '') -> bool:
+    return any(result.data.decode('utf-8', 'replace').startswith(string_header) for result in results)
+
+def choose_cascade(hits : Dict[str, Set[int]], seconds : Dict[str, float]) -> Tuple[str, ...]:
+    '''
+        Orders decoders into a cascade from their measured speed and the images each found codes in. Greedily
+        picks the decoder finding the most codes not yet found per second of decoding, until every code found by
+        any decoder is covered. Decoders which add no codes are left out.
+
+        Arguments:
+            hits: decoder name against the indices of the sample images it found a code in
+            seconds: decoder name against its mean time to decode an image
+
+        Returns:
+            decoder names in the order to try them. The fastest decoder alone if no decoder found any code
+    '''
+    remaining = set().union(*hits.values())
+    if not remaining:
+        return (min(seconds, key=seconds.get),)
+    cascade = []
+    candidates = set(hits)
+    while remaining and candidates:
+        best = max(sorted(candidates), key=lambda name: len(hits[name] & remaining) / max(seconds[name], 1e-9))
+        if not hits[best] & remaining:
+            break
+        cascade.append(best)
+        remaining -= hits[best]
+        candidates.remove(best)
+    return tuple(cascade)
+
+def sample_paths(image_paths : List[str], sample_size : int) -> List[str]:
+    '''
+        Picks up to sample_size paths spread evenly through the sorted paths, so the sample covers a whole shoot.
+    '''
+    image_paths = sorted(image_paths)
+    if len(image_paths) <= sample_size:
+        return image_paths
+    return [image_paths[i * len(image_paths) // sample_size] for i in range(sample_size)]
+
+def calibrate_decoders(image_paths : List[str], string_header : str = '', sample_size : int = CALIBRATION_SAMPLE_SIZE,
+                       decoders : Tuple[str, ...] = None, verbose : bool = False) -> Tuple[Tuple[str, ...], List[DecoderMeasurement]]:
+    '''
+        Measures the speed and recall of each decoder on a sample of images and picks the cascade to use for
+        them. Every decoder is run on every sampled image in this process, so the timings are not affected by
+        other work.
+
+        Arguments:
+            image_paths: paths of images to sample from
+            string_header: header valid QR codes start with, other codes are not counted
+            sample_size: number of images to measure
+            decoders: names of the decoders to measure, defaults to every decoder in DECODERS
+            verbose: print progress to the terminal
+
+        Returns:
+            tuple of the chosen cascade and a DecoderMeasurement for each decoder
+    '''
+    decoders = tuple(decoders or DECODERS)
+    check_decoders(decoders)
+    hits = {name : set() for name in decoders}
+    total_seconds = {name : 0.0 for name in decoders}
+    images = 0
+    sample = sample_paths(image_paths, sample_size)
+    for index, path in enumerate(tqdm.tqdm(sample) if verbose else sample):
+        im = load_grayscale(path)
+        if im is None:
+            continue
+        images += 1
+        for name in decoders:
+            start = time.perf_counter()
+            results = DECODERS[name](im)
+            total_seconds[name] += time.perf_counter() - start
+            if has_valid_code(results, string_header):
+                hits[name].add(index)
+
+    seconds = {name : total_seconds[name] / images if images else 0.0 for name in decoders}
+    positives = len(set().union(*hits.values()))
+    measurements = [DecoderMeasurement(name, seconds[name], len(hits[name]),
+                                       len(hits[name]) / positives if positives else None) for name in decoders]
+    return choose_cascade(hits, seconds), measurements
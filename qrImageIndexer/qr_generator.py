@@ -3,24 +3,146 @@ from io import TextIOWrapper
 from turtle import fillcolor
 import qrcode
 from PIL import Image
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 from os import path
 from csv import reader
+from itertools import chain
+from multiprocessing import Pool, cpu_count
+import io
+import json
+from qrImageIndexer.qr_cache import QRCache
+
+QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_H
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+PARALLEL_MIN_CODES = 256 # Below this starting worker processes costs more than it saves
+
+class QRMatrix(NamedTuple):
+    """
+        Modules of a QR code, for drawing the code as vector shapes instead of an image.
 
-def build_qr(data : str) -> Image.Image:
+        Attributes:
+            modules: rows of modules from the top, including the border, each a tuple of True for dark modules
+    """
+    modules : Tuple[Tuple[bool, ...], ...]
+
+def make_qr(data : str) -> qrcode.QRCode:
     """
     Build a QR code with selected settings. Will use maximum error correction;
     this should reduce risk of errors when taking photos which may be blurry or
     have other issues.
     """
     qr = qrcode.QRCode(version=None,
-                        error_correction=qrcode.constants.ERROR_CORRECT_H,
-                        box_size=10,
-                        border = 4)
+                        error_correction=QR_ERROR_CORRECTION,
+                        box_size=QR_BOX_SIZE,
+                        border = QR_BORDER)
 
     qr.add_data(data)
     qr.make(fit=True)
-    return qr.make_image(fill_color='black', back_color='white')
+    return qr
+
+def build_qr(data : str) -> Image.Image:
+    """
+        Builds a QR code with make_qr and renders it as an image.
+    """
+    return make_qr(data).make_image(fill_color='black', back_color='white')
+
+def build_qr_matrix(data : str) -> QRMatrix:
+    """
+        Builds a QR code with make_qr and returns its modules without rendering an image.
+    """
+    return QRMatrix(tuple(tuple(row) for row in make_qr(data).get_matrix()))
+
+def build_qr_png(data : str) -> bytes:
+    """
+        Builds a QR code with build_qr and returns it as PNG bytes, which are cheaper to pass between processes
+        and store than the image itself.
+    """
+    f = io.BytesIO()
+    build_qr(data).save(f)
+    return f.getvalue()
+
+def load_qr_png(png : bytes) -> Image.Image:
+    """
+        Loads a QR code image from PNG bytes as written by build_qr_png.
+    """
+    image = Image.open(io.BytesIO(png))
+    image.load()
+    return image
+
+def qr_settings_key() -> str:
+    """
+        Builds a string identifying the settings QR codes are rendered with, used to key cached images.
+    """
+    return json.dumps({'error_correction' : QR_ERROR_CORRECTION, 'box_size' : QR_BOX_SIZE, 'border' : QR_BORDER,
+                       'fill_color' : 'black', 'back_color' : 'white'}, sort_keys=True)
+
+def map_codes(function : Callable, qr_strings : List[str], workers : int = None, pool = None) -> List:
+    """
+        Calls function on each string, in parallel on a process pool for large numbers of strings.
+
+        Parameters:
+            function: function taking a string, must be picklable to run on a process pool
+            qr_strings: strings to call function on
+            workers: number of worker processes, defaults to the number of CPU cores
+            pool: existing process pool to use. If passed, the strings are always mapped in parallel
+
+        Returns:
+            List of the results in the order of qr_strings
+    """
+    if pool is not None:
+        return pool.map(function, qr_strings)
+    if len(qr_strings) < PARALLEL_MIN_CODES:
+        return [function(qr_string) for qr_string in qr_strings]
+    workers = workers or cpu_count()
+    with Pool(workers) as pool:
+        return pool.map(function, qr_strings, chunksize=max(1, len(qr_strings) // (workers * 4)))
+
+def build_qr_images(qr_strings : List[str], workers : int = None, pool = None, cache_dir : str = None) -> Dict[str, Image.Image]:
+    """
+        Builds a QR code image for each string. Large numbers of codes are built in parallel on a process pool,
+        as the version search and rendering of each code run in Python.
+
+        Parameters:
+            qr_strings: strings to build codes for. Each distinct string is only built once
+            workers: number of worker processes, defaults to the number of CPU cores
+            pool: existing process pool to build codes on. If passed, codes are always built in parallel
+            cache_dir: if passed, keep images in this directory and reuse them for the same string and QR settings,
+                so only new or changed codes are built, see qr_cache.QRCache
+
+        Returns:
+            Dictionary of string against its QR code image
+    """
+    cache = QRCache(cache_dir, qr_settings_key()) if cache_dir else None
+    images = {}
+    to_build = []
+    for qr_string in dict.fromkeys(qr_strings):
+        png = cache.get(qr_string) if cache is not None else None
+        if png is None:
+            to_build.append(qr_string)
+        else:
+            images[qr_string] = load_qr_png(png)
+
+    if pool is None and len(to_build) < PARALLEL_MIN_CODES and cache is None:
+        images.update((qr_string, build_qr(qr_string)) for qr_string in to_build)
+        return images
+
+    pngs = map_codes(build_qr_png, to_build, workers, pool)
+    for qr_string, png in zip(to_build, pngs):
+        images[qr_string] = load_qr_png(png)
+        if cache is not None:
+            cache.put(qr_string, png)
+    return images
+
+def build_qr_matrices(qr_strings : List[str], workers : int = None, pool = None) -> Dict[str, QRMatrix]:
+    """
+        Builds the modules of a QR code for each string, in parallel for large numbers of codes like build_qr_images.
+
+        Returns:
+            Dictionary of string against its QRMatrix
+    """
+    qr_strings = list(dict.fromkeys(qr_strings))
+    return dict(zip(qr_strings, map_codes(build_qr_matrix, qr_strings, workers, pool)))
 
 def load_text_file(path : str) -> List[List[str]]:
     """
@@ -41,42 +163,82 @@ def load_text_file(path : str) -> List[List[str]]:
     return output_data_structure
 
 def load_lines(input_lines) -> List[List[str]]:
-    lines = []
-    output_data_structure = []
-    for row in input_lines:
-        lines.append(row.replace('    ', '\t'))
-    csv = reader(lines , delimiter='\t')
-    for row in csv:
-        output_data_structure.append(row)
-    return output_data_structure
+    return list(iter_rows(input_lines))
+
+def iter_rows(input_lines : Iterable[str]) -> Iterator[List[str]]:
+    """
+        Splits lines of an indented text file into rows of cells at each tab, converting sets of 4 spaces to a
+        tab. Lines are read one at a time as the rows are used, so any iterable of lines, e.g. an open file, can
+        be parsed without loading it all.
+
+        Parameters:
+            input_lines: lines of the file
+
+        Returns:
+            Iterator of the cells of each line
+    """
+    return reader((row.replace('    ', '\t') for row in input_lines), delimiter='\t')
 
-def generate_qr_code_structure(data_structure : Dict[str, Tuple[Dict, str]]) -> Dict[str, Tuple[Dict, Image.Image]]:
+def collect_qr_strings(data_structure : Dict[str, Tuple[Dict, str]], qr_strings : List[str] = None) -> List[str]:
     '''
-        Converts a dictionary containing the QR code string into a dictionary with an Image in place of the string
+        Lists the QR code string of every node in a data structure which needs a code.
 
         Parameters:
-            data_structure: Data structure in format of dictionary with tuple containing a like dictionary and a string
-            where the string is the data to be embedded in the QR code. If no QR code required string to be None
+            data_structure: Data structure as returned by unpack_data
+            qr_strings: For recursive calls. List the strings are added to
 
         Returns:
-            Similar structure to input but with string replaced by an PIL image
+            List of QR code strings
+    '''
+    if qr_strings is None:
+        qr_strings = []
+    for key in data_structure:
+        if data_structure[key][1]:
+            qr_strings.append(data_structure[key][1])
+        collect_qr_strings(data_structure[key][0], qr_strings)
+    return qr_strings
+
+def replace_qr_strings(data_structure : Dict[str, Tuple[Dict, str]], images : Dict[str, Union[Image.Image, QRMatrix]]) -> Dict[str, Tuple[Dict, Union[Image.Image, QRMatrix]]]:
+    '''
+        Copies a data structure replacing each QR code string with its image or QRMatrix.
     '''
     result = {}
     for key in data_structure:
         image = None
         if data_structure[key][1]:
-            image = build_qr(data_structure[key][1])
-        sub_struct = generate_qr_code_structure(data_structure[key][0])
-        result[key] = (sub_struct, image)
+            image = images[data_structure[key][1]]
+        result[key] = (replace_qr_strings(data_structure[key][0], images), image)
     return result
 
-def unpack_data(data : List[List[str]], gen_qr_headings : bool, string_header : str = '') -> Dict[str, Tuple[Dict, str]]:
+def generate_qr_code_structure(data_structure : Dict[str, Tuple[Dict, str]], workers : int = None, pool = None,
+                               cache_dir : str = None, vector : bool = False) -> Dict[str, Tuple[Dict, Union[Image.Image, QRMatrix]]]:
+    '''
+        Converts a dictionary containing the QR code string into a dictionary with an Image in place of the string
+
+        Parameters:
+            data_structure: Data structure in format of dictionary with tuple containing a like dictionary and a string
+            where the string is the data to be embedded in the QR code. If no QR code required string to be None
+            workers: number of worker processes used to build codes for large structures, see build_qr_images
+            pool: existing process pool to build codes on
+            cache_dir: if passed, reuse code images cached in this directory and add new ones to it
+            vector: build a QRMatrix for each code instead of an image, so the PDF can draw it as vector shapes.
+            Building the modules is cheap, so cache_dir is not used
+
+        Returns:
+            Similar structure to input but with string replaced by an PIL image, or a QRMatrix if vector is set
+    '''
+    if vector:
+        return replace_qr_strings(data_structure, build_qr_matrices(collect_qr_strings(data_structure), workers, pool))
+    images = build_qr_images(collect_qr_strings(data_structure), workers, pool, cache_dir)
+    return replace_qr_strings(data_structure, images)
+
+def unpack_data(data : Iterable[List[str]], gen_qr_headings : bool, string_header : str = '') -> Dict[str, Tuple[Dict, str]]:
     """
-    Function to unpack tabulated text where items are grouped by tab depth. Calls the recursive function to remove the
-    complexity from view of potential users.
+    Function to unpack tabulated text where items are grouped by tab depth. Rows are read one at a time, so any
+    iterable of rows such as iter_rows of an open file can be unpacked without loading it all.
     
     Inputs:
-        data - List of string representing data
+        data - Rows of the file, e.g. as returned by load_lines or iter_rows
         gen_qr_headings - Boolean indicating if QR codes are to be built for headings or just for final elements
         string_header - String to include as header for all QR code values to help distinguish from general QR codes
 
@@ -85,14 +247,81 @@ def unpack_data(data : List[List[str]], gen_qr_headings : bool, string_header :
         index - Data structure in dictionary as required by the remainder of the tool
 
     """
-    _, data_structure = unpack_data_recurse(data, gen_qr_headings, string_header=string_header)
+    data_structure = {}
+    for _ in iter_index_entries(data, gen_qr_headings, string_header, data_structure):
+        pass
     return data_structure
 
+def parse_index(input_lines : Iterable[str], gen_qr_headings : bool, string_header : str = '') -> Dict[str, Tuple[Dict, str]]:
+    """
+        Unpacks the lines of an indented text file, e.g. an open file, in a single pass without holding the lines.
+        Equivalent to unpack_data(load_lines(input_lines), ...).
+    """
+    return unpack_data(iter_rows(input_lines), gen_qr_headings, string_header)
+
+def iter_index_entries(data : Iterable[List[str]], gen_qr_headings : bool, string_header : str = '',
+                       data_structure : Dict[str, Tuple[Dict, str]] = None) -> Iterator[Tuple[Tuple[str, ...], Optional[str]]]:
+    """
+    Unpacks tabulated text where items are grouped by tab depth in a single pass, keeping a stack of the levels
+    above the current row instead of recursing, so deep files are not limited by recursion. Builds the same data
+    structure as unpack_data_recurse, merging repeated headings at the same level into the first.
+
+    Inputs:
+        data - Rows of the file, read one at a time
+        gen_qr_headings - Boolean indicating if QR codes are to be built for headings or just for final elements
+        string_header - String to include as header for all QR code values to help distinguish from general QR codes
+        data_structure - if passed, dictionary the data structure is built in as the entries are yielded
+
+    Returns:
+        Iterator of a tuple for each entry in file order, of the headings from the top level down to the entry
+        (ending with the entry itself) and the QR code string of the entry, None if no QR code required. Repeated
+        headings merged into an earlier entry are not yielded again
+    """
+    if data_structure is None:
+        data_structure = {}
+    rows = iter(data)
+    row = next(rows, None)
+    if row is None:
+        return
+    indent = count_leading_indent(row)
+    # Each level is a tuple of its indent, dictionary, headings and QR string of the path to it
+    stack = [(indent, data_structure, (), '')]
+    for next_row in chain(rows, (None,)): # Each row is handled with the next, None after the last row
+        next_indent = None if next_row is None else count_leading_indent(next_row)
+        # Skip blank lines, but still compare against them below as unpack_data_recurse does
+        if row == []:
+            row, indent = next_row, next_indent
+            continue
+        # Return to the level this row is at. Rows less indented than the first row end the file
+        while indent < stack[-1][0]:
+            stack.pop()
+            if not stack:
+                return
+
+        target_indent, level_structure, headings, previous_levels = stack[-1]
+        raw_line = row[target_indent]
+        next_level_str = previous_levels + raw_line + path.sep
+        indent_diff = 0 if next_row is None else target_indent - next_indent
+
+        if raw_line in level_structure:
+            next_data_struct = level_structure[raw_line][0]
+        else:
+            next_data_struct = {}
+            image_str = None
+            if gen_qr_headings or indent_diff >= 0:
+                image_str = string_header + next_level_str
+            level_structure[raw_line] = (next_data_struct, image_str)
+            yield headings + (raw_line,), image_str
+
+        if indent_diff < 0:
+            stack.append((next_indent, next_data_struct, headings + (raw_line,), next_level_str))
+        row, indent = next_row, next_indent
+
 def unpack_data_recurse(data : List[List[str]], gen_qr_headings : bool, data_structure : Dict[str, Tuple[Dict, str]] = None, string_header : str = '',
     index : int = 0, previous_levels : str = '') -> Tuple[int, Dict[str, Tuple[Dict, str]]]:
     """
     Function to unpack a tabulated text where items are grouped by tab depth. Called recursively for each loweer level of
-    the data structure.
+    the data structure. unpack_data uses the equivalent iter_index_entries, which is not limited by recursion depth.
 
     Inputs:
         data - List of string representing data
@@ -0,0 +1,74 @@
+import cv2
+from typing import List, Tuple
+from qrImageIndexer.image_loader import load_thumbnail
+
+PREFILTER_SIZE = 640
+PREFILTER_MIN_PATTERNS = 1
+MIN_PATTERN_AREA = 16
+
+def find_finder_patterns(im) -> List[Tuple[int, int, int, int]]:
+    '''
+        Finds shapes in a grayscale image which look like QR code finder patterns: a dark square containing
+        a light square containing a smaller dark square. This is far cheaper than decoding and can be used to
+        rule out images which can not contain a QR code, or to find where in an image a code may be.
+
+        Arguments:
+            im: grayscale image as numpy array
+
+        Returns:
+            List of bounding rectangles (x, y, width, height) of candidate finder patterns
+    '''
+    block_size = max(3, (max(im.shape) // 20) | 1)
+    im_binarized = cv2.adaptiveThreshold(im, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, block_size, 10)
+    contours, hierarchy = cv2.findContours(im_binarized, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    if hierarchy is None:
+        return []
+    hierarchy = hierarchy[0]
+
+    patterns = []
+    for i, contour in enumerate(contours):
+        # Hierarchy entries are [next, previous, first child, parent]
+        hole = hierarchy[i][2]
+        if hole < 0 or hierarchy[hole][2] < 0:
+            continue
+        area = cv2.contourArea(contour)
+        if area < MIN_PATTERN_AREA:
+            continue
+        x, y, width, height = cv2.boundingRect(contour)
+        if not 0.5 < width / height < 2:
+            continue
+        # Centre of a finder pattern is 3x3 modules of the 7x7 outer square
+        centre_ratio = cv2.contourArea(contours[hierarchy[hole][2]]) / area
+        if 0.05 < centre_ratio < 0.5:
+            patterns.append((x, y, width, height))
+    return patterns
+
+def count_finder_patterns(im) -> int:
+    '''
+        Counts candidate QR code finder patterns in a grayscale image, see find_finder_patterns.
+
+        Arguments:
+            im: grayscale image as numpy array
+
+        Returns:
+            Number of candidate finder patterns found
+    '''
+    return len(find_finder_patterns(im))
+
+def has_qr_candidate(image_path : str, size : int = PREFILTER_SIZE, min_patterns : int = PREFILTER_MIN_PATTERNS) -> bool:
+    '''
+        Checks a small thumbnail of an image for QR code finder patterns to decide whether the image is worth
+        a full decode.
+
+        Arguments:
+            image_path: path to image to check
+            size: length in pixels of the long edge of the thumbnail to check
+            min_patterns: number of finder patterns required to pass. Lower values reduce false negatives
+
+        Returns:
+            True if the image may contain a QR code. Images which can't be loaded are passed on for the full decode
+    '''
+    im = load_thumbnail(image_path, size)
+    if im is None:
+        return True
+    return count_finder_patterns(im) >= min_patterns
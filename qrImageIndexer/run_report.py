@@ -0,0 +1,150 @@
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+import json
+import time
+
+REPORT_PERCENTILES = (50, 90, 95, 99)
+SLOWEST_FILES = 10
+
+# Parts of scanning a single image, timed in the worker
+TIMING_PREVIEW = 'preview'
+TIMING_PREFILTER = 'prefilter'
+TIMING_LOAD = 'load'
+TIMING_RESIZE = 'resize'
+TIMING_ZBAR = 'zbar'
+TIMING_BINARIZATION = 'binarization'
+# Number of binarization retries which found a code, kept with the timings of each image
+BINARIZATION_HITS = 'binarization_hits'
+
+# Stages of a run, timed in the parent process
+STAGE_LISTING = 'listing'
+STAGE_TYPE_CHECK = 'type_check'
+STAGE_CAPTURE_TIMES = 'capture_times'
+STAGE_SCAN = 'scan'
+STAGE_SORT = 'sort'
+STAGE_SCAN_AND_SORT = 'scan_and_sort'
+STAGE_NON_IMAGES = 'non_images'
+STAGE_PARSE = 'parse'
+STAGE_QR_GENERATION = 'qr_generation'
+STAGE_PDF_BUILD = 'pdf_build'
+STAGE_PDF_WRITE = 'pdf_write'
+
+@contextmanager
+def timed(timings : Optional[Dict[str, float]], name : str):
+    '''
+        Context manager which adds the time taken by its body to a dictionary of timings. Does nothing if timings
+        is None, so timing can be threaded through functions as an optional argument.
+
+        Arguments:
+            timings: dictionary of name against total seconds, updated in place
+            name: name to add the time to
+    '''
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+def percentile(ordered : List[float], percent : float) -> Optional[float]:
+    '''
+        Finds a percentile of sorted values, interpolating between the nearest two.
+
+        Arguments:
+            ordered: values in ascending order
+            percent: percentile between 0 and 100
+
+        Returns:
+            value at the percentile, None if there are no values
+    '''
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarise_seconds(seconds : List[float]) -> Dict[str, Optional[float]]:
+    '''
+        Summarises a list of durations with their mean, maximum and REPORT_PERCENTILES.
+
+        Returns:
+            Dictionary of statistic name (e.g. "p95") against seconds
+    '''
+    ordered = sorted(seconds)
+    summary = {'mean' : sum(ordered) / len(ordered) if ordered else None}
+    for percent in REPORT_PERCENTILES:
+        summary[f'p{percent}'] = percentile(ordered, percent)
+    summary['max'] = ordered[-1] if ordered else None
+    return summary
+
+def build_run_report(stage_timings : Dict[str, float], seconds : float, scan_results : Iterable = (),
+                     copy_stats = None, slowest : int = SLOWEST_FILES) -> Dict:
+    '''
+        Builds a report of where time went in a run, from the stages timed in the parent process and the
+        per-image timings collected by the workers.
+
+        Arguments:
+            stage_timings: seconds spent in each stage of the run (STAGE_*)
+            seconds: wall time of the whole run
+            scan_results: ScanResult of each image. Images without timings (e.g. cached results) are counted but
+                not included in the image statistics
+            copy_stats: file_placement.CopyStats of placing the images, if any
+            slowest: number of slowest images to list
+
+        Returns:
+            Dictionary of the report, which can be saved with write_run_report
+    '''
+    scan_results = list(scan_results)
+    scanned = [result for result in scan_results if result.seconds is not None]
+    scan_timings = {}
+    binarization_attempts = binarization_hits = 0
+    for result in scanned:
+        timings = result.timings or {}
+        for name, value in timings.items():
+            if name != BINARIZATION_HITS:
+                scan_timings[name] = scan_timings.get(name, 0.0) + value
+        if TIMING_BINARIZATION in timings:
+            binarization_attempts += 1
+        if timings.get(BINARIZATION_HITS):
+            binarization_hits += 1
+
+    report = {
+        'seconds' : seconds,
+        'images' : len(scan_results),
+        'images_scanned' : len(scanned),
+        'codes_found' : sum(1 for result in scan_results if result.qr is not None),
+        'images_per_second' : len(scan_results) / seconds if seconds else None,
+        'stages' : dict(stage_timings),
+        'scan_stages' : scan_timings,
+        'image_seconds' : summarise_seconds([result.seconds for result in scanned]),
+        'fallback' : {
+            'binarization_attempts' : binarization_attempts,
+            'binarization_hits' : binarization_hits,
+            'binarization_hit_rate' : binarization_hits / binarization_attempts if binarization_attempts else None,
+        },
+        'slowest' : [{'path' : result.path, 'seconds' : result.seconds, 'stage' : result.stage, 'timings' : result.timings}
+                     for result in sorted(scanned, key=lambda result: result.seconds, reverse=True)[:slowest]],
+    }
+    if copy_stats is not None:
+        report['placement'] = {
+            'files' : copy_stats.files,
+            'bytes' : copy_stats.bytes,
+            'seconds' : copy_stats.seconds,
+            'mb_per_second' : copy_stats.mb_per_second,
+            'files_per_second' : copy_stats.files_per_second,
+        }
+    return report
+
+def write_run_report(report : Dict, report_path : str):
+    '''
+        Saves a run report as JSON.
+
+        Arguments:
+            report: report as built by build_run_report
+            report_path: path of the JSON file to write
+    '''
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,119 @@
+from typing import Dict, Iterable, Optional, Tuple
+import hashlib
+import os
+import sqlite3
+
+CACHE_FILE_NAME = '.qr_scan_cache.sqlite'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_hash(file_path : str) -> str:
+    '''
+        Hashes the content of a file
+
+        Arguments:
+            file_path: path to file
+
+        Returns:
+            hex digest of the file content
+    '''
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ScanCache:
+    """
+        On-disk cache of scan results in a SQLite database, keyed by file path, size and modified time and
+        optionally a hash of the file content. The settings used to scan are stored with the cache and if they
+        change every cached scan result is discarded. The capture time of each image, which does not depend on the
+        settings, is kept in the same cache.
+
+        Arguments:
+            cache_path: path to the SQLite database, created if it does not exist
+            settings_key: string identifying the settings that produced the results
+            use_hash: also check a hash of the file content before using a cached result
+    """
+    def __init__(self, cache_path : str, settings_key : str, use_hash : bool = False):
+        self.use_hash = use_hash
+        self.connection = sqlite3.connect(cache_path)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS scans (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, '
+                                    'content_hash TEXT, qr TEXT, scale REAL, stage TEXT)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS capture_times (path TEXT PRIMARY KEY, size INTEGER, '
+                                    'mtime REAL, capture_time REAL)')
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'settings'").fetchone()
+            if row is None or row[0] != settings_key:
+                self.connection.execute('DELETE FROM scans')
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('settings', ?)", (settings_key,))
+
+    def get(self, path : str, size : int, mtime : float) -> Optional[Tuple[Optional[str], Optional[float], str]]:
+        """
+            Looks up the cached result for a file.
+
+            Arguments:
+                path: path of the file
+                size: current size of the file
+                mtime: current modified time of the file
+
+            Returns tuple of (qr, scale, stage) if a result for the unchanged file is cached, otherwise None
+        """
+        row = self.connection.execute('SELECT size, mtime, content_hash, qr, scale, stage FROM scans WHERE path = ?',
+                                      (os.path.abspath(path),)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime:
+            return None
+        if self.use_hash and row[2] != file_hash(path):
+            return None
+        return row[3], row[4], row[5]
+
+    def put_many(self, rows : Iterable[Tuple[str, int, float, Optional[str], Optional[float], str]]):
+        """
+            Stores results for files in the cache in a single transaction.
+
+            Arguments:
+                rows: iterable of (path, size, mtime, qr, scale, stage) tuples
+        """
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO scans VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                        ((os.path.abspath(path), size, mtime, file_hash(path) if self.use_hash else None,
+                                          qr, scale, stage) for path, size, mtime, qr, scale, stage in rows))
+
+    def get_capture_times(self, signatures : Dict[str, Tuple[int, float]]) -> Dict[str, Optional[float]]:
+        """
+            Looks up the cached capture times of files.
+
+            Arguments:
+                signatures: dictionary of file path against current (size, modified time)
+
+            Returns dictionary of path against capture time (None if the image has none) for every unchanged
+            file with a cached capture time
+        """
+        capture_times = {}
+        for path, (size, mtime) in signatures.items():
+            row = self.connection.execute('SELECT size, mtime, capture_time FROM capture_times WHERE path = ?',
+                                          (os.path.abspath(path),)).fetchone()
+            if row is not None and row[0] == size and row[1] == mtime:
+                capture_times[path] = row[2]
+        return capture_times
+
+    def put_capture_times(self, rows : Iterable[Tuple[str, int, float, Optional[float]]]):
+        """
+            Stores capture times of files in the cache in a single transaction.
+
+            Arguments:
+                rows: iterable of (path, size, mtime, capture_time) tuples
+        """
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO capture_times VALUES (?, ?, ?, ?)',
+                                        ((os.path.abspath(path), size, mtime, capture_time)
+                                         for path, size, mtime, capture_time in rows))
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
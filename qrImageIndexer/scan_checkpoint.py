@@ -0,0 +1,122 @@
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+
+CHECKPOINT_FILE_NAME = '.qr_scan_checkpoint.jsonl'
+CHECKPOINT_BATCH_SIZE = 100
+
+class ScanCheckpoint:
+    """
+        Append-only log of scan results written while a sort runs, so an interrupted sort can be resumed without
+        scanning the finished images again. Results are buffered and appended in batches, with each batch synced
+        to disk before the next is started. The first line records the settings used to scan and a checkpoint
+        written with different settings is discarded.
+
+        Arguments:
+            checkpoint_path: path of the checkpoint file
+            settings_key: string identifying the settings that produced the results
+            resume: load results from an existing checkpoint and append to it. Otherwise any existing checkpoint
+                is replaced
+            batch_size: number of results to buffer before appending them to the file
+    """
+    def __init__(self, checkpoint_path : str, settings_key : str, resume : bool = False,
+                 batch_size : int = CHECKPOINT_BATCH_SIZE):
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.results : Dict[str, Tuple[int, float, Optional[str], Optional[float], str, Optional[float]]] = {}
+        self.pending : List[str] = []
+        self.partial_line = False
+        if resume and self.load(settings_key):
+            self.file = open(checkpoint_path, 'a', encoding='utf-8')
+            if self.partial_line:
+                self.file.write('\n')
+        else:
+            self.results = {}
+            self.file = open(checkpoint_path, 'w', encoding='utf-8')
+            self.file.write(json.dumps({'settings' : settings_key}) + '\n')
+            self.sync()
+
+    def load(self, settings_key : str) -> bool:
+        """
+            Loads the results from an existing checkpoint. A partly written last line, left if the previous run was
+            killed while appending, is ignored.
+
+            Returns True if a checkpoint written with the same settings was loaded
+        """
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return False
+        lines = content.split('\n')
+        self.partial_line = not content.endswith('\n')
+        try:
+            if json.loads(lines[0]).get('settings') != settings_key:
+                return False
+        except ValueError:
+            return False
+        for line in lines[1:]:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            self.results[row['path']] = (row['size'], row['mtime'], row['qr'], row['scale'], row['stage'], row['seconds'])
+        return True
+
+    def get(self, path : str, size : int, mtime : float) -> Optional[Tuple[Optional[str], Optional[float], str, Optional[float]]]:
+        """
+            Looks up the checkpointed result for a file.
+
+            Arguments:
+                path: path of the file
+                size: current size of the file
+                mtime: current modified time of the file
+
+            Returns tuple of (qr, scale, stage, seconds) if a result for the unchanged file was checkpointed,
+            otherwise None
+        """
+        row = self.results.get(os.path.abspath(path))
+        if row is None or row[0] != size or row[1] != mtime:
+            return None
+        return row[2:]
+
+    def add(self, path : str, size : int, mtime : float, qr : Optional[str], scale : Optional[float], stage : str,
+            seconds : Optional[float]):
+        """
+            Records the result for a file, appending the buffered results to the file once a batch is full.
+        """
+        self.pending.append(json.dumps({'path' : os.path.abspath(path), 'size' : size, 'mtime' : mtime, 'qr' : qr,
+                                        'scale' : scale, 'stage' : stage, 'seconds' : seconds}))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+            Appends all buffered results to the file and syncs it to disk.
+        """
+        if self.pending:
+            self.file.write('\n'.join(self.pending) + '\n')
+            self.pending = []
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def remove(self):
+        """
+            Closes and deletes the checkpoint, once the sort it belongs to has finished.
+        """
+        self.close()
+        os.remove(self.checkpoint_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
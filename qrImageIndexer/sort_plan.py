@@ -0,0 +1,216 @@
+from typing import Iterable, Iterator, List, NamedTuple, Optional, TextIO
+import csv
+import json
+import os
+import re
+import tqdm
+from qrImageIndexer.file_placement import CopyStats, ParallelCopier, is_placed, PLACEMENT_COPY
+from qrImageIndexer.file_inventory import flat_name
+
+UNSORTED_DIRECTORY = 'unsorted'
+PLAN_FORMAT_CSV = 'csv'
+PLAN_FORMAT_JSONL = 'jsonl'
+PLAN_FIELDS = ('source', 'directory', 'qr', 'stage', 'seconds', 'name')
+
+class PlanEntry(NamedTuple):
+    """
+        Where a single image will be placed by a sort.
+
+        Attributes:
+            source: path of the image
+            directory: directory to place the image in, relative to the output directory
+            qr: content of the QR code found in this image, None if the image inherits the directory of an
+                earlier image
+            stage: scan stage which finished with the image, None if unknown
+            seconds: time taken to scan the image, None if unknown (e.g. a cached result)
+            name: file name to place the image as, None to keep the name of the source
+    """
+    source : str
+    directory : str
+    qr : Optional[str] = None
+    stage : Optional[str] = None
+    seconds : Optional[float] = None
+    name : Optional[str] = None
+
+def sanitise_path(path : str) -> str:
+    '''
+        Function to remove invalid path characters from a path. Will prevent failure if user uses
+        characters such as question marks in image strings.
+
+        Arguments:
+            path: path to sanitise
+
+        Returns:
+            sanitised path
+    '''
+    drive_designator_pos = path.find(':\\') + 2
+    if drive_designator_pos > 0: #For windows with :\ in the tart of the path
+        windows_drive_designator = path[:drive_designator_pos]
+        remainder_path = path[drive_designator_pos:]
+    else: #If windows drive designator not present (e.g. on Linux or with relative pathing)
+        windows_drive_designator = ''
+        remainder_path = path
+    remainder_path = re.sub(r'[^\w\-_\. \\\/]', '_', remainder_path)
+    return windows_drive_designator + remainder_path
+
+def plan_sort(ordered_results : Iterable, input_dir : str = None) -> Iterator[PlanEntry]:
+    '''
+        Plans where each image goes without touching any files. Each image is placed in the directory of the most
+        recent QR code found and images before the first QR code are placed in the "unsorted" directory.
+
+        Arguments:
+            ordered_results: scan results in sorting order. Each must have path, qr, stage and seconds
+                attributes, such as photo_sorter.ScanResult
+            input_dir: input directory the images were found in. If passed, images in sub directories are named
+                with file_inventory.flat_name so images with the same name do not overwrite each other
+
+        Returns:
+            Iterator of PlanEntry in the same order
+    '''
+    directory = UNSORTED_DIRECTORY
+    for result in ordered_results:
+        if result.qr:
+            directory = sanitise_path(result.qr)
+        name = None
+        if input_dir is not None:
+            name = flat_name(result.path, input_dir)
+            if name == os.path.basename(result.path):
+                name = None
+        yield PlanEntry(result.path, directory, result.qr, result.stage, result.seconds, name)
+
+def plan_directories(plan : Iterable[PlanEntry]) -> List[str]:
+    '''
+        Lists the directories of every QR code in a plan in the order they are first found.
+
+        Arguments:
+            plan: plan entries
+
+        Returns:
+            List[str] of directories found in QR codes
+    '''
+    found_directories = []
+    for entry in plan:
+        if entry.qr and entry.directory not in found_directories:
+            found_directories.append(entry.directory)
+    return found_directories
+
+def plan_format(plan_path : str) -> str:
+    '''
+        Picks the manifest format from a file name. Files ending in .csv are CSV, anything else is JSON Lines.
+    '''
+    return PLAN_FORMAT_CSV if plan_path.lower().endswith('.csv') else PLAN_FORMAT_JSONL
+
+class PlanWriter:
+    """
+        Writes plan entries to a manifest file one at a time, so a plan can be recorded while it is applied.
+        The format is chosen from the file name, see plan_format.
+
+        Arguments:
+            plan_path: path of the manifest to write
+    """
+    def __init__(self, plan_path : str):
+        self.format = plan_format(plan_path)
+        self.file : TextIO = open(plan_path, 'w', newline='', encoding='utf-8')
+        if self.format == PLAN_FORMAT_CSV:
+            self.csv_writer = csv.writer(self.file)
+            self.csv_writer.writerow(PLAN_FIELDS)
+
+    def write(self, entry : PlanEntry):
+        if self.format == PLAN_FORMAT_CSV:
+            self.csv_writer.writerow(['' if value is None else value for value in entry])
+        else:
+            self.file.write(json.dumps(entry._asdict()) + '\n')
+
+    def record(self, plan : Iterable[PlanEntry]) -> Iterator[PlanEntry]:
+        """
+            Writes each entry of a plan as it passes through.
+        """
+        for entry in plan:
+            self.write(entry)
+            yield entry
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def write_plan(plan : Iterable[PlanEntry], plan_path : str):
+    '''
+        Writes a plan to a JSON Lines or CSV manifest.
+
+        Arguments:
+            plan: plan entries
+            plan_path: path of the manifest, see plan_format
+    '''
+    with PlanWriter(plan_path) as writer:
+        for entry in plan:
+            writer.write(entry)
+
+def read_plan(plan_path : str) -> Iterator[PlanEntry]:
+    '''
+        Reads a plan from a JSON Lines or CSV manifest written by write_plan.
+
+        Arguments:
+            plan_path: path of the manifest, see plan_format
+
+        Returns:
+            Iterator of PlanEntry
+    '''
+    with open(plan_path, newline='', encoding='utf-8') as f:
+        if plan_format(plan_path) == PLAN_FORMAT_CSV:
+            for row in csv.DictReader(f):
+                yield PlanEntry(row['source'], row['directory'], row['qr'] or None, row['stage'] or None,
+                                float(row['seconds']) if row['seconds'] else None, row.get('name') or None)
+        else:
+            for line in f:
+                if line.strip():
+                    yield PlanEntry(**json.loads(line))
+
+def apply_plan(plan : Iterable[PlanEntry],
+               output_dir : str,
+               verbose : bool = False,
+               total : int = None,
+               copy_workers : int = 1,
+               stats : CopyStats = None,
+               placement : str = PLACEMENT_COPY,
+               skip_existing : bool = False) -> List[str]:
+    '''
+        Places every image of a plan into its directory under the output directory, consuming the plan in order
+        as it arrives.
+
+        Arguments:
+            plan: plan entries
+            output_dir: output directory to save images in
+            verbose: whether or not to write verbose output to the terminal
+            total: number of images for the progress bar, if known
+            copy_workers: number of files to copy concurrently
+            stats: optional CopyStats to record the number of files and bytes copied in
+            placement: how to place images in the output directory, one of file_placement.PLACEMENTS. Falls
+                back to copying where the placement is not possible
+            skip_existing: skip images already placed at their destination, see file_placement.is_placed
+
+        Returns:
+            List[str] of all directories found in QR codes
+    '''
+    found_directories = []
+    created_directories = set()
+    with ParallelCopier(copy_workers, stats, placement) as copier:
+        for entry in tqdm.tqdm(plan, total=total) if verbose else plan:
+            if entry.qr and entry.directory not in found_directories:
+                found_directories.append(entry.directory)
+            directory = os.path.join(output_dir, entry.directory)
+            if directory not in created_directories:
+                os.makedirs(directory, exist_ok=True)
+                created_directories.add(directory)
+            destination = os.path.join(directory, entry.name or os.path.basename(entry.source))
+            if skip_existing and is_placed(entry.source, destination):
+                continue
+            copier.submit(entry.source, destination)
+
+    if verbose:
+        print(copier.stats.summary())
+    return found_directories
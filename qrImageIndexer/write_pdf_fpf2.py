@@ -1,9 +1,9 @@
 from fpdf import FPDF
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
 from PIL.Image import Image
 from qrcode.image.pil import PilImage
+from qrImageIndexer.qr_generator import QRMatrix
 from math import ceil
-from copy import copy
 import io
 
 TARGET_ROWS_PER_PAGE = 6
@@ -13,24 +13,41 @@ def build_pdf_report(data_struct : Dict[str, Tuple[Dict, Image]], repeat_heading
         Builds a PDF report using FPDF2
 
         Arguments:
-        data_struct : Dict[str, Tuple[Dict, Image]]: Input recursive data structure
+        data_struct : Dict[str, Tuple[Dict, Image]]: Input recursive data structure. QR codes may be images or QRMatrix,
+        which are drawn as vector shapes
         path: str: save path for PDF
         repeat_headings: bool: Indicates whether headings to be reapeated on each row or only at top level
         order_for_slicing: bool: whether to reorder table for slicing or have it down the page
 
+    '''
+    return build_pdf_table(iter_data_table(data_struct, repeat_headings), order_for_slicing)
+
+def build_pdf_table(data_table : Iterable[List], order_for_slicing : bool = False, qr_builder : Callable = None) -> FPDF:
+    '''
+        Builds a PDF report from a table as built by build_data_table
+
+        Arguments:
+        data_table: Iterable[List]: rows of equal length, with the QR code of each row in its last cell. Rows are
+        drawn as they are read unless ordered for slicing, so may be streamed from iter_data_table
+        order_for_slicing: bool: whether to reorder table for slicing or have it down the page
+        qr_builder: Callable: if passed, the last cell of each row holds the QR code string, which is passed to this
+        to build the image or QRMatrix just before the row is drawn. Only one code is then held at a time
+
     '''
     pdf = FPDF(orientation='portrait', format='A4')
     pdf.set_font('helvetica')
     pdf.add_page()
-    data_table = build_data_table(data_struct, repeat_headings)
     if order_for_slicing:
-        data_table = sort_table_for_slicing(data_table, TARGET_ROWS_PER_PAGE)
+        data_table = sort_table_for_slicing(list(data_table), TARGET_ROWS_PER_PAGE)
     
-    cols = len(data_table[0])
-    col_width = pdf.epw / cols
+    col_width = None
     line_height = (pdf.eph / (TARGET_ROWS_PER_PAGE)) * 0.99 #Going exact will cause a cautious page break
 
     for row in data_table:
+        if col_width is None:
+            col_width = pdf.epw / len(row)
+        if qr_builder is not None and row[-1]:
+            row = row[:-1] + [qr_builder(row[-1])]
         first_elem = True
         for datum in row:
             if first_elem:
@@ -38,56 +55,123 @@ def build_pdf_report(data_struct : Dict[str, Tuple[Dict, Image]], repeat_heading
                 first_elem = False
             else:
                 pdf.set_font(style='')
-            if type(datum) is PilImage:
+            if isinstance(datum, (PilImage, Image)):
                 f = io.BytesIO()
-                temp : PilImage = datum
-                temp.save(f)
+                datum.save(f, format='PNG')
                 pdf.image(f, x=pdf.get_x(), y=pdf.get_y(), w=min(col_width, line_height))
                 pdf.multi_cell(col_width, line_height, '', border = 1,
                     new_x="RIGHT", new_y="TOP", max_line_height=pdf.font_size)
+            elif isinstance(datum, QRMatrix):
+                draw_qr_matrix(pdf, datum, pdf.get_x(), pdf.get_y(), min(col_width, line_height))
+                pdf.multi_cell(col_width, line_height, '', border = 1,
+                    new_x="RIGHT", new_y="TOP", max_line_height=pdf.font_size)
             else:
                 pdf.multi_cell(col_width, line_height, datum, border = 1,
                     new_x="RIGHT", new_y="TOP", max_line_height=pdf.font_size)
         pdf.ln(line_height)
     return pdf
 
-def build_data_table(data_struct: Dict[str, Tuple[Dict, Image]], pass_headings : bool = False, existing_data : List = []) -> List[List]:
+def qr_matrix_rectangles(matrix : QRMatrix) -> List[Tuple[int, int, int, int]]:
+    '''
+        Covers the dark modules of a QR code with as few rectangles as is cheap to find. Dark modules are joined
+        into horizontal runs, and runs over the same columns in consecutive rows are joined into one rectangle.
+
+        Arguments:
+        matrix: QRMatrix: modules of the code
+
+        Returns:
+        List[Tuple[int, int, int, int]]: column, row, width and height of each rectangle in modules
     '''
-        Function to recursively turn the data structure into a nested list. Will include headings if required
+    rectangles = []
+    open_runs = {} # (first column, end column) against the first row of the rectangle
+    for row_index, row in enumerate(matrix.modules + ((),)): # Empty last row closes every rectangle
+        runs = set()
+        run_start = None
+        for col_index, dark in enumerate(row + (False,)):
+            if dark and run_start is None:
+                run_start = col_index
+            elif not dark and run_start is not None:
+                runs.add((run_start, col_index))
+                run_start = None
+        for run, first_row in list(open_runs.items()):
+            if run not in runs:
+                rectangles.append((run[0], first_row, run[1] - run[0], row_index - first_row))
+                del open_runs[run]
+        for run in sorted(runs):
+            open_runs.setdefault(run, row_index)
+    return rectangles
+
+def draw_qr_matrix(pdf : FPDF, matrix : QRMatrix, x : float, y : float, size : float):
+    '''
+        Draws a QR code as filled black rectangles, joining modules with qr_matrix_rectangles to keep the number of
+        rectangles down. Faster and smaller than embedding an image of the code, and sharp at any print size.
+
+        Arguments:
+        pdf: FPDF: PDF to draw on
+        matrix: QRMatrix: modules of the code
+        x: float: left edge of the code
+        y: float: top edge of the code
+        size: float: width and height of the code, including its border
+    '''
+    module = size / len(matrix.modules)
+    pdf.set_fill_color(0)
+    for column, row, width, height in qr_matrix_rectangles(matrix):
+        pdf.rect(x + column * module, y + row * module, width * module, height * module, style='F')
+
+def table_width(data_struct : Dict[str, Tuple[Dict, Image]]) -> int:
+    '''
+        Counts the columns of the table of a data structure, a column for each level of the structure and one for
+        the QR codes.
+    '''
+    depth = 0
+    stack = [(data_struct, 1)]
+    while stack:
+        struct, level = stack.pop()
+        if struct:
+            depth = max(depth, level)
+        for children, _ in struct.values():
+            if children:
+                stack.append((children, level + 1))
+    return depth + 1
+
+def iter_data_table(data_struct : Dict[str, Tuple[Dict, Image]], pass_headings : bool = False) -> Iterator[List]:
+    '''
+        Flattens the data structure into rows of the PDF table, in a single pass with an explicit stack so deep
+        structures are not limited by recursion. Every row has the same number of columns, with the QR code
+        (or an empty string) in the last cell.
+
+        Arguments:
+        data_struct: Dict[str, Tuple[Dict, Image]]: Nested data structure containing headings and QR images as appropriate.
+        pass_headings: bool: Indicates whether headings to be included at each subsequent level
+
+        Returns:
+        Iterator[List]: Rows of the table in order down the page
+    '''
+    cols = table_width(data_struct)
+    stack = [(iter(data_struct.items()), [])]
+    while stack:
+        items, prefix = stack[-1]
+        entry = next(items, None)
+        if entry is None:
+            stack.pop()
+            continue
+        key, (children, qr) = entry
+        yield prefix + [key] + [''] * (cols - len(prefix) - 2) + [qr if qr else '']
+        if children:
+            stack.append((iter(children.items()), prefix + [key] if pass_headings else [''] * (len(prefix) + 1)))
+
+def build_data_table(data_struct: Dict[str, Tuple[Dict, Image]], pass_headings : bool = False) -> List[List]:
+    '''
+        Function to turn the data structure into a nested list. Will include headings if required
 
         Arguments:
         data_struct: Dict[str, Tuple[Dict, Image]]: Nested data structure containing headings and QR images as appropriate.
         pass_headings: bool: Indicates whether headings to be included at each subsequent level
-        existing_data: List: For recursive calls. Includes either heading data or empty strings depending on status of pass_headings argument
 
         Returns:
         List[List]: Containing data to be written to PDF table
     '''
-    result = []
-
-    for key in data_struct:
-        row = copy(existing_data)
-        result.append(row)
-        row.append(key)
-
-        if data_struct[key][0]:
-            passed_row = copy(row)
-            if not pass_headings:
-                passed_row = ['' for _ in passed_row]
-            for sub_row in build_data_table(data_struct[key][0], pass_headings, passed_row):
-                result.append(sub_row)
-
-        if data_struct[key][1]:
-            row.append(data_struct[key][1])
-        else:
-            row.append('')
-
-    max_cols = max([len(r) for r in result])
-    for row in result:
-        while len(row) < max_cols:
-            row.insert(-1, '') # Pad out columns before QR for shorter rows so QRs are always in the last cell and each row is equal
-    
-    return result
+    return list(iter_data_table(data_struct, pass_headings))
 
 def sort_table_for_slicing(input_table : List[List], rows_per_page : int) -> List[List]:
     '''
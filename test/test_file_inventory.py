@@ -0,0 +1,82 @@
+from qrImageIndexer import file_inventory
+from multiprocessing.pool import ThreadPool
+import pathlib
+import os
+from PIL import Image
+
+def build_demo_dir(tmp_path : pathlib.Path) -> pathlib.Path:
+    input_dir = tmp_path / 'inputs'
+    input_dir.mkdir()
+    Image.new('RGB', (10, 10)).save(input_dir / 'image.png')
+    (input_dir / 'text.txt').write_text('not an image')
+    (input_dir / 'sub_dir').mkdir()
+    return input_dir
+
+def test_inspect_file(tmp_path : pathlib.Path):
+    input_dir = build_demo_dir(tmp_path)
+    image_path = (input_dir / 'image.png').as_posix()
+    entry = file_inventory.inspect_file(image_path)
+    assert entry == file_inventory.InventoryEntry(image_path, os.path.getsize(image_path), os.path.getmtime(image_path), 'png')
+    assert file_inventory.inspect_file((input_dir / 'text.txt').as_posix()).image_type is None
+    assert file_inventory.inspect_file((input_dir / 'sub_dir').as_posix()) is None
+    assert file_inventory.inspect_file((input_dir / 'missing').as_posix()) is None
+
+def test_build_inventory(tmp_path : pathlib.Path):
+    input_dir = build_demo_dir(tmp_path)
+    with ThreadPool(2) as pool:
+        inventory = file_inventory.build_inventory(input_dir.as_posix(), pool)
+
+    image_path = os.path.join(input_dir.as_posix(), 'image.png')
+    text_path = os.path.join(input_dir.as_posix(), 'text.txt')
+    assert inventory.image_paths() == [image_path]
+    assert inventory.non_image_paths() == [text_path]
+    assert inventory.mtime(image_path) == os.path.getmtime(image_path)
+
+def test_copy_non_images(tmp_path : pathlib.Path):
+    input_dir = build_demo_dir(tmp_path)
+    non_image_dir = tmp_path / 'non_image'
+    with ThreadPool(2) as pool:
+        inventory = file_inventory.build_inventory(input_dir.as_posix(), pool)
+
+    file_inventory.copy_non_images(inventory, non_image_dir.as_posix())
+
+    assert os.listdir(non_image_dir) == ['text.txt']
+
+def build_card_dir(tmp_path : pathlib.Path) -> pathlib.Path:
+    input_dir = tmp_path / 'card'
+    for folder in ['100CANON', '101CANON', '.thumbnails']:
+        (input_dir / 'DCIM' / folder).mkdir(parents=True)
+        Image.new('RGB', (10, 10)).save(input_dir / 'DCIM' / folder / 'IMG_0001.JPG', 'JPEG')
+    (input_dir / 'DCIM' / '100CANON' / 'IMG_0001.CR2').write_bytes(b'raw')
+    Image.new('RGB', (10, 10)).save(input_dir / 'cover.png')
+    return input_dir
+
+def listed_paths(input_dir : pathlib.Path, **kwargs) -> list:
+    return sorted(os.path.relpath(path, input_dir).replace(os.sep, '/')
+                  for path, _ in file_inventory.list_files(input_dir.as_posix(), **kwargs))
+
+def test_list_files(tmp_path : pathlib.Path):
+    input_dir = build_card_dir(tmp_path)
+
+    assert listed_paths(input_dir) == ['cover.png']
+    assert listed_paths(input_dir, recursive=True, exclude=['.*']) == [
+        'DCIM/100CANON/IMG_0001.CR2', 'DCIM/100CANON/IMG_0001.JPG', 'DCIM/101CANON/IMG_0001.JPG', 'cover.png']
+    assert listed_paths(input_dir, recursive=True, include=['*.jpg'], exclude=['.*']) == [
+        'DCIM/100CANON/IMG_0001.JPG', 'DCIM/101CANON/IMG_0001.JPG']
+    assert listed_paths(input_dir, recursive=True, include=['DCIM/101*/*']) == ['DCIM/101CANON/IMG_0001.JPG']
+    assert listed_paths(input_dir, recursive=True, skip_dirs=[(input_dir / 'DCIM').as_posix()]) == ['cover.png']
+
+def test_build_inventory_recursive(tmp_path : pathlib.Path):
+    input_dir = build_card_dir(tmp_path)
+    with ThreadPool(2) as pool:
+        inventory = file_inventory.build_inventory(input_dir.as_posix(), pool, recursive=True, exclude=['.thumbnails'])
+
+    assert len(inventory.image_paths()) == 3
+    assert [os.path.basename(path) for path in inventory.non_image_paths()] == ['IMG_0001.CR2']
+    for path, entry in inventory.entries.items():
+        assert (entry.size, entry.mtime) == (os.path.getsize(path), os.path.getmtime(path))
+
+def test_flat_name(tmp_path : pathlib.Path):
+    input_dir = tmp_path.as_posix()
+    assert file_inventory.flat_name(os.path.join(input_dir, 'a.jpg'), input_dir) == 'a.jpg'
+    assert file_inventory.flat_name(os.path.join(input_dir, '100CANON', 'a.jpg'), input_dir) == '100CANON_a.jpg'
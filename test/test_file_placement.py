@@ -0,0 +1,134 @@
+from qrImageIndexer import file_placement
+import pathlib
+import pytest
+
+def build_sources(tmp_path : pathlib.Path, count : int) -> list:
+    sources = tmp_path / 'sources'
+    sources.mkdir()
+    paths = []
+    for i in range(count):
+        path = sources / f'{i}.jpg'
+        path.write_bytes(str(i).encode() * 100)
+        paths.append(path)
+    return paths
+
+def test_parallel_copier(tmp_path : pathlib.Path):
+    sources = build_sources(tmp_path, 20)
+    destination = tmp_path / 'destination'
+    destination.mkdir()
+
+    with file_placement.ParallelCopier(4) as copier:
+        for source in sources:
+            copier.submit(source.as_posix(), (destination / source.name).as_posix())
+
+    for source in sources:
+        assert (destination / source.name).read_bytes() == source.read_bytes()
+    assert copier.stats.files == 20
+    assert copier.stats.bytes == sum(source.stat().st_size for source in sources)
+
+def test_parallel_copier_same_destination_order(tmp_path : pathlib.Path):
+    sources = build_sources(tmp_path, 20)
+    destination = tmp_path / 'image.jpg'
+
+    with file_placement.ParallelCopier(4) as copier:
+        for source in sources:
+            copier.submit(source.as_posix(), destination.as_posix())
+
+    assert destination.read_bytes() == sources[-1].read_bytes()
+
+def test_parallel_copier_error(tmp_path : pathlib.Path):
+    with pytest.raises(FileNotFoundError):
+        with file_placement.ParallelCopier(2) as copier:
+            copier.submit((tmp_path / 'missing').as_posix(), (tmp_path / 'copy').as_posix())
+
+def test_copy_stats():
+    stats = file_placement.CopyStats()
+    assert stats.mb_per_second == 0.0
+    stats.start_time = 10.0
+    stats.end_time = 12.0
+    stats.add(3_000_000)
+    stats.add(1_000_000)
+    assert stats.files_per_second == 1.0
+    assert stats.mb_per_second == 2.0
+    assert stats.summary() == 'Placed 2 files (4.0 MB) in 2.0s: 2.0 MB/s, 1.0 files/s'
+
+def test_copy_stats_fallback_summary():
+    stats = file_placement.CopyStats()
+    stats.add_fallback(file_placement.PLACEMENT_HARDLINK, 'Invalid cross-device link')
+    stats.add_fallback(file_placement.PLACEMENT_HARDLINK, 'Invalid cross-device link')
+    assert stats.summary().splitlines()[1] == 'Could not hardlink 2 files (Invalid cross-device link), copied instead'
+
+def test_place_file_hardlink(tmp_path : pathlib.Path):
+    source = build_sources(tmp_path, 1)[0]
+    destination = tmp_path / 'link.jpg'
+    assert file_placement.place_file(source.as_posix(), destination.as_posix(), file_placement.PLACEMENT_HARDLINK) == file_placement.PLACEMENT_HARDLINK
+    assert destination.samefile(source)
+
+def test_place_file_symlink(tmp_path : pathlib.Path):
+    source = build_sources(tmp_path, 1)[0]
+    destination = tmp_path / 'link.jpg'
+    assert file_placement.place_file(source.as_posix(), destination.as_posix(), file_placement.PLACEMENT_SYMLINK) == file_placement.PLACEMENT_SYMLINK
+    assert destination.is_symlink()
+    assert destination.read_bytes() == source.read_bytes()
+
+def test_place_file_copy_over_link(tmp_path : pathlib.Path):
+    source = build_sources(tmp_path, 1)[0]
+    destination = tmp_path / 'link.jpg'
+    file_placement.place_file(source.as_posix(), destination.as_posix(), file_placement.PLACEMENT_SYMLINK)
+    file_placement.place_file(source.as_posix(), destination.as_posix(), file_placement.PLACEMENT_COPY)
+    assert not destination.is_symlink()
+    assert destination.read_bytes() == source.read_bytes()
+
+def test_place_file_reflink_or_fallback(tmp_path : pathlib.Path):
+    source = build_sources(tmp_path, 1)[0]
+    destination = tmp_path / 'clone.jpg'
+    stats = file_placement.CopyStats()
+    used = file_placement.place_file(source.as_posix(), destination.as_posix(), file_placement.PLACEMENT_REFLINK, stats)
+    assert destination.read_bytes() == source.read_bytes()
+    if used == file_placement.PLACEMENT_COPY:
+        assert stats.fallbacks == {file_placement.PLACEMENT_REFLINK : 1}
+    else:
+        assert used == file_placement.PLACEMENT_REFLINK
+
+def test_place_file_move(tmp_path : pathlib.Path):
+    source = build_sources(tmp_path, 1)[0]
+    content = source.read_bytes()
+    destination = tmp_path / 'moved.jpg'
+    assert file_placement.place_file(source.as_posix(), destination.as_posix(), file_placement.PLACEMENT_MOVE) == file_placement.PLACEMENT_MOVE
+    assert not source.exists()
+    assert destination.read_bytes() == content
+
+def test_place_file_invalid(tmp_path : pathlib.Path):
+    source = build_sources(tmp_path, 1)[0]
+    with pytest.raises(ValueError):
+        file_placement.place_file(source.as_posix(), (tmp_path / 'x').as_posix(), 'invalid')
+
+def test_parallel_copier_invalid_workers():
+    for workers in (0, -1):
+        with pytest.raises(ValueError, match='copy workers'):
+            file_placement.ParallelCopier(workers)
+
+def test_is_placed(tmp_path : pathlib.Path):
+    source = tmp_path / 'source.jpg'
+    source.write_bytes(bytes(range(256)) * 1024)
+    destination = tmp_path / 'destination.jpg'
+    assert not file_placement.is_placed(source.as_posix(), destination.as_posix())
+
+    destination.write_bytes(source.read_bytes())
+    assert file_placement.is_placed(source.as_posix(), destination.as_posix())
+
+    destination.write_bytes(source.read_bytes()[:1000]) # Partly written copy
+    assert not file_placement.is_placed(source.as_posix(), destination.as_posix())
+
+    for offset in (0, 128 * 1024, 256 * 1024 - 1): # A different photo of the same size
+        different = bytearray(source.read_bytes())
+        different[offset] ^= 0xFF
+        destination.write_bytes(bytes(different))
+        assert not file_placement.is_placed(source.as_posix(), destination.as_posix())
+
+def test_is_placed_link(tmp_path : pathlib.Path):
+    source = tmp_path / 'source.jpg'
+    source.write_bytes(b'photo')
+    destination = tmp_path / 'destination.jpg'
+    destination.hardlink_to(source)
+    assert file_placement.is_placed(source.as_posix(), destination.as_posix())
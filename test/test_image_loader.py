@@ -0,0 +1,139 @@
+from qrImageIndexer import image_loader
+import pathlib
+import io
+import struct
+import pytest
+from PIL import Image
+
+def jpeg_bytes(image : Image.Image) -> bytes:
+    f = io.BytesIO()
+    image.convert('RGB').save(f, format='JPEG')
+    return f.getvalue()
+
+def add_exif_thumbnail(jpeg : bytes, thumbnail : bytes) -> bytes:
+    '''
+        Builds a JPEG with an EXIF block containing the thumbnail in IFD1, as written by cameras
+    '''
+    ifd0 = struct.pack('<H', 0) + struct.pack('<I', 14)
+    ifd1 = struct.pack('<H', 2)
+    ifd1 += struct.pack('<HHII', 0x0201, 4, 1, 8 + len(ifd0) + 2 + 24 + 4)
+    ifd1 += struct.pack('<HHII', 0x0202, 4, 1, len(thumbnail))
+    ifd1 += struct.pack('<I', 0)
+    tiff = b'II*\x00' + struct.pack('<I', 8) + ifd0 + ifd1 + thumbnail
+    app1 = b'Exif\x00\x00' + tiff
+    return jpeg[:2] + b'\xff\xe1' + struct.pack('>H', len(app1) + 2) + app1 + jpeg[2:]
+
+def save_image_with_thumbnail(path : pathlib.Path, image : Image.Image, thumbnail : Image.Image) -> bytes:
+    thumbnail_bytes = jpeg_bytes(thumbnail)
+    with open(path, 'wb') as f:
+        f.write(add_exif_thumbnail(jpeg_bytes(image), thumbnail_bytes))
+    return thumbnail_bytes
+
+def test_read_image_size(tmp_path : pathlib.Path):
+    Image.new('RGB', (320, 240)).save(tmp_path / 'test.jpg')
+    assert image_loader.read_image_size((tmp_path / 'test.jpg').as_posix()) == (320, 240)
+
+def test_read_image_size_not_image(tmp_path : pathlib.Path):
+    (tmp_path / 'test').touch()
+    assert image_loader.read_image_size((tmp_path / 'test').as_posix()) is None
+
+def test_choose_reduction():
+    assert image_loader.choose_reduction(None) == 1
+    assert image_loader.choose_reduction((800, 600)) == 1
+    assert image_loader.choose_reduction((2000, 1500)) == 2
+    assert image_loader.choose_reduction((4000, 3000)) == 4
+    assert image_loader.choose_reduction((3000, 8000)) == 8
+    assert image_loader.choose_reduction((3000, 8000), min_size=2000) == 4
+
+def test_reduction_for_budget():
+    assert image_loader.reduction_for_budget(None, 1000) == 1
+    assert image_loader.reduction_for_budget((4000, 3000), None) == 1
+    assert image_loader.reduction_for_budget((4000, 3000), 12000000) == 1
+    assert image_loader.reduction_for_budget((4000, 3000), 3000000) == 2
+    assert image_loader.reduction_for_budget((4000, 3000), 1000000) == 4
+    assert image_loader.reduction_for_budget((4000, 3000), 10) == 8
+
+def test_reduction_for_scale():
+    assert image_loader.reduction_for_scale(0.5) == 2
+    assert image_loader.reduction_for_scale(0.25) == 4
+    assert image_loader.reduction_for_scale(0.125) == 8
+    assert image_loader.reduction_for_scale(0.3) is None
+    assert image_loader.reduction_for_scale(1.0) is None
+
+def test_load_grayscale(tmp_path : pathlib.Path):
+    Image.new('RGB', (320, 240)).save(tmp_path / 'test.jpg')
+    path = (tmp_path / 'test.jpg').as_posix()
+    assert image_loader.load_grayscale(path).shape == (240, 320)
+    assert image_loader.load_grayscale(path, 4).shape == (60, 80)
+
+def test_load_thumbnail(tmp_path : pathlib.Path):
+    Image.new('RGB', (4000, 3000)).save(tmp_path / 'large.jpg')
+    Image.new('RGB', (320, 240)).save(tmp_path / 'small.png')
+    assert image_loader.load_thumbnail((tmp_path / 'large.jpg').as_posix(), 640).shape == (480, 640)
+    assert image_loader.load_thumbnail((tmp_path / 'small.png').as_posix(), 640).shape == (240, 320)
+
+def test_read_embedded_preview(tmp_path : pathlib.Path):
+    thumbnail = save_image_with_thumbnail(tmp_path / 'test.jpg', Image.new('RGB', (640, 480)), Image.new('RGB', (160, 120), 'white'))
+    assert image_loader.read_embedded_preview((tmp_path / 'test.jpg').as_posix()) == thumbnail
+    assert image_loader.load_embedded_preview((tmp_path / 'test.jpg').as_posix()).shape == (120, 160)
+
+def test_read_embedded_preview_none(tmp_path : pathlib.Path):
+    Image.new('RGB', (320, 240)).save(tmp_path / 'test.jpg')
+    Image.new('RGB', (320, 240)).save(tmp_path / 'test.tif')
+    (tmp_path / 'test').touch()
+    assert image_loader.read_embedded_preview((tmp_path / 'test.jpg').as_posix()) is None
+    assert image_loader.read_embedded_preview((tmp_path / 'test.tif').as_posix()) is None
+    assert image_loader.read_embedded_preview((tmp_path / 'test').as_posix()) is None
+    assert image_loader.load_embedded_preview((tmp_path / 'test').as_posix()) is None
+
+def save_image_with_capture_time(path : pathlib.Path, image : Image.Image, date_time : str, sub_sec : str = None):
+    exif = Image.Exif()
+    exif.get_ifd(image_loader.TAG_EXIF_IFD)[image_loader.TAG_DATE_TIME_ORIGINAL] = date_time
+    if sub_sec is not None:
+        exif.get_ifd(image_loader.TAG_EXIF_IFD)[image_loader.TAG_SUB_SEC_TIME_ORIGINAL] = sub_sec
+    image.save(path, 'JPEG', exif=exif)
+
+def test_read_capture_time(tmp_path : pathlib.Path):
+    save_image_with_capture_time(tmp_path / 'a.jpg', Image.new('RGB', (10, 10)), '2024:01:02 10:20:30', '25')
+    save_image_with_capture_time(tmp_path / 'b.jpg', Image.new('RGB', (10, 10)), '2024:01:02 10:20:30')
+    Image.new('RGB', (10, 10)).save(tmp_path / 'c.jpg')
+    Image.new('RGB', (10, 10)).save(tmp_path / 'd.png')
+
+    assert image_loader.read_capture_time((tmp_path / 'a.jpg').as_posix()) == 1704190830.25
+    assert image_loader.read_capture_time((tmp_path / 'b.jpg').as_posix()) == 1704190830.0
+    assert image_loader.read_capture_time((tmp_path / 'c.jpg').as_posix()) is None
+    assert image_loader.read_capture_time((tmp_path / 'd.png').as_posix()) is None
+
+def tiff_with_capture_time(byte_order : str, date_time : str, sub_sec : str, exif_ifd_type : int = 4) -> bytes:
+    # PIL does not write the EXIF IFD of TIFF files, so build a TIFF/RAW style header by hand. IFD0 points to
+    # the EXIF IFD, which holds DateTimeOriginal after the IFD and SubSecTimeOriginal inline in its entry
+    date_time = date_time.encode('ascii') + b'\x00'
+    sub_sec = sub_sec.encode('ascii') + b'\x00'
+    exif_offset = 8 + 2 + 12 + 4
+    date_offset = exif_offset + 2 + 24 + 4
+    tiff = (b'II*\x00' if byte_order == '<' else b'MM\x00*') + struct.pack(byte_order + 'I', 8)
+    tiff += struct.pack(byte_order + 'H', 1)
+    tiff += struct.pack(byte_order + 'HHII', image_loader.TAG_EXIF_IFD, exif_ifd_type, 1, exif_offset)
+    tiff += struct.pack(byte_order + 'I', 0)
+    tiff += struct.pack(byte_order + 'H', 2)
+    tiff += struct.pack(byte_order + 'HHII', image_loader.TAG_DATE_TIME_ORIGINAL, 2, len(date_time), date_offset)
+    tiff += struct.pack(byte_order + 'HHI', image_loader.TAG_SUB_SEC_TIME_ORIGINAL, 2, len(sub_sec)) + sub_sec.ljust(4, b'\x00')
+    tiff += struct.pack(byte_order + 'I', 0)
+    return tiff + date_time + b'\x00' * 64
+
+@pytest.mark.parametrize('byte_order, exif_ifd_type, extension', [('<', 4, '.tif'), ('>', 4, '.nef'), ('<', 13, '.dng')])
+def test_read_capture_time_tiff(tmp_path : pathlib.Path, byte_order : str, exif_ifd_type : int, extension : str):
+    path = tmp_path / ('photo' + extension)
+    path.write_bytes(tiff_with_capture_time(byte_order, '2024:01:02 10:20:30', '25', exif_ifd_type))
+    assert image_loader.read_capture_time(path.as_posix()) == 1704190830.25
+
+def test_read_capture_time_tiff_ifd0(tmp_path : pathlib.Path):
+    Image.new('RGB', (10, 10)).save(tmp_path / 'a.tif', tiffinfo={image_loader.TAG_DATE_TIME_ORIGINAL : '2024:01:02 10:20:30'})
+    Image.new('RGB', (10, 10)).save(tmp_path / 'b.tif')
+    assert image_loader.read_capture_time((tmp_path / 'a.tif').as_posix()) == 1704190830.0
+    assert image_loader.read_capture_time((tmp_path / 'b.tif').as_posix()) is None
+
+def test_parse_capture_time():
+    assert image_loader.parse_capture_time('1970:01:01 00:01:00', '5') == 60.5
+    assert image_loader.parse_capture_time('0000:00:00 00:00:00') is None
+    assert image_loader.parse_capture_time(None) is None
@@ -0,0 +1,43 @@
+from qrImageIndexer import image_types
+from PIL import Image
+import pathlib
+import pytest
+
+def ftyp_header(*brands : bytes, minor_version : bytes = b'\x00\x00\x00\x00') -> bytes:
+    box = b'ftyp' + brands[0] + minor_version + b''.join(brands)
+    return (len(box) + 4).to_bytes(4, 'big') + box
+
+@pytest.mark.parametrize('header, extension, expected', [
+    (b'\xff\xd8\xff\xe1\x00\x10Exif', '.jpg', image_types.IMAGE_JPEG),
+    (b'\x89PNG\r\n\x1a\n\x00\x00', '.png', image_types.IMAGE_PNG),
+    (b'II*\x00\x08\x00\x00\x00', '.tif', image_types.IMAGE_TIFF),
+    (b'MM\x00*\x00\x00\x00\x08', '.nef', image_types.IMAGE_RAW),
+    (b'II*\x00\x10\x00\x00\x00CR\x02\x00', '.tif', image_types.IMAGE_RAW),
+    (b'IIRO\x08\x00\x00\x00', '.orf', image_types.IMAGE_RAW),
+    (b'FUJIFILMCCD-RAW 0201', '.raf', image_types.IMAGE_RAW),
+    (ftyp_header(b'heic', b'mif1', b'heic'), '.heic', image_types.IMAGE_HEIC),
+    (ftyp_header(b'crx ', b'crx ', b'isom'), '.cr3', image_types.IMAGE_RAW),
+    (ftyp_header(b'isom', b'isom', b'mp41'), '.mp4', None),
+    (ftyp_header(b'isom', b'isom', b'mp41', minor_version=b'heic'), '.mp4', None), # Minor version is not a brand
+    (ftyp_header(b'heic', minor_version=b'\x00\x00\x00\x01'), '.heic', image_types.IMAGE_HEIC),
+    (b'GIF89a\x01\x00', '.gif', image_types.IMAGE_GIF),
+    (b'RIFF\x00\x00\x00\x00WEBPVP8 ', '.webp', image_types.IMAGE_WEBP),
+    (b'not an image at all', '.jpg', None),
+    (b'', '', None),
+])
+def test_sniff_image_type(header : bytes, extension : str, expected : str):
+    assert image_types.sniff_image_type(header, extension) == expected
+
+def test_get_image_type(tmp_path : pathlib.Path):
+    Image.new('RGB', (10, 10)).save(tmp_path / 'image.JPG', 'JPEG')
+    Image.new('RGB', (10, 10)).save(tmp_path / 'misnamed.dat', 'PNG')
+    Image.new('RGB', (10, 10)).save(tmp_path / 'sidecar.xmp', 'PNG')
+    (tmp_path / 'text.txt').write_text('not an image')
+    (tmp_path / 'photo.heic').write_bytes(ftyp_header(b'heic', b'mif1', b'heic') + b'\x00' * 100)
+
+    assert image_types.get_image_type((tmp_path / 'image.JPG').as_posix()) == image_types.IMAGE_JPEG
+    assert image_types.get_image_type((tmp_path / 'misnamed.dat').as_posix()) == image_types.IMAGE_PNG
+    assert image_types.get_image_type((tmp_path / 'sidecar.xmp').as_posix()) is None
+    assert image_types.get_image_type((tmp_path / 'text.txt').as_posix()) is None
+    assert image_types.get_image_type((tmp_path / 'photo.heic').as_posix()) == image_types.IMAGE_HEIC
+    assert image_types.get_image_type((tmp_path / 'missing.jpg').as_posix()) is None
@@ -1,5 +1,5 @@
-from qrImageIndexer import write_pdf_fpf2
-from .test_qr_generator import demo_data_struct_include_headers
+from qrImageIndexer import write_pdf_fpf2, qr_generator
+from .test_qr_generator import demo_data_struct_include_headers, demo_data_struct_no_headers
 from os import path
 import pathlib
 from PyPDF2 import PdfReader
@@ -102,4 +102,62 @@ def test_generated_pdf_text(tmp_path : pathlib.Path):
     assert 'Indent 1' in text
     assert 'Indent 2' in text
 
-    
\ No newline at end of file
+    
+def test_qr_matrix_rectangles_cover_dark_modules():
+    matrix = qr_generator.build_qr_matrix('Level1-2' + path.sep + 'Level2-1' + path.sep)
+    covered = [[0 for _ in row] for row in matrix.modules]
+    for column, row, width, height in write_pdf_fpf2.qr_matrix_rectangles(matrix):
+        for y in range(row, row + height):
+            for x in range(column, column + width):
+                covered[y][x] += 1
+    assert covered == [[int(dark) for dark in row] for row in matrix.modules]
+
+def test_qr_matrix_rectangles_joins_rows():
+    matrix = qr_generator.QRMatrix(((True, True, False), (True, True, False), (False, True, True)))
+    assert sorted(write_pdf_fpf2.qr_matrix_rectangles(matrix)) == [(0, 0, 2, 2), (1, 2, 2, 1)]
+
+def test_generated_pdf_vector(tmp_path : pathlib.Path):
+    data_struct = demo_data_struct_no_headers()
+    raster_path = tmp_path / 'raster.pdf'
+    vector_path = tmp_path / 'vector.pdf'
+    write_pdf_fpf2.build_pdf_report(qr_generator.generate_qr_code_structure(data_struct)).output(raster_path.as_posix())
+    write_pdf_fpf2.build_pdf_report(qr_generator.generate_qr_code_structure(data_struct, vector=True)).output(vector_path.as_posix())
+    page = PdfReader(vector_path).pages[0]
+    assert 'Level3' in page.extract_text()
+    assert len(page.images) == 0
+    assert vector_path.stat().st_size < raster_path.stat().st_size
+
+def test_iter_data_table_streams_rows():
+    rows = write_pdf_fpf2.iter_data_table(demo_data_struct_include_headers(), True)
+    assert next(rows) == expected_table_include_headers_strings_repeat_headings()[0]
+    assert list(rows) == expected_table_include_headers_strings_repeat_headings()[1:]
+
+def test_table_width():
+    assert write_pdf_fpf2.table_width(demo_data_struct_include_headers()) == 4
+    assert write_pdf_fpf2.table_width({}) == 1
+
+def test_build_table_empty():
+    assert write_pdf_fpf2.build_data_table({}) == []
+
+def test_build_table_deep():
+    data_struct = {}
+    level = data_struct
+    for i in range(5000): # Deeper than the recursion limit
+        level[str(i)] = ({}, None)
+        level = level[str(i)][0]
+    table = write_pdf_fpf2.build_data_table(data_struct, False)
+    assert len(table) == 5000
+    assert all(len(row) == 5001 for row in table)
+    assert table[-1][-2] == '4999'
+    assert table[-1][0] == ''
+
+def test_draw_qr_matrix_coordinates(mocker):
+    pdf = mocker.Mock()
+    # Dark module top right and a dark bottom row, so a flipped or transposed code would draw elsewhere
+    matrix = qr_generator.QRMatrix(((False, True), (True, True)))
+    write_pdf_fpf2.draw_qr_matrix(pdf, matrix, 10, 20, 4)
+    pdf.set_fill_color.assert_called_once_with(0)
+    assert pdf.rect.call_args_list == [
+        mocker.call(12, 20, 2, 2, style='F'),
+        mocker.call(10, 22, 4, 2, style='F'),
+    ]
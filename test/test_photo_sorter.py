@@ -1,10 +1,15 @@
 from os import listdir
-from qrImageIndexer import photo_sorter, qr_generator
+from qrImageIndexer import photo_sorter, qr_generator, sort_plan, file_placement, qr_decoders
 import pathlib
 import os
+import shutil
+import json
 import time
 from typing import Dict
 from PIL import Image, ImageMode
+from multiprocessing.pool import ThreadPool
+import pytest
+from .test_image_loader import save_image_with_thumbnail, save_image_with_capture_time
 
 def generate_image(tmp_path : pathlib.Path, string : str, filename : str = 'test') -> str:
     '''
@@ -48,6 +53,72 @@ def test_read_qr_zbar(tmp_path : pathlib.Path):
     assert photo_sorter.read_qr_zbar(generate_image(tmp_path, 'test_string'))[0].data.decode('utf-8') == 'test_string'
     assert photo_sorter.read_qr_zbar(generate_image(tmp_path, 'test_string'))[0].data.decode('utf-8') == photo_sorter.read_qr_zbar(generate_image(tmp_path, 'test_string'), binarization=True)[0].data.decode('utf-8')
 
+def test_read_qr_zbar_pyramid(tmp_path : pathlib.Path):
+    results, scale = photo_sorter.read_qr_zbar_pyramid(generate_image(tmp_path, 'test_string'), scales=(0.5, 1.0))
+    assert results[0].data.decode('utf-8') == 'test_string'
+    assert scale in (0.5, 1.0)
+
+def test_read_qr_zbar_pyramid_no_code(tmp_path : pathlib.Path):
+    Image.new('RGB', (100,100)).save(tmp_path / 'blank.png')
+    assert photo_sorter.read_qr_zbar_pyramid((tmp_path / 'blank.png').as_posix()) == ([], None)
+
+def test_read_qr_zbar_reduced(tmp_path : pathlib.Path):
+    canvas = Image.new('RGB', (4000, 3000), 'white')
+    canvas.paste(qr_generator.build_qr('test_string').resize((2000, 2000)), (1000, 500))
+    canvas.save(tmp_path / 'large.jpg')
+
+    results, scale = photo_sorter.read_qr_zbar_reduced((tmp_path / 'large.jpg').as_posix())
+    assert results[0].data.decode('utf-8') == 'test_string'
+    assert scale == 0.25
+
+def test_read_qr_zbar_pyramid_reduced_load(tmp_path : pathlib.Path):
+    results, scale = photo_sorter.read_qr_zbar_pyramid(generate_image(tmp_path, 'test_string'), scales=(0.5, 1.0), reduced_load=True)
+    assert results[0].data.decode('utf-8') == 'test_string'
+    assert scale in (0.5, 1.0)
+
+def test_scan_image_max_pixels(tmp_path : pathlib.Path):
+    canvas = Image.new('RGB', (2000, 1500), 'white')
+    canvas.paste(qr_generator.build_qr('test_string').resize((1000, 1000)), (500, 250))
+    canvas.save(tmp_path / 'large.png')
+    settings = photo_sorter.ScanSettings(max_pixels=1000000)
+
+    result = photo_sorter.scan_image((tmp_path / 'large.png').as_posix(), settings=settings)
+    assert result.qr == 'test_string'
+    assert result.scale == 0.5
+
+def test_scan_image_decoders(tmp_path : pathlib.Path):
+    settings = photo_sorter.ScanSettings(decoders=(qr_decoders.DECODER_ZBAR_ROI, qr_decoders.DECODER_OPENCV))
+    result = photo_sorter.scan_image(generate_image(tmp_path, 'test_string'), settings=settings)
+    assert result.qr == 'test_string'
+    assert result.stage == photo_sorter.STAGE_IMAGE
+    assert qr_decoders.DECODER_ZBAR_ROI in result.timings
+
+def test_read_qr_zbar_pyramid_min_reduction(tmp_path : pathlib.Path):
+    results, scale = photo_sorter.read_qr_zbar_pyramid(generate_image(tmp_path, 'test_string'), scales=(1.0,), min_reduction=2)
+    assert results[0].data.decode('utf-8') == 'test_string'
+    assert scale == 0.5
+
+def test_memory_budget_pixels():
+    assert photo_sorter.memory_budget_pixels(12000000, workers=4) == 1000000
+    assert photo_sorter.memory_budget_pixels(0, workers=4) == 1
+
+def test_scan_image_preview(tmp_path : pathlib.Path):
+    path = tmp_path / 'test.jpg'
+    save_image_with_thumbnail(path, Image.new('RGB', (2000, 1500)), qr_generator.build_qr('test_string').resize((500, 500)))
+    settings = photo_sorter.ScanSettings(use_preview=True)
+
+    result = photo_sorter.scan_image(path.as_posix(), settings=settings)
+    assert result._replace(seconds=None, timings=None) == photo_sorter.ScanResult(path.as_posix(), 'test_string', 0.25, photo_sorter.STAGE_PREVIEW)
+
+def test_scan_image_preview_fallback(tmp_path : pathlib.Path):
+    path = tmp_path / 'test.jpg'
+    save_image_with_thumbnail(path, qr_generator.build_qr('test_string'), Image.new('RGB', (100, 100), 'white'))
+    settings = photo_sorter.ScanSettings(use_preview=True)
+
+    result = photo_sorter.scan_image(path.as_posix(), settings=settings)
+    assert result.qr == 'test_string'
+    assert result.stage == photo_sorter.STAGE_IMAGE
+
 def test_get_qr_no_header(tmp_path : pathlib.Path):
     assert photo_sorter.get_qr(generate_image(tmp_path, 'test_string')) == 'test_string'
 
@@ -90,6 +161,59 @@ def test_get_qr_for_files(tmp_path : pathlib.Path):
         assert result[files[i]] == content
 
 
+def test_scan_files_scales(tmp_path : pathlib.Path):
+    files = [generate_image(tmp_path, 'content' + str(i), str(i)) for i in range(3)]
+    Image.new('RGB', (100,100)).save(tmp_path / 'blank.png')
+    files.append((tmp_path / 'blank.png').as_posix())
+    settings = photo_sorter.ScanSettings(scales=(1.0,))
+
+    results = photo_sorter.scan_files(files, settings=settings)
+
+    for i in range(3):
+        assert results[files[i]]._replace(seconds=None, timings=None) == photo_sorter.ScanResult(files[i], 'content' + str(i), 1.0, photo_sorter.STAGE_IMAGE)
+    assert results[files[3]]._replace(seconds=None, timings=None) == photo_sorter.ScanResult(files[3], None, None)
+    assert photo_sorter.summarise_scales(results) == {1.0: 3}
+
+def test_scan_files_invalid_scales(tmp_path : pathlib.Path):
+    files = [generate_image(tmp_path, 'content', '0')]
+    for scales in ((0.5, 0.0), (-0.25,), (1.0, 2.0)):
+        with pytest.raises(ValueError, match='Invalid pyramid scales'):
+            photo_sorter.scan_files(files, settings=photo_sorter.ScanSettings(scales=scales))
+    photo_sorter.check_scales((0.25, 0.5, 1.0))
+    photo_sorter.check_scales(None)
+
+def test_scan_files_prefilter(tmp_path : pathlib.Path):
+    files = [generate_image(tmp_path, 'content' + str(i), str(i)) for i in range(2)]
+    Image.new('RGB', (100,100)).save(tmp_path / 'blank.png')
+    files.append((tmp_path / 'blank.png').as_posix())
+    settings = photo_sorter.ScanSettings(prefilter=True)
+
+    results = photo_sorter.scan_files(files, settings=settings)
+
+    assert results[files[0]].qr == 'content0'
+    assert results[files[1]].qr == 'content1'
+    assert results[files[2]]._replace(seconds=None, timings=None) == photo_sorter.ScanResult(files[2], None, None, photo_sorter.STAGE_PREFILTER)
+    assert photo_sorter.summarise_stages(results) == {
+        photo_sorter.STAGE_PREFILTER : 1,
+        photo_sorter.STAGE_PREVIEW : 0,
+        photo_sorter.STAGE_IMAGE : 2,
+        photo_sorter.STAGE_NOT_FOUND : 0,
+    }
+
+def test_create_pool():
+    with photo_sorter.create_pool(photo_sorter.BACKEND_THREAD, 2) as pool:
+        assert isinstance(pool, ThreadPool)
+        assert pool.map(abs, [-1, -2]) == [1, 2]
+    with pytest.raises(ValueError):
+        photo_sorter.create_pool('invalid')
+
+def test_get_qr_for_files_thread_backend(tmp_path : pathlib.Path):
+    files = [generate_image(tmp_path, 'content' + str(i), str(i)) for i in range(3)]
+
+    result = photo_sorter.get_qr_for_files(files, backend=photo_sorter.BACKEND_THREAD, workers=2)
+
+    assert result == {files[i] : 'content' + str(i) for i in range(3)}
+
 def test_is_image_true(tmp_path : pathlib.Path):
     image = qr_generator.build_qr('test')
     image.save(tmp_path / ('test.png'))
@@ -160,6 +284,64 @@ def test_qr_sorting(tmp_path : pathlib.Path):
         assert f'{i}_a.png' in os.listdir(path.as_posix())
         assert f'{i}_b.png' in os.listdir(path.as_posix())
 
+def test_qr_sorting_streaming(tmp_path : pathlib.Path):
+    qr_strings = [r'Test1\subTest', r'Test1', r'Test2', r'Test?']
+    inputs = tmp_path/'inputs'
+    outputs = tmp_path/'outputs'
+    inputs.mkdir()
+    for i in range(len(qr_strings)):
+        qr_generator.build_qr(qr_strings[i]).save(inputs / f'{i}_a.png')
+        Image.new('RGB', (100,100)).save(inputs / f'{i}_b.png')
+    Image.new('RGB', (100,100)).save(inputs / '#_unsorted.png')
+    (inputs / 'notes.txt').write_text('not an image')
+
+    found_dirs = photo_sorter.sort_directory(inputs.as_posix(), outputs.as_posix(), streaming=True, copy_workers=4)
+
+    assert found_dirs == [r'Test1', r'Test1\subTest', r'Test2', r'Test_']
+    for i in range(len(qr_strings)):
+        path = outputs/photo_sorter.sanitise_path(qr_strings[i])
+        assert sorted(os.listdir(path.as_posix())) == [f'{i}_a.png', f'{i}_b.png']
+    assert os.listdir(outputs/'unsorted') == ['#_unsorted.png']
+    assert os.listdir(outputs/'non_image_files') == ['notes.txt']
+
+def test_qr_sorting_invalid_copy_workers(tmp_path : pathlib.Path, mocker):
+    inputs = tmp_path/'inputs'
+    inputs.mkdir()
+    generate_image(inputs, 'Test1', '0')
+    scan_files = mocker.patch('qrImageIndexer.photo_sorter.iter_scan_files')
+    with pytest.raises(ValueError, match='copy workers'):
+        photo_sorter.sort_directory(inputs.as_posix(), (tmp_path/'outputs').as_posix(), copy_workers=0)
+    scan_files.assert_not_called()
+
+def test_qr_sorting_report(tmp_path : pathlib.Path):
+    inputs = tmp_path/'inputs'
+    outputs = tmp_path/'outputs'
+    inputs.mkdir()
+    qr_generator.build_qr('Test1').save(inputs / '0_a.png')
+    Image.new('RGB', (100,100)).save(inputs / '0_b.png')
+    report_path = tmp_path/'report.json'
+
+    photo_sorter.sort_directory(inputs.as_posix(), outputs.as_posix(), settings=photo_sorter.ScanSettings(binarization=True),
+                                report_path=report_path.as_posix())
+
+    with open(report_path) as f:
+        report = json.load(f)
+    assert report['images'] == 2
+    assert report['codes_found'] == 1
+    assert {'listing', 'type_check', 'scan', 'sort'} <= set(report['stages'])
+    assert {'load', 'zbar', 'binarization'} <= set(report['scan_stages'])
+    assert report['fallback']['binarization_attempts'] == 1
+    assert report['slowest'][0]['path'] in ((inputs / '0_a.png').as_posix(), (inputs / '0_b.png').as_posix())
+    assert report['placement']['files'] == 2
+
+def test_iter_scan_files_order(tmp_path : pathlib.Path):
+    files = [generate_image(tmp_path, 'content' + str(i), str(i)) for i in range(4)]
+
+    results = list(photo_sorter.iter_scan_files(files, backend=photo_sorter.BACKEND_THREAD, workers=4))
+
+    assert [result.path for result in results] == files
+    assert [result.qr for result in results] == ['content' + str(i) for i in range(4)]
+
 def test_qr_sorting_by_date(tmp_path : pathlib.Path):
     qr_strings = [r'Test1\subTest', r'Test1', r'Test2', r'Test?']
     inputs = tmp_path/'inputs'
@@ -192,3 +374,185 @@ def test_qr_sorting_by_date(tmp_path : pathlib.Path):
         assert (str(i) + '.png') in os.listdir(path.as_posix())
         assert f'#{i}.png' in os.listdir(path.as_posix())
 
+
+def test_qr_sorting_shared_pool(tmp_path : pathlib.Path, mocker):
+    inputs = tmp_path/'inputs'
+    outputs = tmp_path/'outputs'
+    inputs.mkdir()
+    qr_generator.build_qr('Test1').save(inputs / '0_a.png')
+    Image.new('RGB', (100,100)).save(inputs / '0_b.png')
+    create_pool = mocker.spy(photo_sorter, 'create_pool')
+
+    with photo_sorter.create_pool(photo_sorter.BACKEND_THREAD, 2) as pool:
+        found_dirs = photo_sorter.sort_directory(inputs.as_posix(), outputs.as_posix(), pool=pool)
+        assert pool.map(abs, [-1]) == [1] # Pool is left open for reuse
+
+    assert create_pool.call_count == 1
+    assert found_dirs == ['Test1']
+    assert sorted(os.listdir(outputs/'Test1')) == ['0_a.png', '0_b.png']
+
+def test_qr_sorting_lists_directory_once(tmp_path : pathlib.Path, mocker):
+    inputs = tmp_path/'inputs'
+    outputs = tmp_path/'outputs'
+    inputs.mkdir()
+    qr_generator.build_qr('Test1').save(inputs / '0_a.png')
+    (inputs / 'notes.txt').write_text('not an image')
+    build_inventory = mocker.spy(photo_sorter, 'build_inventory')
+
+    found_dirs = photo_sorter.sort_directory(inputs.as_posix(), outputs.as_posix(), backend=photo_sorter.BACKEND_THREAD)
+
+    assert build_inventory.call_count == 1
+    assert found_dirs == ['Test1']
+    assert os.listdir(outputs/'non_image_files') == ['notes.txt']
+
+def test_sort_existing_results_without_inventory(tmp_path : pathlib.Path):
+    inputs = tmp_path/'inputs'
+    outputs = tmp_path/'outputs'
+    inputs.mkdir()
+    Image.new('RGB', (100,100)).save(inputs / '0.png')
+    Image.new('RGB', (100,100)).save(inputs / '1.png')
+    results = {os.path.join(inputs.as_posix(), '0.png') : 'Test1', os.path.join(inputs.as_posix(), '1.png') : None}
+
+    found_dirs = photo_sorter.sort_directory_exisitng_results(results, inputs.as_posix(), outputs.as_posix())
+
+    assert found_dirs == ['Test1']
+    assert sorted(os.listdir(outputs/'Test1')) == ['0.png', '1.png']
+
+def test_scan_files_cache(tmp_path : pathlib.Path, mocker):
+    files = [generate_image(tmp_path, 'content' + str(i), str(i)) for i in range(2)]
+    output_dir = tmp_path / 'outputs'
+    output_dir.mkdir()
+    scan_image = mocker.spy(photo_sorter, 'scan_image')
+
+    with photo_sorter.open_scan_cache(output_dir.as_posix()) as cache:
+        first = photo_sorter.scan_files(files, backend=photo_sorter.BACKEND_THREAD, cache=cache)
+    assert scan_image.call_count == 2
+
+    files.append(generate_image(tmp_path, 'content2', '2'))
+    with photo_sorter.open_scan_cache(output_dir.as_posix()) as cache:
+        second = photo_sorter.scan_files(files, backend=photo_sorter.BACKEND_THREAD, cache=cache)
+    assert scan_image.call_count == 3
+    assert second[files[0]] == first[files[0]]._replace(seconds=None, timings=None)
+    assert [second[path].qr for path in files] == ['content0', 'content1', 'content2']
+
+    with photo_sorter.open_scan_cache(output_dir.as_posix(), string_header='content') as cache:
+        third = photo_sorter.scan_files(files, 'content', backend=photo_sorter.BACKEND_THREAD, cache=cache)
+    assert scan_image.call_count == 6
+    assert [third[path].qr for path in files] == ['0', '1', '2']
+
+def test_qr_sorting_hardlink(tmp_path : pathlib.Path):
+    inputs = tmp_path/'inputs'
+    outputs = tmp_path/'outputs'
+    inputs.mkdir()
+    qr_generator.build_qr('Test1').save(inputs / '0_a.png')
+    Image.new('RGB', (100,100)).save(inputs / '0_b.png')
+
+    found_dirs = photo_sorter.sort_directory(inputs.as_posix(), outputs.as_posix(), backend=photo_sorter.BACKEND_THREAD,
+                                             placement='hardlink')
+
+    assert found_dirs == ['Test1']
+    assert (outputs/'Test1'/'0_a.png').samefile(inputs/'0_a.png')
+    assert (outputs/'Test1'/'0_b.png').samefile(inputs/'0_b.png')
+
+def test_qr_sorting_dry_run_plan(tmp_path : pathlib.Path):
+    inputs = tmp_path/'inputs'
+    outputs = tmp_path/'outputs'
+    inputs.mkdir()
+    qr_generator.build_qr('Test1').save(inputs / '0_a.png')
+    Image.new('RGB', (100,100)).save(inputs / '0_b.png')
+    (inputs / 'notes.txt').write_text('not an image')
+    plan_path = tmp_path/'plan.jsonl'
+
+    found_dirs = photo_sorter.sort_directory(inputs.as_posix(), outputs.as_posix(), backend=photo_sorter.BACKEND_THREAD,
+                                             plan_path=plan_path.as_posix(), dry_run=True)
+
+    assert found_dirs == ['Test1']
+    assert os.listdir(outputs) == []
+    plan = list(sort_plan.read_plan(plan_path.as_posix()))
+    assert [(entry.source, entry.directory, entry.qr) for entry in plan] == [
+        ((inputs/'0_a.png').as_posix(), 'Test1', 'Test1'), ((inputs/'0_b.png').as_posix(), 'Test1', None)]
+    assert plan[0].stage == photo_sorter.STAGE_IMAGE
+    assert plan[1].stage == photo_sorter.STAGE_NOT_FOUND
+    assert all(entry.seconds >= 0 for entry in plan)
+
+    assert sort_plan.apply_plan(plan, outputs.as_posix()) == ['Test1']
+    assert sorted(os.listdir(outputs/'Test1')) == ['0_a.png', '0_b.png']
+
+def test_qr_sorting_resume(tmp_path : pathlib.Path, mocker):
+    inputs = tmp_path/'inputs'
+    outputs = tmp_path/'outputs'
+    inputs.mkdir()
+    qr_generator.build_qr('Test1').save(inputs / '0_a.png')
+    Image.new('RGB', (100,100)).save(inputs / '0_b.png')
+    Image.new('RGB', (100,100)).save(inputs / '0_c.png')
+
+    mocker.patch.object(photo_sorter, 'sort_scan_results', side_effect=KeyboardInterrupt)
+    with pytest.raises(KeyboardInterrupt):
+        photo_sorter.sort_directory(inputs.as_posix(), outputs.as_posix(), backend=photo_sorter.BACKEND_THREAD, checkpoint=True)
+    mocker.stopall()
+    assert os.path.exists(outputs/photo_sorter.CHECKPOINT_FILE_NAME)
+    # Simulate the first image being placed before the interruption
+    (outputs/'Test1').mkdir()
+    shutil.copyfile(inputs/'0_a.png', outputs/'Test1'/'0_a.png')
+
+    scan_image = mocker.spy(photo_sorter, 'scan_image')
+    place_file = mocker.spy(file_placement, 'place_file')
+    found_dirs = photo_sorter.sort_directory(inputs.as_posix(), outputs.as_posix(), backend=photo_sorter.BACKEND_THREAD,
+                                             resume=True)
+
+    assert found_dirs == ['Test1']
+    assert scan_image.call_count == 0
+    assert place_file.call_count == 2
+    assert sorted(os.listdir(outputs/'Test1')) == ['0_a.png', '0_b.png', '0_c.png']
+    assert not os.path.exists(outputs/photo_sorter.CHECKPOINT_FILE_NAME)
+
+def test_qr_sorting_recursive(tmp_path : pathlib.Path):
+    inputs = tmp_path/'inputs'
+    for folder in ['100CANON', '101CANON']:
+        (inputs/folder).mkdir(parents=True)
+    qr_generator.build_qr('Test1').save(inputs/'100CANON'/'IMG_0001.png')
+    Image.new('RGB', (100,100)).save(inputs/'100CANON'/'IMG_0002.png')
+    Image.new('RGB', (100,100)).save(inputs/'101CANON'/'IMG_0001.png')
+    (inputs/'101CANON'/'notes.txt').write_text('not an image')
+    outputs = inputs/'outputs'
+
+    found_dirs = photo_sorter.sort_directory(inputs.as_posix(), outputs.as_posix(), backend=photo_sorter.BACKEND_THREAD,
+                                             recursive=True)
+
+    assert found_dirs == ['Test1']
+    assert sorted(os.listdir(outputs/'Test1')) == ['100CANON_IMG_0001.png', '100CANON_IMG_0002.png', '101CANON_IMG_0001.png']
+    assert os.listdir(outputs/'non_image_files') == ['101CANON_notes.txt']
+
+def test_scan_image_undecodable(tmp_path : pathlib.Path):
+    path = tmp_path / 'photo.heic'
+    path.write_bytes(b'\x00\x00\x00\x18ftypheic\x00\x00\x00\x00mif1heic' + b'\x00' * 100)
+
+    assert photo_sorter.get_qr(path.as_posix(), binarization=True) is None
+    settings = photo_sorter.ScanSettings(scales=(0.5, 1.0))
+    assert photo_sorter.scan_image(path.as_posix(), settings=settings).qr is None
+
+def test_order_image_paths_capture_time():
+    capture_times = {'b/IMG_0002.jpg' : 10.0, 'a/DSC_0010.jpg' : 10.0, 'a/DSC_0001.jpg' : 5.5, 'b/IMG_0001.jpg' : 9.0}
+
+    ordered = photo_sorter.order_image_paths(list(capture_times), capture_times=capture_times)
+
+    assert ordered == ['a/DSC_0001.jpg', 'b/IMG_0001.jpg', 'b/IMG_0002.jpg', 'a/DSC_0010.jpg']
+
+def test_qr_sorting_by_capture_time(tmp_path : pathlib.Path):
+    inputs = tmp_path/'inputs'
+    outputs = tmp_path/'outputs'
+    inputs.mkdir()
+    # File names are in the reverse of the capture order
+    save_image_with_capture_time(inputs/'3.jpg', qr_generator.build_qr('Test1').convert('RGB'), '2024:01:01 10:00:00')
+    save_image_with_capture_time(inputs/'2.jpg', Image.new('RGB', (100,100)), '2024:01:01 10:00:00', '50')
+    save_image_with_capture_time(inputs/'1.jpg', qr_generator.build_qr('Test2').convert('RGB'), '2024:01:01 10:00:01')
+
+    found_dirs = photo_sorter.sort_directory(inputs.as_posix(), outputs.as_posix(), backend=photo_sorter.BACKEND_THREAD,
+                                             order_by_capture_time=True, use_cache=True)
+
+    assert found_dirs == ['Test1', 'Test2']
+    assert sorted(os.listdir(outputs/'Test1')) == ['2.jpg', '3.jpg']
+    assert os.listdir(outputs/'Test2') == ['1.jpg']
+    with photo_sorter.open_scan_cache(outputs.as_posix()) as cache:
+        assert len(cache.get_capture_times({path : photo_sorter.file_signature(path) for path in
+                                            [(inputs/name).as_posix() for name in ['1.jpg', '2.jpg', '3.jpg']]})) == 3
@@ -0,0 +1,15 @@
+from qrImageIndexer.qr_cache import QRCache
+import pathlib
+
+def test_qr_cache(tmp_path : pathlib.Path):
+    cache = QRCache(tmp_path.as_posix(), 'settings')
+    assert cache.get('data') is None
+    cache.put('data', b'png')
+    assert cache.get('data') == b'png'
+    assert cache.get('other') is None
+    assert not list(tmp_path.glob('*/*.tmp'))
+
+def test_qr_cache_settings(tmp_path : pathlib.Path):
+    QRCache(tmp_path.as_posix(), 'settings').put('data', b'png')
+    assert QRCache(tmp_path.as_posix(), 'other settings').get('data') is None
+    assert QRCache(tmp_path.as_posix(), 'settings').get('data') == b'png'
@@ -0,0 +1,67 @@
+from qrImageIndexer import qr_decoders, qr_generator, run_report
+import numpy
+import pathlib
+import pytest
+from PIL import Image
+
+def qr_array(string : str) -> numpy.ndarray:
+    return numpy.array(qr_generator.build_qr(string).convert('L'))
+
+def large_photo(string : str) -> numpy.ndarray:
+    canvas = Image.new('L', (3000, 2000), 128)
+    canvas.paste(qr_generator.build_qr(string).resize((400, 400)), (2200, 300))
+    return numpy.array(canvas)
+
+@pytest.mark.parametrize('decoder', list(qr_decoders.DECODERS))
+def test_decoders(decoder : str):
+    results = qr_decoders.DECODERS[decoder](qr_array('test_string'))
+    assert [result.data.decode('utf-8') for result in results] == ['test_string']
+
+@pytest.mark.parametrize('decoder', list(qr_decoders.DECODERS))
+def test_decoders_blank(decoder : str):
+    assert qr_decoders.DECODERS[decoder](numpy.full((480, 640), 255, numpy.uint8)) == []
+
+def test_decode_zbar_roi_large_photo():
+    results = qr_decoders.decode_zbar_roi(large_photo('test_string'))
+    assert [result.data.decode('utf-8') for result in results] == ['test_string']
+
+def test_decode_cascade():
+    calls = []
+    qr_decoders.register_decoder('test_none', lambda im: calls.append('test_none') or [])
+    try:
+        timings = {}
+        results = qr_decoders.decode_cascade(qr_array('test_string'), ('test_none', qr_decoders.DECODER_ZBAR_OTSU,
+                                                                       qr_decoders.DECODER_OPENCV), timings)
+        assert results[0].data.decode('utf-8') == 'test_string'
+        assert calls == ['test_none']
+        assert set(timings) == {'test_none', run_report.TIMING_BINARIZATION, run_report.BINARIZATION_HITS}
+    finally:
+        del qr_decoders.DECODERS['test_none']
+
+def test_check_decoders():
+    qr_decoders.check_decoders((qr_decoders.DECODER_ZBAR, qr_decoders.DECODER_OPENCV))
+    with pytest.raises(ValueError):
+        qr_decoders.check_decoders((qr_decoders.DECODER_ZBAR, 'unknown'))
+
+def test_choose_cascade():
+    hits = {'fast' : {0, 1}, 'slow' : {0, 1, 2}, 'other' : {3}, 'useless' : set()}
+    seconds = {'fast' : 0.01, 'slow' : 0.1, 'other' : 0.2, 'useless' : 0.001}
+    assert qr_decoders.choose_cascade(hits, seconds) == ('fast', 'slow', 'other')
+    assert qr_decoders.choose_cascade({'a' : set(), 'b' : set()}, {'a' : 0.2, 'b' : 0.1}) == ('b',)
+
+def test_sample_paths():
+    paths = [f'{i:03d}.jpg' for i in range(100)]
+    assert qr_decoders.sample_paths(paths, 4) == ['000.jpg', '025.jpg', '050.jpg', '075.jpg']
+    assert qr_decoders.sample_paths(paths[:3], 4) == paths[:3]
+
+def test_calibrate_decoders(tmp_path : pathlib.Path):
+    qr_generator.build_qr('{image}test_string').save(tmp_path / 'code.png')
+    qr_generator.build_qr('other').save(tmp_path / 'other.png')
+    Image.new('L', (200, 200), 255).save(tmp_path / 'blank.png')
+    paths = [(tmp_path / name).as_posix() for name in ('blank.png', 'code.png', 'other.png')]
+
+    cascade, measurements = qr_decoders.calibrate_decoders(paths, '{image}', decoders=(qr_decoders.DECODER_ZBAR,
+                                                                                      qr_decoders.DECODER_OPENCV))
+    assert cascade in ((qr_decoders.DECODER_ZBAR,), (qr_decoders.DECODER_OPENCV,))
+    assert [measurement.decoder for measurement in measurements] == [qr_decoders.DECODER_ZBAR, qr_decoders.DECODER_OPENCV]
+    assert all(measurement.found == 1 and measurement.recall == 1.0 for measurement in measurements)
@@ -4,6 +4,8 @@ import pathlib
 from qrImageIndexer import qr_generator
 from os import path
 from PIL import ImageChops
+from multiprocessing.pool import ThreadPool
+import random
 
 
 def build_demo_tsv(file_path : pathlib.Path):
@@ -235,4 +237,93 @@ def test_structure_qr_builder():
 def test_unpack_data_drop_leve():
     result_struct = qr_generator.unpack_data(demo_tsv_drop_index(), True)
 
-    assert result_struct == demo_data_struct_drop_indexinclude_headers()
\ No newline at end of file
+    assert result_struct == demo_data_struct_drop_indexinclude_headers()
+
+
+def test_build_qr_images_pool():
+    strings = ['Level1-1' + path.sep, 'Level1-2' + path.sep, 'Level1-1' + path.sep]
+    with ThreadPool(2) as pool:
+        images = qr_generator.build_qr_images(strings, pool=pool)
+    assert sorted(images) == sorted(set(strings))
+    for string, image in images.items():
+        assert not ImageChops.difference(qr_generator.build_qr(string), image).getbbox()
+
+def test_build_qr_images_cache(tmp_path : pathlib.Path, mocker):
+    strings = ['Level1-1' + path.sep, 'Level1-2' + path.sep]
+    first = qr_generator.build_qr_images(strings, cache_dir=tmp_path.as_posix())
+    assert len(list(tmp_path.glob('*/*.png'))) == 2
+
+    build_qr_png = mocker.patch('qrImageIndexer.qr_generator.build_qr_png', wraps=qr_generator.build_qr_png)
+    second = qr_generator.build_qr_images(strings + ['Level1-3' + path.sep], cache_dir=tmp_path.as_posix())
+    build_qr_png.assert_called_once_with('Level1-3' + path.sep)
+    for string in strings:
+        assert not ImageChops.difference(first[string], second[string]).getbbox()
+
+def test_structure_qr_builder_cache(tmp_path : pathlib.Path):
+    expected_struct = demo_data_struct_no_headers_images()
+    generated_struct = qr_generator.generate_qr_code_structure(demo_data_struct_no_headers(), cache_dir=tmp_path.as_posix())
+    assert not ImageChops.difference(expected_struct['Level1-1'][1], generated_struct['Level1-1'][1]).getbbox()
+    assert generated_struct['Level1-2'][1] is None
+    assert not ImageChops.difference(expected_struct['Level1-2'][0]['Level2-2'][0]['Level3'][1], generated_struct['Level1-2'][0]['Level2-2'][0]['Level3'][1]).getbbox()
+
+def test_build_qr_matrix_matches_image():
+    matrix = qr_generator.build_qr_matrix('Level1-1' + path.sep)
+    image = qr_generator.build_qr('Level1-1' + path.sep).convert('L')
+    assert image.size == (len(matrix.modules) * qr_generator.QR_BOX_SIZE,) * 2
+    for row_index, row in enumerate(matrix.modules):
+        for col_index, dark in enumerate(row):
+            pixel = image.getpixel((col_index * qr_generator.QR_BOX_SIZE, row_index * qr_generator.QR_BOX_SIZE))
+            assert (pixel == 0) == dark
+
+def test_structure_qr_builder_vector():
+    generated_struct = qr_generator.generate_qr_code_structure(demo_data_struct_no_headers(), vector=True)
+    assert generated_struct['Level1-1'][1] == qr_generator.build_qr_matrix('Level1-1' + path.sep)
+    assert generated_struct['Level1-2'][1] is None
+    assert generated_struct['Level1-2'][0]['Level2-2'][0]['Level3'][1] == qr_generator.build_qr_matrix(
+        'Level1-2' + path.sep + 'Level2-2' + path.sep + 'Level3' + path.sep)
+
+def test_iter_index_entries():
+    result_struct = {}
+    entries = list(qr_generator.iter_index_entries(demo_tsv_expected_data() + [['Level1-2'], ['', 'Level2-3']], False, '', result_struct))
+    assert entries == [
+        (('Level1-1',), 'Level1-1' + path.sep),
+        (('Level1-2',), None),
+        (('Level1-2', 'Level2-1'), 'Level1-2' + path.sep + 'Level2-1' + path.sep),
+        (('Level1-2', 'Level2-2'), None),
+        (('Level1-2', 'Level2-2', 'Level3'), 'Level1-2' + path.sep + 'Level2-2' + path.sep + 'Level3' + path.sep),
+        (('Level1-2', 'Level2-3'), 'Level1-2' + path.sep + 'Level2-3' + path.sep),
+    ]
+    assert result_struct['Level1-2'][0]['Level2-3'] == ({}, 'Level1-2' + path.sep + 'Level2-3' + path.sep)
+
+def test_unpack_data_matches_recurse_random():
+    # Random files with blank lines, repeated headings, skipped levels and rows ending a level early
+    rng = random.Random(0)
+    for _ in range(2000):
+        data = []
+        for _ in range(rng.randint(1, 12)):
+            if rng.random() < 0.1:
+                data.append([])
+            else:
+                data.append([''] * rng.randint(0, 3) + [rng.choice('ABC')])
+        for gen_qr_headings in (True, False):
+            expected = {}
+            qr_generator.unpack_data_recurse(data, gen_qr_headings, expected, r'{image}')
+            result = qr_generator.unpack_data(iter(data), gen_qr_headings, r'{image}')
+            assert repr(expected) == repr(result) # repr also compares the order of every level
+
+def test_unpack_data_empty():
+    assert qr_generator.unpack_data([], True) == {}
+
+def test_unpack_data_deep():
+    data = [[''] * i + [f'Level{i}'] for i in range(5000)] # Deeper than the recursion limit
+    result_struct = qr_generator.unpack_data(data, False)
+    for i in range(4999):
+        assert result_struct[f'Level{i}'][1] is None
+        result_struct = result_struct[f'Level{i}'][0]
+    assert result_struct['Level4999'][1].endswith('Level4998' + path.sep + 'Level4999' + path.sep)
+
+def test_parse_index(tmp_path : pathlib.Path):
+    demo_file = tmp_path / 'file.txt'
+    build_demo_tsv_four_spaces(demo_file)
+    with open(demo_file) as f:
+        assert demo_data_struct_include_headers() == qr_generator.parse_index(f, True)
@@ -1,5 +1,8 @@
 from qrImageIndexer import generate_qr_wrapper
+from qrImageIndexer.run_report import STAGE_PARSE, STAGE_PDF_BUILD
 from unittest import mock
+from PyPDF2 import PdfReader
+import pathlib
 
 def mock_qr_generator_functions(mocker : mock):
     unpack_data = mocker.patch('qrImageIndexer.generate_qr_wrapper.unpack_data')
@@ -15,7 +18,7 @@ def test_single_func_pdf_builder_all_true(mocker):
                                         True, True, True, r'{header}')
     
     unpack_data.assert_called_once_with([['Line 1', ''], ['', 'Line 1 Indent']], True, r'{header}')
-    generate_qr_structure.assert_called_once_with(unpack_data.return_value)
+    generate_qr_structure.assert_called_once_with(unpack_data.return_value, workers=None, cache_dir=None, vector=False)
     build_pdf.assert_called_once_with(generate_qr_structure.return_value, True, True)
     assert result == build_pdf.return_value
 
@@ -25,7 +28,7 @@ def test_single_func_pdf_builder_no_qr_heading(mocker):
                                         False, True, True, r'{header}')
     
     unpack_data.assert_called_once_with([['Line 1', ''], ['', 'Line 1 Indent']], False, r'{header}')
-    generate_qr_structure.assert_called_once_with(unpack_data.return_value)
+    generate_qr_structure.assert_called_once_with(unpack_data.return_value, workers=None, cache_dir=None, vector=False)
     build_pdf.assert_called_once_with(generate_qr_structure.return_value, True, True)
     assert result == build_pdf.return_value
 
@@ -35,7 +38,7 @@ def test_single_func_pdf_builder_no_title_all_heading(mocker):
                                         True, False, True, r'{header}')
     
     unpack_data.assert_called_once_with([['Line 1', ''], ['', 'Line 1 Indent']], True, r'{header}')
-    generate_qr_structure.assert_called_once_with(unpack_data.return_value)
+    generate_qr_structure.assert_called_once_with(unpack_data.return_value, workers=None, cache_dir=None, vector=False)
     build_pdf.assert_called_once_with(generate_qr_structure.return_value, False, True)
     assert result == build_pdf.return_value
 
@@ -45,6 +48,51 @@ def test_single_func_pdf_builder_not_sliceable(mocker):
                                         True, True, False, r'{header}')
     
     unpack_data.assert_called_once_with([['Line 1', ''], ['', 'Line 1 Indent']], True, r'{header}')
-    generate_qr_structure.assert_called_once_with(unpack_data.return_value)
+    generate_qr_structure.assert_called_once_with(unpack_data.return_value, workers=None, cache_dir=None, vector=False)
     build_pdf.assert_called_once_with(generate_qr_structure.return_value, True, False)
-    assert result == build_pdf.return_value
\ No newline at end of file
+    assert result == build_pdf.return_value
+
+
+def index_lines(count : int):
+    return [['Room', '']] + [['', f'Item {i}'] for i in range(count)]
+
+def test_write_qr_pdfs_single_file(tmp_path : pathlib.Path):
+    output = (tmp_path / 'codes.pdf').as_posix()
+    paths = generate_qr_wrapper.write_qr_pdfs(index_lines(8), False, True, False, output, '{header}', vector=True)
+    assert paths == [output]
+    reader = PdfReader(output)
+    assert len(reader.pages) == 2
+    assert 'Item 0' in reader.pages[0].extract_text()
+    assert 'Item 7' in reader.pages[1].extract_text()
+
+def test_write_qr_pdfs_split(tmp_path : pathlib.Path):
+    output = (tmp_path / 'codes.pdf').as_posix()
+    timings = {}
+    paths = generate_qr_wrapper.write_qr_pdfs(index_lines(20), False, True, True, output, '{header}', pages_per_file=2,
+                                              workers=1, timings=timings)
+    assert paths == [(tmp_path / f'codes_00{i}.pdf').as_posix() for i in (1, 2)]
+    assert [len(PdfReader(path).pages) for path in paths] == [2, 2]
+    assert 'Item 1\n' in PdfReader(paths[0]).pages[0].extract_text() # Each file ordered for slicing on its own
+    assert 'Item 0\n' in PdfReader(paths[0]).pages[1].extract_text()
+    assert 'Item 19' in ''.join(page.extract_text() for page in PdfReader(paths[1]).pages)
+    assert set(timings) == {STAGE_PARSE, STAGE_PDF_BUILD}
+
+def test_write_qr_pdfs_split_parallel(tmp_path : pathlib.Path):
+    output = (tmp_path / 'codes.pdf').as_posix()
+    paths = generate_qr_wrapper.write_qr_pdfs(index_lines(20), False, True, False, output, pages_per_file=1, workers=2,
+                                              vector=True)
+    assert len(paths) == 4
+    assert [len(PdfReader(path).pages) for path in paths] == [1, 1, 1, 1]
+    assert 'Item 18' in PdfReader(paths[3]).pages[0].extract_text()
+
+def test_part_path():
+    assert generate_qr_wrapper.part_path('codes.pdf', 0, 1) == 'codes.pdf'
+    assert generate_qr_wrapper.part_path('codes.pdf', 1, 3) == 'codes_002.pdf'
+    assert generate_qr_wrapper.part_path('codes.pdf', 0, 1200) == 'codes_0001.pdf'
+
+def test_write_qr_pdfs_empty(tmp_path : pathlib.Path):
+    for pages_per_file in (None, 2):
+        output = (tmp_path / f'empty_{pages_per_file}.pdf').as_posix()
+        paths = generate_qr_wrapper.write_qr_pdfs([], False, True, True, output, pages_per_file=pages_per_file)
+        assert paths == [output]
+        assert len(PdfReader(output).pages) == 1
@@ -0,0 +1,24 @@
+from qrImageIndexer import qr_prefilter, qr_generator
+import pathlib
+import numpy
+from PIL import Image
+
+def test_count_finder_patterns():
+    im = numpy.array(qr_generator.build_qr('test_string').convert('L'))
+    assert qr_prefilter.count_finder_patterns(im) >= 3
+
+def test_count_finder_patterns_blank():
+    assert qr_prefilter.count_finder_patterns(numpy.full((480, 640), 255, numpy.uint8)) == 0
+
+def test_has_qr_candidate(tmp_path : pathlib.Path):
+    canvas = Image.new('L', (4000, 3000), 128)
+    canvas.paste(qr_generator.build_qr('test_string').resize((800, 800)), (1000, 1000))
+    canvas.save(tmp_path / 'qr.jpg')
+    Image.new('L', (4000, 3000), 128).save(tmp_path / 'blank.jpg')
+
+    assert qr_prefilter.has_qr_candidate((tmp_path / 'qr.jpg').as_posix())
+    assert not qr_prefilter.has_qr_candidate((tmp_path / 'blank.jpg').as_posix())
+
+def test_has_qr_candidate_unreadable(tmp_path : pathlib.Path):
+    (tmp_path / 'test').touch()
+    assert qr_prefilter.has_qr_candidate((tmp_path / 'test').as_posix())
@@ -0,0 +1,52 @@
+from qrImageIndexer import run_report
+from qrImageIndexer.photo_sorter import ScanResult
+from qrImageIndexer.file_placement import CopyStats
+import json
+import pathlib
+
+def test_timed():
+    timings = {}
+    with run_report.timed(timings, 'stage'):
+        pass
+    with run_report.timed(timings, 'stage'):
+        pass
+    assert list(timings) == ['stage']
+    assert timings['stage'] >= 0
+
+    with run_report.timed(None, 'stage'):
+        pass
+
+def test_percentile():
+    assert run_report.percentile([], 50) is None
+    assert run_report.percentile([1.0], 90) == 1.0
+    assert run_report.percentile([1.0, 2.0, 3.0, 4.0, 5.0], 50) == 3.0
+    assert run_report.percentile([1.0, 2.0], 50) == 1.5
+    assert run_report.percentile([1.0, 2.0, 3.0], 100) == 3.0
+
+def test_build_run_report():
+    results = [
+        ScanResult('a.jpg', 'code', 1.0, 'image', 0.5, {run_report.TIMING_ZBAR : 0.3, run_report.TIMING_LOAD : 0.2}),
+        ScanResult('b.jpg', None, None, 'not_found', 2.0, {run_report.TIMING_ZBAR : 1.0, run_report.TIMING_BINARIZATION : 1.0}),
+        ScanResult('c.jpg', 'code', 1.0, 'image', 1.0, {run_report.TIMING_ZBAR : 0.5, run_report.TIMING_BINARIZATION : 0.5,
+                                                         run_report.BINARIZATION_HITS : 1}),
+        ScanResult('d.jpg', 'code', 1.0, 'image'), # Cached result without timings
+    ]
+    report = run_report.build_run_report({run_report.STAGE_SCAN : 3.0}, 4.0, results, CopyStats(), slowest=2)
+
+    assert report['images'] == 4
+    assert report['images_scanned'] == 3
+    assert report['codes_found'] == 3
+    assert report['images_per_second'] == 1.0
+    assert report['stages'] == {run_report.STAGE_SCAN : 3.0}
+    assert report['scan_stages'] == {run_report.TIMING_ZBAR : 1.8, run_report.TIMING_LOAD : 0.2, run_report.TIMING_BINARIZATION : 1.5}
+    assert report['image_seconds']['p50'] == 1.0
+    assert report['image_seconds']['max'] == 2.0
+    assert report['fallback'] == {'binarization_attempts' : 2, 'binarization_hits' : 1, 'binarization_hit_rate' : 0.5}
+    assert [item['path'] for item in report['slowest']] == ['b.jpg', 'c.jpg']
+    assert report['placement']['files'] == 0
+
+def test_write_run_report(tmp_path : pathlib.Path):
+    report = run_report.build_run_report({}, 0.0)
+    run_report.write_run_report(report, (tmp_path / 'report.json').as_posix())
+    with open(tmp_path / 'report.json') as f:
+        assert json.load(f) == report
@@ -0,0 +1,55 @@
+from qrImageIndexer import scan_cache
+import pathlib
+import os
+
+def build_file(tmp_path : pathlib.Path, content : bytes = b'content') -> str:
+    path = tmp_path / 'image.jpg'
+    path.write_bytes(content)
+    return path.as_posix()
+
+def test_cache_round_trip(tmp_path : pathlib.Path):
+    path = build_file(tmp_path)
+    cache_path = (tmp_path / 'cache.sqlite').as_posix()
+    with scan_cache.ScanCache(cache_path, 'settings') as cache:
+        assert cache.get(path, 7, 1.5) is None
+        cache.put_many([(path, 7, 1.5, 'Folder', 0.5, 'image')])
+        assert cache.get(path, 7, 1.5) == ('Folder', 0.5, 'image')
+
+    with scan_cache.ScanCache(cache_path, 'settings') as cache:
+        assert cache.get(path, 7, 1.5) == ('Folder', 0.5, 'image')
+        assert cache.get(path, 8, 1.5) is None
+        assert cache.get(path, 7, 2.5) is None
+
+def test_cache_settings_change(tmp_path : pathlib.Path):
+    path = build_file(tmp_path)
+    cache_path = (tmp_path / 'cache.sqlite').as_posix()
+    with scan_cache.ScanCache(cache_path, 'settings') as cache:
+        cache.put_many([(path, 7, 1.5, None, None, 'not_found')])
+
+    with scan_cache.ScanCache(cache_path, 'other settings') as cache:
+        assert cache.get(path, 7, 1.5) is None
+
+def test_cache_hash(tmp_path : pathlib.Path):
+    path = build_file(tmp_path)
+    cache_path = (tmp_path / 'cache.sqlite').as_posix()
+    with scan_cache.ScanCache(cache_path, 'settings', use_hash=True) as cache:
+        cache.put_many([(path, 7, 1.5, 'Folder', 1.0, 'image')])
+        assert cache.get(path, 7, 1.5) == ('Folder', 1.0, 'image')
+        build_file(tmp_path, b'changed')
+        assert cache.get(path, 7, 1.5) is None
+
+def test_file_hash(tmp_path : pathlib.Path):
+    path = build_file(tmp_path)
+    assert scan_cache.file_hash(path) == scan_cache.file_hash(path)
+    assert scan_cache.file_hash(path) != scan_cache.file_hash(build_file(tmp_path, b'changed'))
+
+def test_cache_capture_times(tmp_path : pathlib.Path):
+    path = build_file(tmp_path)
+    (tmp_path / 'other').mkdir()
+    other_path = build_file(tmp_path / 'other')
+    size = os.path.getsize(path)
+    with scan_cache.ScanCache((tmp_path / 'cache.sqlite').as_posix(), 'settings') as cache:
+        cache.put_capture_times([(path, size, 1.0, 100.5), (other_path, size, 1.0, None)])
+    with scan_cache.ScanCache((tmp_path / 'cache.sqlite').as_posix(), 'other settings') as cache:
+        assert cache.get_capture_times({path : (size, 1.0), other_path : (size, 1.0)}) == {path : 100.5, other_path : None}
+        assert cache.get_capture_times({path : (size, 2.0)}) == {}
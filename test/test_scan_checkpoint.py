@@ -0,0 +1,50 @@
+from qrImageIndexer import scan_checkpoint
+import os
+import pathlib
+
+def test_checkpoint_resume(tmp_path : pathlib.Path):
+    path = (tmp_path / 'checkpoint.jsonl').as_posix()
+    with scan_checkpoint.ScanCheckpoint(path, 'settings', batch_size=2) as checkpoint:
+        checkpoint.add('a.jpg', 10, 1.0, 'Test1', 1.0, 'image', 0.5)
+        checkpoint.add('b.jpg', 20, 2.0, None, None, 'not_found', 0.25)
+        checkpoint.add('c.jpg', 30, 3.0, None, None, 'not_found', 0.25)
+
+    with scan_checkpoint.ScanCheckpoint(path, 'settings', resume=True) as checkpoint:
+        assert checkpoint.get('a.jpg', 10, 1.0) == ('Test1', 1.0, 'image', 0.5)
+        assert checkpoint.get('c.jpg', 30, 3.0) == (None, None, 'not_found', 0.25)
+        assert checkpoint.get('b.jpg', 21, 2.0) is None
+        assert checkpoint.get('d.jpg', 10, 1.0) is None
+
+def test_checkpoint_batches(tmp_path : pathlib.Path):
+    path = (tmp_path / 'checkpoint.jsonl').as_posix()
+    checkpoint = scan_checkpoint.ScanCheckpoint(path, 'settings', batch_size=2)
+    checkpoint.add('a.jpg', 10, 1.0, 'Test1', 1.0, 'image', 0.5)
+    assert len(open(path).readlines()) == 1
+    checkpoint.add('b.jpg', 20, 2.0, None, None, 'not_found', 0.25)
+    assert len(open(path).readlines()) == 3
+    checkpoint.close()
+
+def test_checkpoint_partial_line(tmp_path : pathlib.Path):
+    path = (tmp_path / 'checkpoint.jsonl').as_posix()
+    with scan_checkpoint.ScanCheckpoint(path, 'settings') as checkpoint:
+        checkpoint.add('a.jpg', 10, 1.0, 'Test1', 1.0, 'image', 0.5)
+    with open(path, 'a') as f:
+        f.write('{"path": "b.j')
+
+    with scan_checkpoint.ScanCheckpoint(path, 'settings', resume=True) as checkpoint:
+        assert checkpoint.get('a.jpg', 10, 1.0) is not None
+        checkpoint.add('c.jpg', 30, 3.0, None, None, 'not_found', 0.25)
+    with scan_checkpoint.ScanCheckpoint(path, 'settings', resume=True) as checkpoint:
+        assert checkpoint.get('a.jpg', 10, 1.0) is not None
+        assert checkpoint.get('c.jpg', 30, 3.0) is not None
+
+def test_checkpoint_settings_changed(tmp_path : pathlib.Path):
+    path = (tmp_path / 'checkpoint.jsonl').as_posix()
+    with scan_checkpoint.ScanCheckpoint(path, 'settings') as checkpoint:
+        checkpoint.add('a.jpg', 10, 1.0, 'Test1', 1.0, 'image', 0.5)
+
+    with scan_checkpoint.ScanCheckpoint(path, 'other settings', resume=True) as checkpoint:
+        assert checkpoint.get('a.jpg', 10, 1.0) is None
+
+    checkpoint.remove()
+    assert not os.path.exists(path)
@@ -0,0 +1,50 @@
+from qrImageIndexer import sort_plan
+from typing import NamedTuple, Optional
+import os
+import pathlib
+import pytest
+
+class Result(NamedTuple):
+    path : str
+    qr : Optional[str]
+    stage : Optional[str] = None
+    seconds : Optional[float] = None
+
+def test_plan_sort():
+    results = [Result('a.jpg', None), Result('b.jpg', 'Test?', 'image', 0.5), Result('c.jpg', None, 'not_found', 0.25),
+               Result('d.jpg', 'Test2', 'preview', 0.1)]
+
+    plan = list(sort_plan.plan_sort(results))
+
+    assert plan == [sort_plan.PlanEntry('a.jpg', 'unsorted'),
+                    sort_plan.PlanEntry('b.jpg', 'Test_', 'Test?', 'image', 0.5),
+                    sort_plan.PlanEntry('c.jpg', 'Test_', None, 'not_found', 0.25),
+                    sort_plan.PlanEntry('d.jpg', 'Test2', 'Test2', 'preview', 0.1)]
+    assert sort_plan.plan_directories(plan) == ['Test_', 'Test2']
+
+@pytest.mark.parametrize('file_name', ['plan.jsonl', 'plan.csv'])
+def test_write_read_plan(tmp_path : pathlib.Path, file_name : str):
+    plan = [sort_plan.PlanEntry('a, "1".jpg', 'unsorted', name='sub_a.jpg'),
+            sort_plan.PlanEntry('b.jpg', 'Test1', 'Test1', 'image', 0.5)]
+    plan_path = (tmp_path / file_name).as_posix()
+
+    sort_plan.write_plan(plan, plan_path)
+
+    assert list(sort_plan.read_plan(plan_path)) == plan
+
+def test_apply_plan(tmp_path : pathlib.Path):
+    sources = tmp_path / 'sources'
+    sources.mkdir()
+    for name in ['a.jpg', 'b.jpg', 'c.jpg']:
+        (sources / name).write_bytes(name.encode())
+    plan = [sort_plan.PlanEntry((sources / 'a.jpg').as_posix(), 'unsorted'),
+            sort_plan.PlanEntry((sources / 'b.jpg').as_posix(), 'Test1', 'Test1'),
+            sort_plan.PlanEntry((sources / 'c.jpg').as_posix(), 'Test1')]
+    output = tmp_path / 'output'
+
+    found_dirs = sort_plan.apply_plan(plan, output.as_posix(), copy_workers=2)
+
+    assert found_dirs == ['Test1']
+    assert os.listdir(output / 'unsorted') == ['a.jpg']
+    assert sorted(os.listdir(output / 'Test1')) == ['b.jpg', 'c.jpg']
+    assert (output / 'Test1' / 'c.jpg').read_bytes() == b'c.jpg'